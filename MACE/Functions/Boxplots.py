@@ -0,0 +1,87 @@
+__author__ = 'mahajrod'
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+def get_sorted_percentiles(sorted_value_array, percentiles):
+    """
+    Same as numpy.percentile with linear interpolation, but for already sorted array, so no sorting is done
+    :param sorted_value_array: sorted array without NaN
+    :param percentiles: array of percentiles (0-100)
+    :return: float array
+    """
+    position_array = (len(sorted_value_array) - 1) * (np.asarray(percentiles, dtype=np.float64) / 100)
+    lower_array = np.floor(position_array).astype(np.int64)
+    upper_array = np.minimum(lower_array + 1, len(sorted_value_array) - 1)
+
+    lower_value_array = sorted_value_array[lower_array]
+    upper_value_array = sorted_value_array[upper_array]
+    fraction_array = position_array - lower_array
+    # interpolation is done from the nearest point, as in numpy, to get exactly the same values
+    return np.where(fraction_array < 0.5,
+                    lower_value_array + (upper_value_array - lower_value_array) * fraction_array,
+                    upper_value_array - (upper_value_array - lower_value_array) * (1 - fraction_array))
+
+
+def get_box_stats_from_sorted(sorted_value_array, label=None, whis=1.5):
+    """
+    Calculates statistics for box plot from sorted array. Output is the same as of
+    matplotlib.cbook.boxplot_stats (without autorange) and could be drawn by matplotlib Axes.bxp
+    :param sorted_value_array: sorted array without NaN
+    :param label:
+    :param whis: whisker length relative to interquartile range
+    :return: dict
+    """
+    stats = {"label": label} if label is not None else {}
+    value_number = len(sorted_value_array)
+    if value_number == 0:
+        stats.update({"mean": np.nan, "med": np.nan, "q1": np.nan, "q3": np.nan, "iqr": np.nan, "cilo": np.nan,
+                      "cihi": np.nan, "whislo": np.nan, "whishi": np.nan, "fliers": np.array([])})
+        return stats
+
+    q1, med, q3 = get_sorted_percentiles(sorted_value_array, [25, 50, 75])
+    iqr = q3 - q1
+    # whiskers are extended to the most extreme values inside of q1 - whis * iqr, q3 + whis * iqr
+    lower_index = np.searchsorted(sorted_value_array, q1 - whis * iqr, side="left")
+    upper_index = np.searchsorted(sorted_value_array, q3 + whis * iqr, side="right")
+    whislo = q1 if (lower_index == value_number) or (sorted_value_array[lower_index] > q1) \
+        else sorted_value_array[lower_index]
+    whishi = q3 if (upper_index == 0) or (sorted_value_array[upper_index - 1] < q3) \
+        else sorted_value_array[upper_index - 1]
+
+    stats.update({"mean": np.mean(sorted_value_array), "med": med, "q1": q1, "q3": q3, "iqr": iqr,
+                  "cilo": med - 1.57 * iqr / np.sqrt(value_number), "cihi": med + 1.57 * iqr / np.sqrt(value_number),
+                  "whislo": whislo, "whishi": whishi,
+                  "fliers": np.concatenate([sorted_value_array[:np.searchsorted(sorted_value_array, whislo,
+                                                                                side="left")],
+                                            sorted_value_array[np.searchsorted(sorted_value_array, whishi,
+                                                                               side="right"):]])})
+    return stats
+
+
+def get_partition_box_stats(value_array, partition_array, group_dict, whis=1.5):
+    """
+    Calculates box plot statistics for groups of partitions. Values are sorted only once, group is selected
+    from sorted values by partition codes, so no copies of input data are made for groups.
+    NaN values are ignored.
+    :param value_array: array of values
+    :param partition_array: integer array with partition code of each value
+    :param group_dict: dict-like object group label -> list of partition codes,
+                       i.e. {"all": [0, 1, 2], "noX": [0], "onlyX": [1, 2]}
+    :param whis: whisker length relative to interquartile range
+    :return: OrderedDict group label -> dict with statistics (see get_box_stats_from_sorted)
+    """
+    value_array = np.asarray(value_array, dtype=np.float64)
+    retained_index_array = np.flatnonzero(~np.isnan(value_array))
+    order = retained_index_array[np.argsort(value_array[retained_index_array], kind="stable")]
+    sorted_value_array = value_array[order]
+    sorted_partition_array = np.asarray(partition_array)[order]
+
+    stats_dict = OrderedDict()
+    for group in group_dict:
+        stats_dict[group] = get_box_stats_from_sorted(sorted_value_array[np.isin(sorted_partition_array,
+                                                                                 group_dict[group])],
+                                                      label=group, whis=whis)
+    return stats_dict
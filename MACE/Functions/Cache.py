@@ -0,0 +1,118 @@
+__author__ = 'mahajrod'
+
+import os
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def get_cache_path(source_path, cache_dir, label, parameters=()):
+    """
+    Builds path of the cache file for a source file. Cache key is formed by absolute path, modification time and size
+    of the source file, label of the table and parsing parameters, so any change of the source invalidates the cache.
+    :param source_path:
+    :param cache_dir:
+    :param label: name of the table, i.e. "len" or "psl"
+    :param parameters: parsing parameters affecting the table, must have a stable repr
+    :return: pathlib.Path
+    """
+    source_path = Path(source_path).resolve()
+    stat = source_path.stat()
+    key = "\t".join(map(str, [source_path, stat.st_mtime_ns, stat.st_size, label, repr(tuple(parameters))]))
+
+    return Path(cache_dir) / "{0}.{1}.{2}.npz".format(source_path.name, label,
+                                                      hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+
+
+def get_column_arrays(values):
+    """
+    Converts column (or index) to arrays storable in npz file without pickling.
+    Object columns are stored as unicode arrays with a separate mask of NA values.
+    :param values: pandas.Series or pandas.Index
+    :return: tuple (array, na_mask or None)
+    """
+    if values.dtype == object:
+        na_mask = pd.isna(values).to_numpy() if isinstance(values, pd.Series) else np.asarray(pd.isna(values))
+        array = np.where(na_mask, "", values.to_numpy(dtype=object)).astype(str)
+        return array, na_mask
+
+    return values.to_numpy(), None
+
+
+def restore_column_array(array, na_mask=None):
+    if na_mask is None:
+        return array
+    array = array.astype(object)
+    array[na_mask] = np.nan
+
+    return array
+
+
+def save_df_to_npz(df, npz_path):
+    """
+    Stores dataframe in npz file column by column. Write is atomic, so interrupted runs do not leave a broken cache.
+    Column and index names are stored as strings.
+    :param df:
+    :param npz_path:
+    :return: None
+    """
+    npz_path = Path(npz_path)
+    array_dict = {"columns": np.array(list(map(str, df.columns)), dtype=str),
+                  "index_name": np.array([] if df.index.name is None else [str(df.index.name)], dtype=str)}
+
+    array_dict["index"], index_na_mask = get_column_arrays(df.index)
+    if index_na_mask is not None:
+        array_dict["index_na_mask"] = index_na_mask
+
+    for column_index, column in enumerate(df.columns):
+        array_dict["column_%i" % column_index], na_mask = get_column_arrays(df[column])
+        if na_mask is not None:
+            array_dict["na_mask_%i" % column_index] = na_mask
+
+    npz_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = npz_path.parent / (npz_path.stem + ".%i.tmp.npz" % os.getpid())
+    np.savez(tmp_path, **array_dict)
+    os.replace(tmp_path, npz_path)
+
+
+def load_df_from_npz(npz_path):
+    """
+    Reads dataframe stored by save_df_to_npz
+    :param npz_path:
+    :return: pandas.DataFrame
+    """
+    with np.load(npz_path, allow_pickle=False) as npz:
+        index = pd.Index(restore_column_array(npz["index"], npz["index_na_mask"] if "index_na_mask" in npz else None),
+                         name=npz["index_name"][0] if len(npz["index_name"]) > 0 else None)
+        data_dict = {}
+        for column_index, column in enumerate(npz["columns"]):
+            data_dict[str(column)] = restore_column_array(npz["column_%i" % column_index],
+                                                          npz["na_mask_%i" % column_index] if "na_mask_%i" % column_index in npz else None)
+
+    return pd.DataFrame(data_dict, index=index, columns=list(data_dict.keys()))
+
+
+def read_with_cache(source_path, reader, label, cache_dir=None, parameters=()):
+    """
+    Reads table from the source file using reader function. If cache_dir is set, table is taken from cache
+    or, if the cache is absent or outdated, parsed and stored to cache.
+    :param source_path:
+    :param reader: function taking source_path and returning pandas.DataFrame
+    :param label: name of the table, part of the cache key
+    :param cache_dir: directory with cache files. If None, cache is not used
+    :param parameters: parsing parameters, part of the cache key
+    :return: pandas.DataFrame
+    """
+    if cache_dir is None:
+        return reader(source_path)
+
+    cache_path = get_cache_path(source_path, cache_dir, label, parameters=parameters)
+    if cache_path.exists():
+        return load_df_from_npz(cache_path)
+
+    df = reader(source_path)
+    save_df_to_npz(df, cache_path)
+
+    return df
@@ -0,0 +1,270 @@
+__author__ = 'mahajrod'
+
+import datetime
+
+import numpy as np
+
+# methods for which distance between clusters is not less than the minimal distance between their elements,
+# so clusters separated by a gap never merge below the height of this gap
+gap_preserving_linkage_methods = ("single", "complete", "average", "weighted", "ward")
+
+
+def get_single_linkage_1d(position_array):
+    """
+    Calculates single linkage for one-dimensional data without pairwise distance matrix.
+    Follows scipy minimum spanning tree algorithm (Prim's algorithm started from the first observation),
+    so output including order of merges with equal distances is the same as of scipy.cluster.hierarchy.linkage.
+    In one dimension the tree always spans a range of sorted positions, and the next observation is taken from
+    one of the borders of this range, so the whole procedure takes O(n log n).
+    :param position_array:
+    :return: linkage matrix in scipy format, observation ids correspond to the order in position_array
+    """
+    positions = np.asarray(position_array, dtype=np.float64).ravel()
+    observation_number = len(positions)
+    # observations with the same position are ordered by id
+    order = np.argsort(positions, kind="stable")
+    unique_positions, group_start_array = np.unique(positions[order], return_index=True)
+    group_end_list = np.append(group_start_array[1:], observation_number).tolist()
+    unique_position_list = unique_positions.tolist()
+    order_list = order.tolist()
+    # pointer to the first not merged observation in each group of observations with the same position
+    pointer_list = group_start_array.tolist()
+
+    left_group = right_group = int(np.searchsorted(unique_positions, positions[0])) if observation_number else 0
+    if observation_number:
+        pointer_list[left_group] += 1
+
+    merge_list = []
+    x = 0
+    for k in range(observation_number - 1):
+        candidate_list = [group for group in (left_group, right_group) if pointer_list[group] < group_end_list[group]]
+        if candidate_list:
+            distance = 0.0
+        else:
+            left_distance = unique_position_list[left_group] - unique_position_list[left_group - 1] if left_group > 0 else np.inf
+            right_distance = unique_position_list[right_group + 1] - unique_position_list[right_group] if right_group + 1 < len(unique_position_list) else np.inf
+            distance = min(left_distance, right_distance)
+            if left_distance == distance:
+                candidate_list.append(left_group - 1)
+            if right_distance == distance:
+                candidate_list.append(right_group + 1)
+        # observation with the smallest id is taken among equally distant ones
+        group = min(candidate_list, key=lambda g: order_list[pointer_list[g]])
+        left_group = min(left_group, group)
+        right_group = max(right_group, group)
+        y = order_list[pointer_list[group]]
+        pointer_list[group] += 1
+        merge_list.append((x, y, distance))
+        x = y
+
+    linkage = np.array(merge_list, dtype=np.float64).reshape(-1, 3)
+    linkage = linkage[np.argsort(linkage[:, 2], kind="mergesort")]
+
+    # labeling of clusters in the same way as in scipy
+    parent_list = list(range(2 * observation_number - 1))
+    size_list = [1] * observation_number + [0] * (observation_number - 1)
+
+    def find(node):
+        root = node
+        while parent_list[root] != root:
+            root = parent_list[root]
+        while parent_list[node] != root:
+            parent_list[node], node = root, parent_list[node]
+        return root
+
+    output_linkage = np.empty((len(linkage), 4), dtype=np.float64)
+    for row, (x, y, distance) in enumerate(linkage.tolist()):
+        x_root, y_root = find(int(x)), find(int(y))
+        new_node = observation_number + row
+        parent_list[x_root] = parent_list[y_root] = new_node
+        size_list[new_node] = size_list[x_root] + size_list[y_root]
+        output_linkage[row] = (min(x_root, y_root), max(x_root, y_root), distance, size_list[new_node])
+
+    return output_linkage
+
+
+def get_single_linkage_cophenet_1d(position_array):
+    """
+    Calculates cophenetic correlation coefficient of single linkage for one-dimensional data
+    without pairwise distance matrix. Cophenetic distance between sorted positions i < j is the maximal gap between
+    them, so sums over all pairs are obtained from gaps being maximal for each range of pairs (monotonic stack).
+    :param position_array:
+    :return: float
+    """
+    positions = np.sort(np.asarray(position_array, dtype=np.float64).ravel())
+    positions -= positions.mean()
+    observation_number = len(positions)
+    pair_number = observation_number * (observation_number - 1) / 2
+    gaps = np.diff(positions)
+    gap_number = len(gaps)
+
+    # for each gap k: pairs (a, b + 1) with left_border < a <= k <= b < right_border have k as the maximal gap
+    left_border_array = np.full(gap_number, -1, dtype=np.int64)
+    right_border_array = np.full(gap_number, gap_number, dtype=np.int64)
+    stack = []
+    gap_list = gaps.tolist()
+    for gap_index, gap in enumerate(gap_list):
+        while stack and gap_list[stack[-1]] < gap:
+            right_border_array[stack.pop()] = gap_index
+        if stack:
+            left_border_array[gap_index] = stack[-1]
+        stack.append(gap_index)
+
+    gap_index_array = np.arange(gap_number)
+    left_count_array = gap_index_array - left_border_array
+    right_count_array = right_border_array - gap_index_array
+    cumulative_positions = np.concatenate([[0.0], np.cumsum(positions)])
+
+    sum_x = np.sum(positions * (2 * np.arange(observation_number) - observation_number + 1))
+    sum_xx = observation_number * np.sum(positions ** 2) - np.sum(positions) ** 2
+    sum_y = np.sum(gaps * left_count_array * right_count_array)
+    sum_yy = np.sum(gaps ** 2 * left_count_array * right_count_array)
+    sum_xy = np.sum(gaps * (left_count_array * (cumulative_positions[right_border_array + 1] - cumulative_positions[gap_index_array + 1])
+                            - right_count_array * (cumulative_positions[gap_index_array + 1] - cumulative_positions[left_border_array + 1])))
+
+    covariance = sum_xy / pair_number - (sum_x / pair_number) * (sum_y / pair_number)
+    variance_x = sum_xx / pair_number - (sum_x / pair_number) ** 2
+    variance_y = sum_yy / pair_number - (sum_y / pair_number) ** 2
+
+    return covariance / np.sqrt(variance_x * variance_y)
+
+
+def get_gap_separated_chunks(position_array, max_gap):
+    """
+    Splits one-dimensional data into chunks separated by gaps larger than max_gap
+    :param position_array:
+    :param max_gap:
+    :return: list of arrays with indexes of observations in each chunk
+    """
+    positions = np.asarray(position_array, dtype=np.float64).ravel()
+    order = np.argsort(positions, kind="stable")
+
+    return np.split(order, np.flatnonzero(np.diff(positions[order]) > max_gap) + 1)
+
+
+def get_flat_cluster_leaf_order(linkage):
+    """
+    Returns order of observations in which scipy.cluster.hierarchy.fcluster numbers flat clusters
+    (subtrees before single observations for each node) and node separating each pair of adjacent observations.
+    :param linkage: linkage matrix in scipy format
+    :return: tuple (array with observation ids, array with rows of linkage matrix for adjacent observations)
+    """
+    observation_number = len(linkage) + 1
+    child_array = linkage[:, :2].astype(np.int64).tolist()
+    leaf_order_list = []
+    boundary_list = []
+    # non-negative values are nodes, negative ones (-row - 1) mark boundaries between parts of the node
+    stack = [2 * observation_number - 2] if observation_number > 1 else [0]
+    while stack:
+        node = stack.pop()
+        if node < 0:
+            boundary_list.append(-node - 1)
+        elif node < observation_number:
+            leaf_order_list.append(node)
+        else:
+            row = node - observation_number
+            first_child, second_child = sorted(child_array[row], key=lambda child: child < observation_number)
+            stack += [second_child, -row - 1, first_child]
+
+    return np.array(leaf_order_list, dtype=np.int64), np.array(boundary_list, dtype=np.int64)
+
+
+def get_flat_clusters(linkage, threshold_list, criterion="distance", depth=2):
+    """
+    Vectorized analog of scipy.cluster.hierarchy.fcluster for a list of thresholds.
+    For distance and inconsistent criteria clusters for all thresholds are obtained in a single pass:
+    flat clusters are contiguous in the order of get_flat_cluster_leaf_order, and adjacent observations
+    belong to the same cluster if maximal distance (inconsistency) for their common node is not larger than threshold.
+    Cluster ids are the same as of fcluster. Other criteria are processed by fcluster threshold by threshold.
+    :param linkage: linkage matrix in scipy format
+    :param threshold_list:
+    :param criterion:
+    :param depth: depth for inconsistent criterion
+    :return: int32 array of cluster ids with shape (number of observations, number of thresholds)
+    """
+    from scipy.cluster.hierarchy import fcluster, maxdists, maxinconsts, inconsistent
+
+    thresholds = np.asarray(threshold_list, dtype=np.float64)
+    observation_number = len(linkage) + 1
+
+    if criterion == "distance":
+        node_criterion_array = maxdists(linkage)
+    elif criterion == "inconsistent":
+        node_criterion_array = maxinconsts(linkage, inconsistent(linkage, depth))
+    else:
+        return np.column_stack([fcluster(linkage, t=threshold, criterion=criterion, depth=depth)
+                                for threshold in thresholds]).astype(np.int32).reshape(observation_number, len(thresholds))
+
+    leaf_order_array, boundary_array = get_flat_cluster_leaf_order(linkage)
+    ordered_cluster_array = np.ones((observation_number, len(thresholds)), dtype=np.int32)
+    ordered_cluster_array[1:] += np.cumsum(node_criterion_array[boundary_array][:, None] > thresholds[None, :],
+                                           axis=0, dtype=np.int32)
+
+    cluster_array = np.empty_like(ordered_cluster_array)
+    cluster_array[leaf_order_array] = ordered_cluster_array
+
+    return cluster_array
+
+
+def get_clusters_1d(position_array, threshold_list, method="single", extracting_method="distance", depth=2,
+                    chunked=None, max_distance_number=100000000):
+    """
+    Hierarchical clustering of one-dimensional data for a list of thresholds.
+    Single linkage is calculated from consecutive gaps without pairwise distance matrix.
+    In chunked mode for other gap-preserving methods and distance criterion data are clustered by chunks
+    separated by gaps larger than maximal threshold, so only distance matrices of chunks are calculated.
+    In this case clusters are the same, but cluster ids are numbered consecutively over chunks (not as in fcluster)
+    and cophenetic correlation coefficient is not calculated.
+    All other combinations of method and criterion use full pairwise distance matrix.
+    :param position_array:
+    :param threshold_list:
+    :param method:
+    :param extracting_method: criterion for scipy.cluster.hierarchy.fcluster
+    :param depth:
+    :param chunked: True - always use chunked mode, False - never use it,
+                    None(default) - use it only if size of full distance matrix exceeds max_distance_number
+    :param max_distance_number: maximal number of pairwise distances (n * (n - 1) / 2) to calculate without chunks.
+                                Ignored if chunked is not None
+    :return: tuple (int32 array of cluster ids with shape (number of observations, number of thresholds),
+                    cophenetic correlation coefficient or NaN)
+    """
+    from scipy.spatial.distance import pdist
+    from scipy.cluster.hierarchy import linkage, cophenet
+
+    positions = np.asarray(position_array, dtype=np.float64).reshape(-1, 1)
+
+    chunkable = (extracting_method == "distance") and (method in gap_preserving_linkage_methods)
+    if chunkable and (chunked is None):
+        distance_number = len(positions) * (len(positions) - 1) // 2
+        chunked = distance_number > max_distance_number
+        if chunked and (method != "single"):
+            print("%s\tNumber of pairwise distances (%i) exceeds %i, switching to chunked clustering. "
+                  "Cluster ids are numbered over chunks and cophenet is not calculated" % (str(datetime.datetime.now()),
+                                                                                           distance_number,
+                                                                                           max_distance_number))
+
+    if method == "single":
+        scaffold_linkage = get_single_linkage_1d(positions)
+        cophenet_coefficient = get_single_linkage_cophenet_1d(positions)
+    elif chunkable and chunked:
+        cluster_array = np.empty((len(positions), len(threshold_list)), dtype=np.int32)
+        cluster_id_shift = np.zeros(len(threshold_list), dtype=np.int32)
+        for chunk_index_array in get_gap_separated_chunks(positions, max(threshold_list)):
+            # original order of observations is kept to break ties in the same way as for the whole dataset
+            chunk_index_array = np.sort(chunk_index_array)
+            if len(chunk_index_array) == 1:
+                chunk_cluster_array = np.ones((1, len(threshold_list)), dtype=np.int32)
+            else:
+                chunk_cluster_array = get_flat_clusters(linkage(pdist(positions[chunk_index_array]), method=method),
+                                                        threshold_list, criterion=extracting_method, depth=depth)
+            cluster_array[chunk_index_array] = chunk_cluster_array + cluster_id_shift
+            cluster_id_shift += chunk_cluster_array.max(axis=0)
+
+        return cluster_array, np.nan
+    else:
+        distance = pdist(positions)
+        scaffold_linkage = linkage(distance, method=method)
+        cophenet_coefficient = cophenet(scaffold_linkage, distance)[0]
+
+    return get_flat_clusters(scaffold_linkage, threshold_list, criterion=extracting_method,
+                             depth=depth), cophenet_coefficient
@@ -0,0 +1,66 @@
+__author__ = 'mahajrod'
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from matplotlib.colors import to_hex
+
+
+def create_threshold_palette(thresholds, colors, background, masked=None):
+    """
+    Creates palette for threshold coloring. Palette indexes:
+        0                       - background, i.e. value <= thresholds[0]
+        1 .. len(thresholds)-1  - colors[i-1], i.e. thresholds[i-1] < value <= thresholds[i]
+        len(thresholds)         - colors[-1], i.e. value > thresholds[-1]
+        len(thresholds) + 1     - masked
+    If there are less colors than intervals between thresholds, last color is used for the remaining intervals.
+    :param thresholds:
+    :param colors:
+    :param background:
+    :param masked:
+    :return: list of colors
+    """
+    return [background] + [colors[min(i, len(colors) - 1)] for i in range(0, len(thresholds) - 1)] + \
+           [colors[-1], masked]
+
+
+def get_threshold_color_indexes(value_array, thresholds, masked_array=None):
+    """
+    Vectorized analog of Visualization.color_threshold_expression. Returns palette indexes
+    (see create_threshold_palette) instead of colors. NaN values get background index.
+    :param value_array:
+    :param thresholds:
+    :param masked_array: boolean array, True for masked values
+    :return: int array
+    """
+    values = np.asarray(value_array, dtype=np.float64)
+    index_array = np.digitize(values, np.asarray(thresholds, dtype=np.float64), right=True)
+    index_array[np.isnan(values)] = 0
+    if masked_array is not None:
+        index_array[np.asarray(masked_array, dtype=bool)] = len(thresholds) + 1
+
+    return index_array
+
+
+def get_threshold_colors(value_array, thresholds, colors, background, masked=None, masked_array=None):
+    """
+    Assigns colors to values using thresholds in a single pass. Masked values get masked color.
+    :param value_array:
+    :param thresholds:
+    :param colors:
+    :param background:
+    :param masked: color for masked values
+    :param masked_array: boolean array, True for masked values
+    :return: pandas.Categorical with colors. Non-string colors are converted to hex format.
+    """
+    palette = [color if isinstance(color, str) else to_hex(color, keep_alpha=len(color) == 4)
+               for color in create_threshold_palette(thresholds, colors, background,
+                                                     masked=masked if masked is not None else background)]
+    categories = list(OrderedDict.fromkeys(palette))
+    code_lut = np.array([categories.index(color) for color in palette])
+
+    return pd.Categorical.from_codes(code_lut[get_threshold_color_indexes(value_array, thresholds,
+                                                                          masked_array=masked_array)],
+                                     categories=categories)
@@ -1,5 +1,6 @@
 __author__ = 'mahajrod'
 
+import io
 import re
 import os
 import sys
@@ -25,3 +26,27 @@ def metaopen(filename, flags, buffering=None, compresslevel=5):
             return open(filename, flags, buffering=buffering)
         else:
             return open(filename, flags)
+
+
+# empty BGZF block, marks the end of bgzip-compressed file
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def compress_bgzf(data, compresslevel=6):
+    """
+    Compresses data to BGZF blocks, as bgzip does. As BGZF file is a concatenation of blocks, output of several calls
+    could be appended to the same file. BGZF_EOF should be written at the end of the file.
+    :param data: bytes
+    :param compresslevel:
+    :return: bytes
+    """
+    from Bio.bgzf import BgzfWriter
+
+    if not data:
+        return b""
+    buffer = io.BytesIO()
+    writer = BgzfWriter(fileobj=buffer, compresslevel=compresslevel)
+    writer.write(data)
+    writer.flush()
+
+    return buffer.getvalue()
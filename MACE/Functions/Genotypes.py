@@ -0,0 +1,173 @@
+__author__ = 'mahajrod'
+
+from functools import reduce
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def get_allele_counts_in_rows(allele_array):
+    """
+    Counts for each element of the 2-D integer array number of its occurrences in the same row.
+    Elements are encoded with row offset, so counting for the whole array is done by a single bincount.
+    :param allele_array: 2-D integer array, i.e. variants x (samples * ploidy)
+    :return: int array with the same shape as allele_array
+    """
+    allele_array = np.asarray(allele_array, dtype=np.int64)
+    if allele_array.size == 0:
+        return np.zeros(allele_array.shape, dtype=np.int64)
+    min_allele = allele_array.min()
+    allele_number = allele_array.max() - min_allele + 1
+    code_array = (allele_array - min_allele) + (np.arange(allele_array.shape[0], dtype=np.int64) * allele_number)[:, None]
+
+    return np.bincount(code_array.ravel(), minlength=allele_array.shape[0] * allele_number)[code_array]
+
+
+def get_singleton_masks(allele_array, chunk_size=100000):
+    """
+    Detects singletons for diploid genotypes. Allele is a singleton if it occurs once in a variant,
+    and homozygous singleton is a homozygous genotype with an allele absent in other samples.
+    :param allele_array: 2-D integer array variants x (2 * samples), alleles of sample are in adjacent columns
+    :param chunk_size: number of variants processed at once
+    :return: tuple of boolean arrays variants x samples (double singletons, heterozygous singletons,
+             homozygous singletons)
+    """
+    allele_array = np.asarray(allele_array)
+    variant_number = allele_array.shape[0]
+    sample_number = allele_array.shape[1] // 2
+    double_singleton_array = np.empty((variant_number, sample_number), dtype=bool)
+    het_singleton_array = np.empty((variant_number, sample_number), dtype=bool)
+    hom_singleton_array = np.empty((variant_number, sample_number), dtype=bool)
+
+    for chunk_start in range(0, variant_number, chunk_size):
+        chunk = allele_array[chunk_start:chunk_start + chunk_size]
+        count_array = get_allele_counts_in_rows(chunk)
+        unique_mask = count_array == 1
+
+        double_singleton_array[chunk_start:chunk_start + chunk_size] = unique_mask[:, ::2] & unique_mask[:, 1::2]
+        het_singleton_array[chunk_start:chunk_start + chunk_size] = unique_mask[:, ::2] != unique_mask[:, 1::2]
+        # allele is present twice and genotype is homozygous
+        hom_singleton_array[chunk_start:chunk_start + chunk_size] = (count_array[:, ::2] == 2) & (chunk[:, ::2] == chunk[:, 1::2])
+
+    return double_singleton_array, het_singleton_array, hom_singleton_array
+
+
+def get_genotype_array(collection_vcf, ploidy=2):
+    """
+    Packs genotypes of all samples into a compact array. It is built once per collection and is shared
+    by zygosity, presence and unique variant statistics.
+    :param collection_vcf: CollectionVCF parsed in mode with genotypes
+    :param ploidy:
+    :return: int8 array with shape (variants, samples, ploidy), -1 for missing alleles
+    """
+    max_allele = np.iinfo(np.int8).max
+    gt_df = collection_vcf.records[collection_vcf.samples].xs("GT", axis=1, level=1)
+    gt_df = gt_df.reindex(columns=pd.MultiIndex.from_product([collection_vcf.samples, range(ploidy)]))
+
+    # filled column by column to avoid conversion of the whole dataframe to object array
+    genotype_array = np.empty((len(collection_vcf.samples) * ploidy, len(gt_df)), dtype=np.int8)
+    for column_index in range(gt_df.shape[1]):
+        allele_array = gt_df.iloc[:, column_index].to_numpy(dtype=np.float64, na_value=np.nan)
+        missing_mask = np.isnan(allele_array)
+        if (not missing_mask.all()) and (allele_array[~missing_mask].max() > max_allele):
+            raise ValueError("ERROR!!! Allele index %i of sample %s exceeds maximum for int8 (%i)" %
+                             (allele_array[~missing_mask].max(), gt_df.columns[column_index][0], max_allele))
+        genotype_array[column_index] = np.where(missing_mask, -1, allele_array)
+
+    return np.ascontiguousarray(genotype_array.T).reshape(len(gt_df), len(collection_vcf.samples), ploidy)
+
+
+def get_allele_arrays(genotype_array):
+    """
+    Splits genotype array by alleles. Elementwise operations on these 2-D arrays are much faster than
+    reductions along the short ploidy axis.
+    :param genotype_array: output of get_genotype_array
+    :return: list of arrays with shape (variants, samples)
+    """
+    return [genotype_array[:, :, allele_index] for allele_index in range(genotype_array.shape[2])]
+
+
+def get_zygoty_counts(genotype_array):
+    """
+    Counts genotypes of each zygoty for each sample
+    :param genotype_array: output of get_genotype_array
+    :return: OrderedDict with arrays of counts per sample for "homo", "hetero", "ref" and "absent" genotypes
+    """
+    allele_array_list = get_allele_arrays(genotype_array)
+    absent_mask = reduce(np.logical_or, [allele_array < 0 for allele_array in allele_array_list])
+    ref_mask = reduce(np.logical_and, [allele_array == 0 for allele_array in allele_array_list])
+    hetero_mask = get_heterozygous_array(genotype_array, absent_mask=absent_mask)
+
+    absent_counts = absent_mask.sum(axis=0)
+    hetero_counts = hetero_mask.sum(axis=0)
+    ref_counts = ref_mask.sum(axis=0)
+
+    return OrderedDict([("homo", genotype_array.shape[0] - hetero_counts - absent_counts - ref_counts),
+                        ("hetero", hetero_counts),
+                        ("ref", ref_counts),
+                        ("absent", absent_counts)])
+
+
+def get_heterozygous_array(genotype_array, absent_mask=None):
+    """
+    Genotype is heterozygous if all its alleles are called and at least two of them are different
+    :param genotype_array: output of get_genotype_array
+    :param absent_mask: boolean array, True for genotypes with missing alleles. Calculated if not set
+    :return: boolean array with shape (variants, samples)
+    """
+    allele_array_list = get_allele_arrays(genotype_array)
+    if absent_mask is None:
+        absent_mask = reduce(np.logical_or, [allele_array < 0 for allele_array in allele_array_list])
+
+    return reduce(np.logical_or, [allele_array != allele_array_list[0] for allele_array in allele_array_list[1:]],
+                  np.zeros(absent_mask.shape, dtype=bool)) & ~absent_mask
+
+
+def get_variant_presence_array(genotype_array):
+    """
+    Variant is present in sample if at least one of its alleles is not reference
+    :param genotype_array: output of get_genotype_array
+    :return: boolean array with shape (variants, samples)
+    """
+    return reduce(np.logical_or, [allele_array > 0 for allele_array in get_allele_arrays(genotype_array)])
+
+
+def get_uniq_variant_mask(presence_array):
+    """
+    :param presence_array: output of get_variant_presence_array
+    :return: boolean array, True for variants present only in one sample
+    """
+    return np.count_nonzero(presence_array, axis=1) == 1
+
+
+def get_allele_length_array(ref_array, alt_array):
+    """
+    Builds per-locus allele length matrix
+    :param ref_array: array-like with reference alleles
+    :param alt_array: array-like with comma-separated alternative alleles, '.' for absent ones
+    :return: int32 array with shape (loci, 1 + maximal number of alternative alleles), column index is equal
+             to allele index in GT, -1 for absent alleles
+    """
+    ref_series = pd.Series(np.asarray(ref_array, dtype=object))
+    alt_df = pd.Series(np.asarray(alt_array, dtype=object)).str.split(",", expand=True)
+    alt_df = alt_df.where(alt_df != ".")
+
+    return pd.concat([ref_series.str.len(), alt_df.apply(lambda column: column.str.len())],
+                     axis=1, ignore_index=True).fillna(-1).to_numpy(dtype=np.int32)
+
+
+def get_genotype_allele_lengths(allele_length_array, genotype_array):
+    """
+    Translates genotypes to allele lengths by a single gather from the allele length matrix
+    :param allele_length_array: output of get_allele_length_array, shape (loci, alleles)
+    :param genotype_array: integer array with shape (loci, samples, ploidy), -1 for missing alleles
+                           (i.e. output of get_genotype_array)
+    :return: int32 array with shape (loci, samples, ploidy), -1 for missing alleles and alleles with unknown length
+    """
+    allele_number = allele_length_array.shape[1]
+    called_mask = (genotype_array >= 0) & (genotype_array < allele_number)
+    length_array = allele_length_array[np.arange(allele_length_array.shape[0])[:, None, None],
+                                       np.where(called_mask, genotype_array, 0)]
+
+    return np.where(called_mask, length_array, -1).astype(np.int32)
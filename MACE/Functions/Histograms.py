@@ -0,0 +1,88 @@
+__author__ = 'mahajrod'
+
+import numpy as np
+
+
+def update_integer_histograms(histogram_array, value_array):
+    """
+    Adds values to per-sample histograms with bins of width 1 starting from 0. Histogram array is enlarged if
+    values exceed its last bin. NaN and negative values are ignored, values are rounded to the nearest integer.
+    :param histogram_array: int64 array (samples x bins) or None for empty histograms
+    :param value_array: 2-D array (variants x samples)
+    :return: updated histogram array
+    """
+    value_array = np.asarray(value_array, dtype=np.float64)
+    sample_number = value_array.shape[1]
+    if histogram_array is None:
+        histogram_array = np.zeros((sample_number, 1), dtype=np.int64)
+
+    retained_mask = ~np.isnan(value_array) & (value_array >= 0)
+    integer_value_array = np.rint(value_array[retained_mask]).astype(np.int64)
+    sample_index_array = np.broadcast_to(np.arange(sample_number), value_array.shape)[retained_mask]
+
+    bin_number = max(histogram_array.shape[1], int(integer_value_array.max()) + 1 if len(integer_value_array) else 0)
+    if bin_number > histogram_array.shape[1]:
+        histogram_array = np.pad(histogram_array, ((0, 0), (0, bin_number - histogram_array.shape[1])))
+
+    histogram_array += np.bincount(sample_index_array * bin_number + integer_value_array,
+                                   minlength=sample_number * bin_number).reshape(sample_number, bin_number)
+
+    return histogram_array
+
+
+def get_histogram_medians(histogram_array):
+    """
+    Calculates exact medians of integer values from histograms produced by update_integer_histograms.
+    For even number of values median is the mean of two central values, as in numpy.median.
+    :param histogram_array: int64 array (samples x bins)
+    :return: float array with median for each sample, NaN for empty histograms
+    """
+    median_array = np.full(histogram_array.shape[0], np.nan)
+    for sample_index, histogram in enumerate(histogram_array):
+        cumulative_counts = np.cumsum(histogram)
+        value_number = cumulative_counts[-1]
+        if value_number == 0:
+            continue
+        lower = np.searchsorted(cumulative_counts, (value_number - 1) // 2, side="right")
+        upper = np.searchsorted(cumulative_counts, value_number // 2, side="right")
+        median_array[sample_index] = (lower + upper) / 2
+
+    return median_array
+
+
+def get_histogram_means(histogram_array):
+    """
+    :param histogram_array: int64 array (samples x bins) produced by update_integer_histograms
+    :return: float array with mean for each sample, NaN for empty histograms
+    """
+    value_number_array = histogram_array.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (histogram_array @ np.arange(histogram_array.shape[1], dtype=np.float64)) / value_number_array
+
+
+def get_histogram_maxs(histogram_array):
+    """
+    :param histogram_array: int64 array (samples x bins) produced by update_integer_histograms
+    :return: float array with maximal value for each sample, NaN for empty histograms
+    """
+    nonzero_mask = histogram_array > 0
+    max_array = (histogram_array.shape[1] - 1 - np.argmax(nonzero_mask[:, ::-1], axis=1)).astype(np.float64)
+    max_array[~nonzero_mask.any(axis=1)] = np.nan
+
+    return max_array
+
+
+def rebin_histograms(histogram_array, bins, scale_array=None):
+    """
+    Converts histograms of integer values to histograms with arbitrary bins. Result is the same as
+    numpy.histogram of raw values (divided by scale of the sample if scale_array is set).
+    :param histogram_array: int64 array (samples x bins) produced by update_integer_histograms
+    :param bins: bin edges
+    :param scale_array: optional array with scale for each sample, i.e. median
+    :return: int64 array (samples x (len(bins) - 1))
+    """
+    value_array = np.arange(histogram_array.shape[1], dtype=np.float64)
+
+    return np.vstack([np.histogram(value_array / (1 if scale_array is None else scale_array[sample_index]),
+                                   bins=bins, weights=histogram)[0]
+                      for sample_index, histogram in enumerate(histogram_array)]).astype(np.int64)
@@ -0,0 +1,110 @@
+__author__ = 'mahajrod'
+
+import numpy as np
+import pandas as pd
+
+from Bio import SeqIO
+
+from MACE.Functions.Cache import read_with_cache
+
+
+def get_homopolymer_runs(sequence, min_run_length=2):
+    """
+    Finds homopolymer runs in sequence. Case is ignored, runs of N are skipped.
+    :param sequence: str, Seq or SeqRecord
+    :param min_run_length: minimal length of runs to report
+    :return: tuple (int64 array of 0-based run starts, int32 array of run lengths, uint8 array of run bases)
+    """
+    if hasattr(sequence, "seq"):
+        sequence = sequence.seq
+    base_array = np.frombuffer(str(sequence).upper().encode("ascii"), dtype=np.uint8)
+    if len(base_array) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint8)
+
+    start_array = np.concatenate([[0], np.flatnonzero(base_array[1:] != base_array[:-1]) + 1])
+    length_array = np.diff(np.append(start_array, len(base_array))).astype(np.int32)
+    retained_mask = (length_array >= min_run_length) & (base_array[start_array] != ord("N"))
+
+    return start_array[retained_mask], length_array[retained_mask], base_array[start_array][retained_mask]
+
+
+def get_homopolymer_run_df(reference, min_run_length=2):
+    """
+    Builds homopolymer run index for all scaffolds of reference. Fasta file is parsed scaffold by scaffold,
+    so only one scaffold is kept in memory.
+    :param reference: path to fasta file or dict-like object with sequences (i.e. output of SeqIO.index or SeqIO.to_dict)
+    :param min_run_length: minimal length of runs to store
+    :return: DataFrame indexed by scaffold with columns start (0-based), length and base, sorted by start
+             inside each scaffold
+    """
+    if isinstance(reference, (str, bytes)) or hasattr(reference, "__fspath__"):
+        sequence_iterator = ((record.id, record) for record in SeqIO.parse(reference, format="fasta"))
+    else:
+        sequence_iterator = ((scaffold, reference[scaffold]) for scaffold in reference)
+
+    scaffold_list = []
+    start_list = []
+    length_list = []
+    base_list = []
+    for scaffold, sequence in sequence_iterator:
+        start_array, length_array, base_array = get_homopolymer_runs(sequence, min_run_length=min_run_length)
+        scaffold_list.append(np.full(len(start_array), scaffold, dtype=object))
+        start_list.append(start_array)
+        length_list.append(length_array)
+        base_list.append(base_array)
+
+    if not scaffold_list:
+        return pd.DataFrame({"start": np.empty(0, dtype=np.int64), "length": np.empty(0, dtype=np.int32),
+                             "base": np.empty(0, dtype=object)}, index=pd.Index([], name="scaffold"))
+
+    return pd.DataFrame({"start": np.concatenate(start_list),
+                         "length": np.concatenate(length_list),
+                         "base": np.concatenate(base_list).view("S1").astype(str).astype(object)},
+                        index=pd.Index(np.concatenate(scaffold_list), name="scaffold"))
+
+
+def read_homopolymer_run_df(fasta_file, min_run_length=2, cache_dir=None):
+    """
+    Same as get_homopolymer_run_df, but index could be taken from cache (see MACE.Functions.Cache)
+    :param fasta_file:
+    :param min_run_length:
+    :param cache_dir: directory with cache files, i.e. directory of fasta file. If None, cache is not used
+    :return: DataFrame
+    """
+    return read_with_cache(fasta_file, lambda path: get_homopolymer_run_df(path, min_run_length=min_run_length),
+                           "homopolymers", cache_dir=cache_dir, parameters=(min_run_length,))
+
+
+def get_run_lengths_at_positions(homopolymer_run_df, scaffold_array, position_array):
+    """
+    Finds lengths of homopolymer runs containing positions by binary search against run index.
+    Positions outside of stored runs (including scaffolds without stored runs) get length 1.
+    :param homopolymer_run_df: output of get_homopolymer_run_df
+    :param scaffold_array: array with scaffolds of positions
+    :param position_array: array with 0-based positions
+    :return: int64 array with run lengths
+    """
+    scaffold_array = np.asarray(scaffold_array)
+    position_array = np.asarray(position_array, dtype=np.int64)
+    run_length_array = np.ones(len(position_array), dtype=np.int64)
+
+    scaffold_codes, scaffolds = pd.factorize(scaffold_array)
+    run_scaffold_index_dict = pd.Series(np.arange(len(homopolymer_run_df))).groupby(homopolymer_run_df.index.to_numpy()).indices
+    run_start_array = homopolymer_run_df["start"].to_numpy(dtype=np.int64)
+    run_length_values = homopolymer_run_df["length"].to_numpy(dtype=np.int64)
+
+    for scaffold_code, scaffold in enumerate(scaffolds):
+        if scaffold not in run_scaffold_index_dict:
+            continue
+        point_index_array = np.flatnonzero(scaffold_codes == scaffold_code)
+        run_index_array = run_scaffold_index_dict[scaffold]
+        start_array = run_start_array[run_index_array]
+        length_array = run_length_values[run_index_array]
+
+        candidate_array = np.searchsorted(start_array, position_array[point_index_array], side="right") - 1
+        inside_mask = candidate_array >= 0
+        inside_mask[inside_mask] = position_array[point_index_array][inside_mask] < \
+                                   (start_array + length_array)[candidate_array[inside_mask]]
+        run_length_array[point_index_array[inside_mask]] = length_array[candidate_array[inside_mask]]
+
+    return run_length_array
@@ -0,0 +1,115 @@
+__author__ = 'mahajrod'
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def get_interval_index(scaffold_array, start_array, end_array):
+    """
+    Builds per-scaffold index of 0-based half-open intervals. Intervals of each scaffold are split into classes
+    by length (powers of two) and sorted by start inside each class. As lengths inside class differ less
+    than twice, all intervals containing a point are found by two searchsorted calls with only a small number
+    of extra candidates, even for nested intervals. Intervals of zero length are ignored.
+    :param scaffold_array: array with scaffold of each interval
+    :param start_array: array with 0-based starts
+    :param end_array: array with ends (exclusive)
+    :return: OrderedDict scaffold -> list of tuples (sorted start array, end array, interval index array, max length)
+    """
+    scaffold_array = np.asarray(scaffold_array)
+    start_array = np.asarray(start_array, dtype=np.int64)
+    end_array = np.asarray(end_array, dtype=np.int64)
+    length_array = end_array - start_array
+    retained_index_array = np.flatnonzero(length_array > 0)
+    length_class_array = np.floor(np.log2(length_array[retained_index_array])).astype(np.int64)
+
+    interval_index = OrderedDict()
+    if len(retained_index_array) == 0:
+        return interval_index
+    scaffold_codes, scaffolds = pd.factorize(scaffold_array[retained_index_array])
+    order = np.lexsort((start_array[retained_index_array], length_class_array, scaffold_codes))
+    retained_index_array = retained_index_array[order]
+    scaffold_codes = scaffold_codes[order]
+    length_class_array = length_class_array[order]
+
+    group_start_array = np.flatnonzero(np.concatenate([[True],
+                                                       (scaffold_codes[1:] != scaffold_codes[:-1]) |
+                                                       (length_class_array[1:] != length_class_array[:-1])]))
+    for group_start, group_end in zip(group_start_array, np.append(group_start_array[1:], len(order))):
+        index_array = retained_index_array[group_start:group_end]
+        scaffold = scaffolds[scaffold_codes[group_start]]
+        if scaffold not in interval_index:
+            interval_index[scaffold] = []
+        interval_index[scaffold].append((start_array[index_array], end_array[index_array], index_array,
+                                         length_array[index_array].max()))
+
+    return interval_index
+
+
+def get_point_overlaps(interval_index, scaffold_array, position_array):
+    """
+    Finds all pairs of points and intervals containing them.
+    :param interval_index: output of get_interval_index
+    :param scaffold_array: array with scaffold of each point
+    :param position_array: array with 0-based positions of points
+    :return: tuple of int64 arrays (point index array, interval index array), pairs are sorted by point index
+    """
+    scaffold_array = np.asarray(scaffold_array)
+    position_array = np.asarray(position_array, dtype=np.int64)
+    point_index_list = []
+    interval_index_list = []
+
+    scaffold_codes, scaffolds = pd.factorize(scaffold_array)
+    for scaffold_code, scaffold in enumerate(scaffolds):
+        if scaffold not in interval_index:
+            continue
+        scaffold_point_index_array = np.flatnonzero(scaffold_codes == scaffold_code)
+        scaffold_position_array = position_array[scaffold_point_index_array]
+        for start_array, end_array, index_array, max_length in interval_index[scaffold]:
+            # interval [start, end) with length <= max_length could contain position only if
+            # position - max_length < start <= position
+            upper_array = np.searchsorted(start_array, scaffold_position_array, side="right")
+            lower_array = np.searchsorted(start_array, scaffold_position_array - max_length, side="right")
+            candidate_number_array = upper_array - lower_array
+            candidate_point_array = np.repeat(np.arange(len(scaffold_position_array)), candidate_number_array)
+            candidate_array = np.arange(candidate_number_array.sum()) - \
+                              np.repeat(np.cumsum(candidate_number_array) - candidate_number_array,
+                                        candidate_number_array) + \
+                              np.repeat(lower_array, candidate_number_array)
+            overlap_mask = end_array[candidate_array] > scaffold_position_array[candidate_point_array]
+            point_index_list.append(scaffold_point_index_array[candidate_point_array[overlap_mask]])
+            interval_index_list.append(index_array[candidate_array[overlap_mask]])
+
+    if not point_index_list:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    point_index_array = np.concatenate(point_index_list)
+    interval_index_array = np.concatenate(interval_index_list)
+    order = np.argsort(point_index_array, kind="stable")
+
+    return point_index_array[order], interval_index_array[order]
+
+
+def get_point_overlap_mask(interval_index, scaffold_array, position_array):
+    """
+    :param interval_index: output of get_interval_index
+    :param scaffold_array: array with scaffold of each point
+    :param position_array: array with 0-based positions of points
+    :return: boolean array, True for points located inside at least one interval
+    """
+    overlap_mask = np.zeros(len(position_array), dtype=bool)
+    overlap_mask[get_point_overlaps(interval_index, scaffold_array, position_array)[0]] = True
+
+    return overlap_mask
+
+
+def get_points_in_intervals(sorted_position_array, start_array, end_array):
+    """
+    Finds ranges of sorted points located inside intervals [start, end) by binary search.
+    :param sorted_position_array: sorted array with positions of points on the same scaffold
+    :param start_array: array with starts of intervals
+    :param end_array: array with ends (exclusive) of intervals
+    :return: tuple of int64 arrays (first point index, last point index + 1) for each interval
+    """
+    return np.searchsorted(sorted_position_array, start_array, side="left"), \
+           np.searchsorted(sorted_position_array, end_array, side="left")
@@ -0,0 +1,141 @@
+__author__ = 'mahajrod'
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from MACE.Functions.General import metaopen
+from MACE.Functions.Cache import read_with_cache
+
+
+def scan_fasta_lengths(fasta_file, block_size=16777216):
+    """
+    Counts lengths of sequences in fasta file(plain, gzipped or bzipped) by a single pass over the file.
+    File is read by blocks, so memory doesn't depend on sizes of sequences. Whitespaces inside sequences are ignored.
+    :param fasta_file:
+    :param block_size: size of block in bytes
+    :return: DataFrame indexed by scaffold with int64 column length, scaffolds are in the same order as in the file.
+             ValueError is raised if file contains no sequences
+    """
+    scaffold_list = []
+    length_list = []
+    header = None
+    length = 0
+    in_header = False
+    with metaopen(str(fasta_file), "rb") as in_fd:
+        while True:
+            block = in_fd.read(block_size)
+            if not block:
+                break
+            position = 0
+            while position < len(block):
+                if in_header:
+                    header_end = block.find(b"\n", position)
+                    header += block[position:] if header_end < 0 else block[position:header_end]
+                    if header_end < 0:
+                        break
+                    in_header = False
+                    position = header_end + 1
+                    continue
+                # '>' could appear only at the start of header line
+                next_header = block.find(b">", position)
+                sequence = block[position:] if next_header < 0 else block[position:next_header]
+                length += len(sequence) - sum(sequence.count(whitespace) for whitespace in (b"\n", b"\r", b" ", b"\t"))
+                if next_header < 0:
+                    break
+                if header is not None:
+                    scaffold_list.append(header)
+                    length_list.append(length)
+                header = b""
+                length = 0
+                in_header = True
+                position = next_header + 1
+
+    if header is None:
+        raise ValueError("ERROR!!! No sequences were found in %s" % str(fasta_file))
+    scaffold_list.append(header)
+    length_list.append(length)
+
+    return pd.DataFrame({"length": np.array(length_list, dtype=np.int64)},
+                        index=pd.Index([header.decode().split()[0] if header.strip() else "" for header in scaffold_list],
+                                       name="scaffold"))
+
+
+def read_length_file(length_file):
+    """
+    Reads lengths of scaffolds from .len (scaffold and length columns) or .fai (samtools faidx) file
+    :param length_file:
+    :return: DataFrame indexed by scaffold with int64 column length
+    """
+    length_df = pd.read_csv(length_file, sep="\t", header=None, comment="#", usecols=[0, 1], names=["scaffold", "length"],
+                            dtype={"scaffold": str, "length": np.int64}, index_col=0)
+    length_df.index.name = "scaffold"
+
+    return length_df
+
+
+def is_fasta_file(sequence_file, fasta_suffixes=(".fa", ".fasta", ".fna", ".fas")):
+    """
+    Checks if file(plain, gzipped or bzipped) is in fasta format by its suffix or by leading '>'
+    :param sequence_file:
+    :param fasta_suffixes:
+    :return: bool
+    """
+    file_name = Path(sequence_file).name
+    for suffix in (".gz", ".bz2"):
+        if file_name.endswith(suffix):
+            file_name = file_name[:-len(suffix)]
+            break
+    if file_name.endswith(tuple(fasta_suffixes)):
+        return True
+
+    with metaopen(str(sequence_file), "rb") as in_fd:
+        return in_fd.read(1024).lstrip().startswith(b">")
+
+
+def get_scaffold_length_df(reference, cache_dir=None, use_cache=True, sort_by_length=False):
+    """
+    Returns lengths of scaffolds of the reference without parsing of sequences. Lengths are taken from
+    (in order of priority):
+        1. reference itself if it is not a fasta file (see is_fasta_file), i.e. .len, .fai or other tab-separated
+           file with scaffold ids and lengths in the first two columns
+        2. <reference>.fai or .len file with the same prefix as the reference
+        3. cache of previous scan (see MACE.Functions.Cache)
+        4. streaming scan of the reference, result is stored to cache
+    :param reference: path to fasta file(plain, gzipped or bzipped) or file with lengths
+    :param cache_dir: directory with cache files. Default: directory of the reference
+    :param use_cache: use cache for scanned fasta files. If cache directory is not writable, cache is not stored
+    :param sort_by_length: sort scaffolds by length (descending) and id, as in RouToolPa CollectionSequence.
+                           Otherwise order of the file is kept
+    :return: DataFrame indexed by scaffold with int64 column length
+    """
+    reference = Path(reference)
+    reference_prefix = reference.name
+    for suffix_list in ((".gz", ".bz2"), (".fa", ".fasta", ".fna", ".fas")):
+        for suffix in suffix_list:
+            if reference_prefix.endswith(suffix):
+                reference_prefix = reference_prefix[:-len(suffix)]
+                break
+
+    if (reference.suffix in (".len", ".fai")) or (not is_fasta_file(reference)):
+        length_df = read_length_file(reference)
+    else:
+        for length_file in (Path(str(reference) + ".fai"), reference.parent / (reference_prefix + ".len")):
+            if length_file.exists():
+                length_df = read_length_file(length_file)
+                break
+        else:
+            cache_dir = (cache_dir if cache_dir is not None else reference.parent) if use_cache else None
+            if (cache_dir is not None) and Path(cache_dir).exists() and not os.access(cache_dir, os.W_OK):
+                cache_dir = None
+            length_df = read_with_cache(reference, scan_fasta_lengths, "len", cache_dir=cache_dir)
+            length_df["length"] = length_df["length"].astype(np.int64)
+            length_df.index = length_df.index.astype(str)
+            length_df.index.name = "scaffold"
+
+    if sort_by_length:
+        length_df = length_df.sort_values(by=["length", "scaffold"], ascending=(False, True))
+
+    return length_df
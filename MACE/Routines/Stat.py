@@ -6,9 +6,12 @@ __author__ = 'Sergei F. Kliver'
 
 import os
 import re
+import csv
 import datetime
 
 from math import sqrt
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from functools import reduce, partial
 from collections import OrderedDict
@@ -35,6 +38,16 @@ from RouToolPa.Routines import DrawingRoutines
 from RouToolPa.GeneralRoutines.File import FileRoutines
 import RouToolPa.Formats.VariantFormats as VariantFormats
 
+from MACE.Functions.General import metaopen, compress_bgzf, BGZF_EOF
+from MACE.Functions.Genotypes import get_singleton_masks, get_genotype_array, get_zygoty_counts, \
+    get_variant_presence_array, get_uniq_variant_mask, get_heterozygous_array
+from MACE.Functions.Histograms import update_integer_histograms, get_histogram_medians, \
+    get_histogram_means, get_histogram_maxs, rebin_histograms
+from MACE.Functions.Homopolymers import get_homopolymer_run_df, read_homopolymer_run_df, \
+    get_run_lengths_at_positions
+from MACE.Functions.Intervals import get_interval_index, get_point_overlaps, get_points_in_intervals
+from MACE.Functions.Clustering import get_single_linkage_1d, get_single_linkage_cophenet_1d, get_clusters_1d
+
 ref_alt_variants = {"deaminases": [("C", ["T"]), ("G", ["A"])]
                     }
 
@@ -50,24 +63,19 @@ class StatsVCF(FileRoutines):
 
     # ------------------------------------ General stats ---------------------------------------------
     @staticmethod
-    def count_zygoty(collection_vcf, outfile=None):
-        # suitable onl for diploid genomes
+    def count_zygoty(collection_vcf, outfile=None, genotype_array=None):
+        """
+        Suitable only for diploid genomes
+        :param collection_vcf:
+        :param outfile:
+        :param genotype_array: output of MACE.Functions.Genotypes.get_genotype_array for collection_vcf.
+                               Calculated if not set
+        :return:
+        """
         if collection_vcf.parsing_mode in collection_vcf.parsing_modes_with_genotypes:
-            zygoty_counts = OrderedDict()
-            variant_number = np.shape(collection_vcf.records)[0]
-            for sample in collection_vcf.samples:
-                zygoty_counts[sample] = OrderedDict({
-                                                     "homo": 0,
-                                                     "hetero": 0,
-                                                     "ref": 0,
-                                                     "absent": 0,
-                                                     })
-                zygoty_counts[sample]["absent"] = np.sum(collection_vcf.records[sample]["GT"][0].isna() | collection_vcf.records[sample]["GT"][1].isna())
-                zygoty_counts[sample]["hetero"] = np.sum(collection_vcf.records[sample]["GT"][0] != collection_vcf.records[sample]["GT"][1]) - zygoty_counts[sample]["absent"]
-                zygoty_counts[sample]["ref"] = np.sum((collection_vcf.records[sample]["GT"][0] == 0) & (collection_vcf.records[sample]["GT"][1] == 0))
-                zygoty_counts[sample]["homo"] = variant_number - zygoty_counts[sample]["hetero"] - zygoty_counts[sample]["absent"] - zygoty_counts[sample]["ref"]
-                #collection_vcf.records.xs('GT', axis=1, level=1, drop_level=False).apply()
-            zygoty_counts  = pd.DataFrame(zygoty_counts)
+            if genotype_array is None:
+                genotype_array = get_genotype_array(collection_vcf)
+            zygoty_counts = pd.DataFrame(get_zygoty_counts(genotype_array), index=collection_vcf.samples).transpose()
             if outfile:
                 zygoty_counts.to_csv(outfile, sep="\t", header=True, index=True)
             return zygoty_counts
@@ -76,15 +84,13 @@ class StatsVCF(FileRoutines):
                              "Use 'coordinates_and_genotypes', 'genotypes' or 'complete modes'" % collection_vcf.parsing_mode)
 
     @staticmethod
-    def count_variants(collection_vcf, outfile=None):
+    def count_variants(collection_vcf, outfile=None, genotype_array=None):
         if collection_vcf.parsing_mode in collection_vcf.parsing_modes_with_genotypes:
-            variant_counts = OrderedDict()
-            variant_number = np.shape(collection_vcf.records)[0]
-
-            for sample in collection_vcf.samples:
-                variant_counts[sample] = (collection_vcf.records[sample]["GT"].sum(axis=1) != 0).sum()
+            if genotype_array is None:
+                genotype_array = get_genotype_array(collection_vcf)
 
-            variant_counts = pd.Series(variant_counts)
+            variant_counts = pd.Series(get_variant_presence_array(genotype_array).sum(axis=0),
+                                       index=collection_vcf.samples)
             if outfile:
                 variant_counts.to_csv(outfile, sep="\t", header=True, index=True)
             return variant_counts
@@ -93,37 +99,77 @@ class StatsVCF(FileRoutines):
                              "Use 'coordinates_and_genotypes', 'genotypes' or 'complete' modes" % collection_vcf.parsing_mode)
 
     @staticmethod
-    def count_singletons(collection_vcf, output_prefix=None):
+    def check_variant_presence(collection_vcf, outfile=None, genotype_array=None):
+        if collection_vcf.parsing_mode in collection_vcf.parsing_modes_with_genotypes:
+            if genotype_array is None:
+                genotype_array = get_genotype_array(collection_vcf)
+
+            variant_presence = pd.DataFrame(get_variant_presence_array(genotype_array),
+                                            index=collection_vcf.records.index, columns=collection_vcf.samples)
+            if outfile:
+                variant_presence.to_csv(outfile, sep="\t", header=True, index=True)
+            return variant_presence
+        else:
+            raise ValueError("ERROR!!! Variant presence can't be counted for this parsing mode: %s."
+                             "Use 'coordinates_and_genotypes', 'genotypes' or 'complete modes'" % collection_vcf.parsing_mode)
+
+    def get_uniq_variants(self, collection_vcf, output_prefix, genotype_array=None):
+        variant_presence = self.check_variant_presence(collection_vcf, outfile="%s.variant_presence" % output_prefix,
+                                                       genotype_array=genotype_array)
+        return variant_presence[get_uniq_variant_mask(variant_presence.to_numpy())]
+
+    def count_uniq_variants(self, collection_vcf, output_prefix, extension_list=("png",), figsize=(5, 5), dpi=200,
+                            title="Unique variants", genotype_array=None):
+        if collection_vcf.parsing_mode in collection_vcf.parsing_modes_with_genotypes:
+            variant_presence = self.check_variant_presence(collection_vcf, genotype_array=genotype_array)
+            uniq_variant_counts = variant_presence[get_uniq_variant_mask(variant_presence.to_numpy())].sum()
+
+            if output_prefix:
+                uniq_variant_counts.to_csv("%s.uniq_variants.counts" % output_prefix, sep="\t", header=True, index=True)
+
+            fig = plt.figure(1, figsize=figsize, dpi=dpi)
+
+            bar_width = 0.5
+            bin_coord = np.arange(len(collection_vcf.samples))
+
+            plt.bar(bin_coord, uniq_variant_counts, width=bar_width, edgecolor='white', color='blue',)
+
+            plt.ylabel('Variants', fontweight='bold')
+            plt.xlabel('Sample', fontweight='bold')
+            plt.xticks(bin_coord, collection_vcf.samples, rotation=45)
+            plt.title(title, fontweight='bold')
+
+            for extension in extension_list:
+                plt.savefig("%s.%s" % (output_prefix, extension), bbox_inches='tight')
+            plt.close()
+
+            return uniq_variant_counts
+        else:
+            raise ValueError("ERROR!!! Variant presence can't be counted for this parsing mode: %s."
+                             "Use 'coordinates_and_genotypes', 'genotypes' or 'complete modes'" % collection_vcf.parsing_mode)
+
+    @staticmethod
+    def count_singletons(collection_vcf, output_prefix=None, genotype_array=None):
         """
         Works on diploid(!!!) genomes only
         :param collection_vcf:
         :param output_prefix:
+        :param genotype_array: output of MACE.Functions.Genotypes.get_genotype_array for collection_vcf.
+                               Calculated if not set
         :return:
         """
         if collection_vcf.parsing_mode in collection_vcf.parsing_modes_with_genotypes:
             singleton_counts = OrderedDict()
+            if genotype_array is None:
+                genotype_array = get_genotype_array(collection_vcf)
 
-            double_singleton_df = []
-            het_singleton_df = []
-            hom_singleton_df = []
-            #singleton_df = []
-
-            for element in collection_vcf.records[collection_vcf.samples].fillna(0).itertuples(index=False, name=None):
-                # ele_dict = dict(numpy.unique(a, return_counts=True))
-                ele_arr = np.array(element)
-                count_dict = dict(zip(*np.unique(ele_arr, return_counts=True)))
-                counts = np.array([count_dict[entry] for entry in ele_arr])
-
-                unique_mask = counts == 1
-                double_singleton_df.append(unique_mask[::2] & unique_mask[1:][::2])
-                het_singleton_df.append(unique_mask[::2] != unique_mask[1:][::2])
-                hom_singleton_df.append((counts == 2)[::2] & (ele_arr[::2] == ele_arr[1:][::2]))  # check if allel is double and if it is homozygote
-                #singleton_df.append(double_singleton_df[-1] | het_singleton_df[-1] | hom_singleton_df[-1])
+            # alleles of each sample are in adjacent columns, missing alleles are counted as reference ones
+            allele_array = np.maximum(genotype_array, 0).reshape(len(genotype_array), -1)
 
             df_list = []
             singleton_counts_df = []
-            for df in double_singleton_df, het_singleton_df, hom_singleton_df:#, singleton_df:
-                df_list.append(pd.DataFrame.from_records(df, columns=collection_vcf.samples, index=collection_vcf.records.index))
+            for singleton_array in get_singleton_masks(allele_array):
+                df_list.append(pd.DataFrame(singleton_array, columns=collection_vcf.samples, index=collection_vcf.records.index))
                 singleton_counts_df.append(df_list[-1].sum())
 
             singleton_counts_df = pd.DataFrame(singleton_counts_df, index=["double", "hetero", "homo"]).transpose()
@@ -190,15 +236,105 @@ class StatsVCF(FileRoutines):
         if scaffold_length < window_size:
             return 0
         return int((scaffold_length - window_size)/window_step) + 1
+
+    @staticmethod
+    def get_window_and_step_numbers(scaffold_length_df, window_size, window_step):
+        """
+        Calculates numbers of windows and of steps covered by windows for each scaffold and offsets of
+        scaffolds in flat (concatenated for all scaffolds) step and window arrays.
+        Scaffolds shorter than window are not included.
+        :param scaffold_length_df: DataFrame with scaffold ids as index and lengths as first column
+        :param window_size:
+        :param window_step:
+        :return: DataFrame with columns WINDOW, STEP, WINDOW_OFFSET, STEP_OFFSET and scaffold ids as index
+        """
+        lengths = np.asarray(scaffold_length_df.iloc[:, 0], dtype=np.int64)
+        window_numbers = np.where(lengths < window_size, 0, (lengths - window_size) // window_step + 1)
+        number_df = pd.DataFrame({"WINDOW": window_numbers}, index=scaffold_length_df.index)
+        number_df = number_df[number_df["WINDOW"] > 0].copy()
+        # window with index i covers steps i, ..., i + steps_in_window - 1
+        number_df["STEP"] = number_df["WINDOW"] + window_size // window_step - 1
+        for column in "WINDOW", "STEP":
+            number_df["%s_OFFSET" % column] = np.cumsum(number_df[column].to_numpy()) - number_df[column].to_numpy()
+
+        return number_df
+
+    @staticmethod
+    def get_window_index(window_number_df):
+        return pd.MultiIndex.from_arrays([np.repeat(window_number_df.index.to_numpy(),
+                                                    window_number_df["WINDOW"].to_numpy()),
+                                          np.arange(window_number_df["WINDOW"].sum()) - np.repeat(window_number_df["WINDOW_OFFSET"].to_numpy(),
+                                                                                                  window_number_df["WINDOW"].to_numpy())],
+                                         names=("CHROM", "WINDOW"))
+
+    @staticmethod
+    def get_flat_step_indexes(scaffold_array, position_array, window_number_df, window_step):
+        """
+        Converts scaffold ids and 0-based positions to indexes of steps in flat step array.
+        :param scaffold_array: array-like with scaffold ids
+        :param position_array: array-like with 0-based positions
+        :param window_number_df: output of get_window_and_step_numbers
+        :param window_step:
+        :return: tuple of flat step indexes for retained positions and boolean mask of retained positions.
+                 Positions from scaffolds shorter than window and from uncounted scaffold tails are dropped.
+        """
+        scaffold_codes = pd.Categorical(scaffold_array, categories=window_number_df.index).codes
+        step_indexes = np.asarray(position_array, dtype=np.int64).ravel() // window_step
+
+        mask = scaffold_codes >= 0
+        mask[mask] = step_indexes[mask] < window_number_df["STEP"].to_numpy()[scaffold_codes[mask]]
+
+        return window_number_df["STEP_OFFSET"].to_numpy()[scaffold_codes[mask]] + step_indexes[mask], mask
+
+    @staticmethod
+    def count_steps(flat_step_indexes, window_number_df, presence_array=None):
+        """
+        :param flat_step_indexes: output of get_flat_step_indexes
+        :param window_number_df: output of get_window_and_step_numbers
+        :param presence_array: optional boolean array (positions x samples), if set counts are calculated
+                               for each column independently
+        :return: int64 array with counts per step (steps) or (steps x samples)
+        """
+        step_number = int(window_number_df["STEP"].sum())
+        if presence_array is None:
+            return np.bincount(flat_step_indexes, minlength=step_number).astype(np.int64)
+        return np.column_stack([np.bincount(flat_step_indexes[presence_array[:, i]],
+                                            minlength=step_number) for i in range(0, np.shape(presence_array)[1])]).astype(np.int64)
+
+    @staticmethod
+    def convert_step_counts_to_window_counts(step_counts, window_number_df, steps_in_window):
+        """
+        Window counts are calculated as differences of cumulative sums of step counts, i.e
+        count of window i is cumsum[i + steps_in_window] - cumsum[i]
+        :param step_counts: output of count_steps
+        :param window_number_df: output of get_window_and_step_numbers
+        :param steps_in_window:
+        :return: int64 array with counts per window (windows) or (windows x samples)
+        """
+        cumsum = np.zeros((np.shape(step_counts)[0] + 1,) + np.shape(step_counts)[1:], dtype=np.int64)
+        np.cumsum(step_counts, axis=0, out=cumsum[1:])
+
+        window_numbers = window_number_df["WINDOW"].to_numpy()
+        first_steps = np.repeat(window_number_df["STEP_OFFSET"].to_numpy() - window_number_df["WINDOW_OFFSET"].to_numpy(),
+                                window_numbers) + np.arange(window_numbers.sum())
+
+        return cumsum[first_steps + steps_in_window] - cumsum[first_steps]
+
     # ---------------------------In progress--------------------------
 
     def count_variants_in_windows(self, collection_vcf, window_size, window_step, reference_scaffold_lengths=None,
                                   ignore_scaffolds_shorter_than_window=True, output_prefix=None,
                                   skip_empty_windows=False, expression=None, per_sample_output=False,
-                                  scaffold_black_list=None, scaffold_white_list=None,
-                                  scaffold_syn_dict=None
+                                  scaffold_black_list=[], scaffold_white_list=[],
+                                  scaffold_syn_dict=None, engine="numpy"
                                   ):
-        # TODO: rewrite tosimplify this function
+        """
+        Counts variants in windows
+        :param engine: 'numpy'(default) - counts of steps are calculated by np.bincount on flat step indexes
+                       and converted to window counts via differences of cumulative sums,
+                       'pandas' - old implementation based on groupby and shifts. Kept for comparison,
+                       for overlapping windows it ignores steps after the last window start
+        """
         window_stepppp = window_size if window_step is None else window_step
 
         if window_stepppp > window_size:
@@ -218,14 +354,9 @@ class StatsVCF(FileRoutines):
             ref_scaf_len_df = pd.DataFrame.from_dict(tmp_len_df, orient="index")
             ref_scaf_len_df.columns = ["length"]
 
-        def count_windows(scaffold_length):
-            return self.count_window_number_in_scaffold(scaffold_length, window_size, window_stepppp)
+        window_number_df = self.get_window_and_step_numbers(ref_scaf_len_df, window_size, window_stepppp)
 
-        number_of_windows_df = ref_scaf_len_df.applymap(count_windows)
-        number_of_windows_df.columns = ["WINDOW"]
-
-        short_scaffolds_ids = number_of_windows_df[number_of_windows_df['WINDOW'] == 0]
-        short_scaffolds_ids = IdSet(short_scaffolds_ids.index.unique().to_list())
+        short_scaffolds_ids = IdSet(ref_scaf_len_df.index[~ref_scaf_len_df.index.isin(window_number_df.index)].unique().to_list())
 
         vcf_scaffolds = set(collection_vcf.scaffold_list)
         reference_scaffolds = set(ref_scaf_len_df.index.unique().to_list())
@@ -237,81 +368,117 @@ class StatsVCF(FileRoutines):
             raise ValueError("ERROR!!! Some scaffolds from vcf file are absent in reference...")
         scaffolds_absent_in_vcf = IdSet(reference_scaffolds - vcf_scaffolds)
 
-        number_of_windows_non_zero_df = number_of_windows_df[number_of_windows_df['WINDOW'] > 0]
+        if expression:
+            records = collection_vcf.records[collection_vcf.records.apply(expression, axis=1)]
+        else:
+            records = collection_vcf.records
 
-        count_index = [[], []]
-        for scaffold in number_of_windows_non_zero_df.index:
-            count_index[0] += [scaffold] * number_of_windows_non_zero_df.loc[scaffold][0]
-            count_index[1] += list(np.arange(number_of_windows_non_zero_df.loc[scaffold][0]))
-        count_index = pd.MultiIndex.from_arrays(count_index, names=("CHROM", "WINDOW"))
+        if engine == "numpy":
+            flat_step_indexes, retained = self.get_flat_step_indexes(records.index.get_level_values("CHROM"),
+                                                                     records["POS"],
+                                                                     window_number_df, window_stepppp)
+            if per_sample_output:
+                variant_presence = self.check_variant_presence(collection_vcf)
+                presence_array = variant_presence.loc[records.index].to_numpy(dtype=bool)[retained]
+                columns = collection_vcf.samples
+            else:
+                presence_array = None
+                columns = ["All"] if len(collection_vcf.samples) > 1 else collection_vcf.samples
 
-        def get_overlapping_window_indexes(step_index):
-            # this function is used if windows have overlapps
-            # DO NOT FORGET TO REPLACE WINDOW INDEXES EQUAL OR LARGE TO WINDOW NUMBER
-            return [window_index for window_index in range(max(step_index - steps_in_window + 1, 0),
-                                                           step_index + 1)]
+            count_df = pd.DataFrame(self.convert_step_counts_to_window_counts(self.count_steps(flat_step_indexes,
+                                                                                               window_number_df,
+                                                                                               presence_array=presence_array),
+                                                                              window_number_df, steps_in_window),
+                                    index=self.get_window_index(window_number_df),
+                                    columns=columns)
 
-        def convert_step_counts_to_win_counts(df, number_of_steps_per_window):
+        elif engine == "pandas":
+            number_of_windows_non_zero_df = window_number_df[["WINDOW"]]
 
-            return reduce(lambda x, y: x.add(y, fill_value=0),
-                          [df.shift(periods=entry, fill_value=0) for entry in range(0, -number_of_steps_per_window, -1)])
+            count_index = [[], []]
+            for scaffold in number_of_windows_non_zero_df.index:
+                count_index[0] += [scaffold] * number_of_windows_non_zero_df.loc[scaffold][0]
+                count_index[1] += list(np.arange(number_of_windows_non_zero_df.loc[scaffold][0]))
+            count_index = pd.MultiIndex.from_arrays(count_index, names=("CHROM", "WINDOW"))
 
-            #if step_index < window_number else window_number)]
+            def get_overlapping_window_indexes(step_index):
+                # this function is used if windows have overlapps
+                # DO NOT FORGET TO REPLACE WINDOW INDEXES EQUAL OR LARGE TO WINDOW NUMBER
+                return [window_index for window_index in range(max(step_index - steps_in_window + 1, 0),
+                                                               step_index + 1)]
 
-        if expression:
-            step_index_df = collection_vcf.records[collection_vcf.records.apply(expression, axis=1)][['POS']] // window_stepppp
-        else:
-            step_index_df = collection_vcf.records[['POS']] // window_stepppp
-        step_index_df.columns = ["WINDOWSTEP"]
+            def convert_step_counts_to_win_counts(df, number_of_steps_per_window):
 
-        if per_sample_output:
-            count_df = []
+                return reduce(lambda x, y: x.add(y, fill_value=0),
+                              [df.shift(periods=entry, fill_value=0) for entry in range(0, -number_of_steps_per_window, -1)])
 
-            variant_presence = collection_vcf.check_variant_presence()
-            # string below is temporaly remove beforer git pull
-            variant_presence.columns = collection_vcf.samples
+                #if step_index < window_number else window_number)]
 
-            for sample in collection_vcf.samples:
-                tmp_count_df = pd.DataFrame(0, index=count_index,
-                                            columns=[sample],
-                                            dtype=np.int64)
-                variant_counts = step_index_df[variant_presence[sample]].reset_index(level=1).set_index(['WINDOWSTEP'], append=True).groupby(["CHROM", "WINDOWSTEP"]).count()
-                tmp_count_df[tmp_count_df.index.isin(variant_counts.index)] = variant_counts
-                count_df.append(tmp_count_df)
-            count_df = pd.concat(count_df, axis=1)
+            step_index_df = records[['POS']] // window_stepppp
+            step_index_df.columns = ["WINDOWSTEP"]
 
-        else:
-            count_df = pd.DataFrame(0, index=count_index,
-                                    columns=["All"] if len(collection_vcf.samples) > 1 else collection_vcf.samples,
-                                    dtype=np.int64)
-
-            # code for staking windows: in this case window step index  is equal to window index
-            variant_counts = step_index_df.reset_index(level=1).set_index(['WINDOWSTEP'],
-                                                                          append=True).groupby(["CHROM",
-                                                                                                "WINDOWSTEP"]).count()
-            count_df[count_df.index.isin(variant_counts.index)] = variant_counts
-            #bbb[bbb.index.get_level_values('CHROM').isin(number_of_windows_non_zero_df.index)]
-
-        #print(count_df)
-        #print(steps_in_window)
-        if window_stepppp != window_size:
-            count_df = count_df.groupby("CHROM").apply(partial(convert_step_counts_to_win_counts,
-                                                               number_of_steps_per_window=steps_in_window))
+            if per_sample_output:
+                count_df = []
+
+                variant_presence = collection_vcf.check_variant_presence()
+                # string below is temporaly remove beforer git pull
+                variant_presence.columns = collection_vcf.samples
+
+                for sample in collection_vcf.samples:
+                    tmp_count_df = pd.DataFrame(0, index=count_index,
+                                                columns=[sample],
+                                                dtype=np.int64)
+                    variant_counts = step_index_df[variant_presence[sample]].reset_index(level=1).set_index(['WINDOWSTEP'], append=True).groupby(["CHROM", "WINDOWSTEP"]).count()
+                    tmp_count_df[tmp_count_df.index.isin(variant_counts.index)] = variant_counts
+                    count_df.append(tmp_count_df)
+                count_df = pd.concat(count_df, axis=1)
+
+            else:
+                count_df = pd.DataFrame(0, index=count_index,
+                                        columns=["All"] if len(collection_vcf.samples) > 1 else collection_vcf.samples,
+                                        dtype=np.int64)
+
+                # code for staking windows: in this case window step index  is equal to window index
+                variant_counts = step_index_df.reset_index(level=1).set_index(['WINDOWSTEP'],
+                                                                              append=True).groupby(["CHROM",
+                                                                                                    "WINDOWSTEP"]).count()
+                count_df[count_df.index.isin(variant_counts.index)] = variant_counts
+                #bbb[bbb.index.get_level_values('CHROM').isin(number_of_windows_non_zero_df.index)]
 
             #print(count_df)
-            # window_index_df = step_index_df.applymap(get_overlapping_window_indexes)
-            pass
+            #print(steps_in_window)
+            if window_stepppp != window_size:
+                count_df = count_df.groupby("CHROM").apply(partial(convert_step_counts_to_win_counts,
+                                                                   number_of_steps_per_window=steps_in_window))
+
+                #print(count_df)
+                # window_index_df = step_index_df.applymap(get_overlapping_window_indexes)
+                pass
 
+        else:
+            raise ValueError("ERROR!!! Unknown engine: %s. Allowed: 'numpy', 'pandas'" % engine)
+
+        return self.filter_and_write_window_counts(count_df, output_prefix=output_prefix,
+                                                   scaffold_black_list=scaffold_black_list,
+                                                   scaffold_white_list=scaffold_white_list,
+                                                   scaffold_syn_dict=scaffold_syn_dict,
+                                                   scaffolds_absent_in_reference=scaffolds_absent_in_reference,
+                                                   scaffolds_absent_in_vcf=scaffolds_absent_in_vcf,
+                                                   short_scaffolds_ids=short_scaffolds_ids)
+
+    def filter_and_write_window_counts(self, count_df, output_prefix=None,
+                                       scaffold_black_list=[], scaffold_white_list=[], scaffold_syn_dict=None,
+                                       scaffolds_absent_in_reference=None, scaffolds_absent_in_vcf=None,
+                                       short_scaffolds_ids=None):
         #if ((scaffold_black_list is not None) and (not scaffold_black_list.empty)) or (scaffold_white_list is not None and (not scaffold_white_list.empty)):
         scaffold_to_keep = self.get_filtered_entry_list(count_df.index.get_level_values(level=0).unique().to_list(),
-                                                            entry_black_list=scaffold_black_list,
-                                                            entry_white_list=scaffold_white_list)
+                                                        entry_black_list=scaffold_black_list,
+                                                        entry_white_list=scaffold_white_list)
         count_df = count_df[count_df.index.isin(scaffold_to_keep, level=0)]
 
         if scaffold_syn_dict:
             count_df.rename(index=scaffold_syn_dict, inplace=True)
 
-
         # TODO: add storing of variants in uncounted tails
         #uncounted_tail_variants_number_dict = SynDict()
         #uncounted_tail_variant_number = step_size_number_df[step_size_number_df > ref_scaf_len_df].groupby(collection_vcf.records.index(level=0)).size()
@@ -330,6 +497,490 @@ class StatsVCF(FileRoutines):
             stat_df.to_csv("%s.variant_counts.stats" % output_prefix, sep='\t', header=True, index=True)
         return count_df
 
+    @staticmethod
+    def read_vcf_header(in_fd):
+        """
+        Reads metadata and header lines from opened vcf file. After it file position is set to the first record
+        :param in_fd: file object
+        :return: tuple of sample list and DataFrame with scaffold lengths from contig metadata lines
+        """
+        contig_dict = OrderedDict()
+        samples = []
+        while True:
+            line = in_fd.readline()
+            if not line:
+                break
+            if line[:9] == "##contig=":
+                contig_id = re.search("[<,]ID=([^,>]+)", line)
+                contig_length = re.search("[<,]length=([0-9]+)", line)
+                if contig_id and contig_length:
+                    contig_dict[contig_id.group(1)] = int(contig_length.group(1))
+            elif line[:6] == "#CHROM":
+                samples = line.strip().split("\t")[9:]
+                break
+
+        length_df = pd.DataFrame.from_dict(contig_dict, orient="index", columns=["length"])
+        length_df.index.name = "scaffold"
+
+        return samples, length_df
+
+    @staticmethod
+    def read_vcf_records_by_chunks(in_fd, usecols, chunk_size=1000000, dtype=str):
+        """
+        Reads records from vcf file opened and positioned after header (see read_vcf_header) by chunks.
+        Quotes have no special meaning in vcf, so they are not parsed. File without records yields no chunks.
+        :param in_fd: file object
+        :param usecols: 0-based indexes of columns to read
+        :param chunk_size: number of records to read at once
+        :param dtype: dtype or dict with dtypes of columns
+        :return: generator of DataFrames with columns named by their indexes
+        """
+        try:
+            reader = pd.read_csv(in_fd, sep="\t", header=None, usecols=usecols, dtype=dtype, na_filter=False,
+                                 quoting=csv.QUOTE_NONE, chunksize=chunk_size)
+        except pd.errors.EmptyDataError:
+            return
+        with reader:
+            for chunk in reader:
+                yield chunk
+
+    @staticmethod
+    def get_variant_presence_from_sample_fields(sample_field_df):
+        """
+        Variant is treated as present in sample if genotype contains at least one called non-reference allele
+        :param sample_field_df: DataFrame with raw sample fields from vcf file. GT must be the first subfield
+        :return: boolean array (variants x samples)
+        """
+        # sample fields and genotypes are highly redundant, so each unique value is parsed only once
+        field_codes, unique_fields = pd.factorize(sample_field_df.to_numpy().ravel())
+        genotype_codes, unique_genotypes = pd.factorize(pd.Series(unique_fields, dtype=object).str.split(":", n=1).str[0])
+        genotype_presence_array = np.array([any(allele not in ("0", ".") for allele in re.split("[/|]", genotype))
+                                            for genotype in unique_genotypes], dtype=bool)
+
+        return genotype_presence_array[genotype_codes][field_codes].reshape(np.shape(sample_field_df))
+
+    def count_variants_in_windows_from_file(self, vcf_file, window_size, window_step, reference_scaffold_lengths=None,
+                                            output_prefix=None, per_sample_output=False, chunk_size=1000000,
+                                            scaffold_black_list=[], scaffold_white_list=[],
+                                            scaffold_syn_dict=None):
+        """
+        Streaming version of count_variants_in_windows. Vcf file(plain, gzipped or bzipped) is read by chunks of
+        chunk_size records, counts of steps are updated after each chunk, so memory usage depends
+        on number of windows and chunk size but not on number of variants.
+        :param vcf_file: path to vcf file
+        :param reference_scaffold_lengths: DataFrame or dict with scaffold lengths.
+                                           If not set, lengths are taken from contig lines in vcf metadata
+        :param chunk_size: number of records to read at once
+        :return: same DataFrame as returned by count_variants_in_windows
+        """
+        window_stepppp = window_size if window_step is None else window_step
+
+        if window_stepppp > window_size:
+            raise ValueError("ERROR!!! Window step(%i) can't be larger then window size(%i)" % (window_stepppp, window_size))
+        elif (window_size % window_stepppp) != 0:
+            raise ValueError("ERROR!!! Window size(%i) is not a multiple of window step(%i)..." % (window_size, window_stepppp))
+
+        steps_in_window = window_size // window_stepppp
+
+        in_fd = metaopen(vcf_file, "r")
+        samples, header_len_df = self.read_vcf_header(in_fd)
+
+        if reference_scaffold_lengths is None:
+            if header_len_df.empty:
+                raise ValueError("ERROR!!! No scaffold lengths were set, and vcf file has no contig metadata lines...")
+            ref_scaf_len_df = header_len_df
+        elif isinstance(reference_scaffold_lengths, pd.DataFrame):
+            ref_scaf_len_df = reference_scaffold_lengths
+        else:
+            ref_scaf_len_df = pd.DataFrame.from_dict(reference_scaffold_lengths, orient="index")
+            ref_scaf_len_df.columns = ["length"]
+
+        window_number_df = self.get_window_and_step_numbers(ref_scaf_len_df, window_size, window_stepppp)
+        step_number = int(window_number_df["STEP"].sum())
+
+        short_scaffolds_ids = IdSet(ref_scaf_len_df.index[~ref_scaf_len_df.index.isin(window_number_df.index)].unique().to_list())
+
+        if per_sample_output:
+            step_counts = np.zeros((step_number, len(samples)), dtype=np.int64)
+            columns = samples
+        else:
+            step_counts = np.zeros(step_number, dtype=np.int64)
+            columns = ["All"] if len(samples) > 1 else samples
+
+        vcf_scaffolds = set()
+        for chunk in self.read_vcf_records_by_chunks(in_fd,
+                                                     list(range(0, 2)) + (list(range(9, 9 + len(samples))) if per_sample_output else []),
+                                                     chunk_size=chunk_size, dtype={0: str, 1: np.int64}):
+            chunk_scaffolds = pd.unique(chunk[0])
+            vcf_scaffolds |= set(chunk_scaffolds)
+            scaffolds_absent_in_reference = IdSet(chunk_scaffolds[~pd.Index(chunk_scaffolds).isin(ref_scaf_len_df.index)])
+            if scaffolds_absent_in_reference:
+                in_fd.close()
+                print(scaffolds_absent_in_reference)
+                raise ValueError("ERROR!!! Some scaffolds from vcf file are absent in reference...")
+
+            # positions are converted to 0-based as in CollectionVCF
+            flat_step_indexes, retained = self.get_flat_step_indexes(chunk[0].to_numpy(), chunk[1].to_numpy() - 1,
+                                                                     window_number_df, window_stepppp)
+            step_counts += self.count_steps(flat_step_indexes, window_number_df,
+                                            presence_array=self.get_variant_presence_from_sample_fields(chunk.iloc[:, 2:])[retained] if per_sample_output else None)
+        in_fd.close()
+
+        count_df = pd.DataFrame(self.convert_step_counts_to_window_counts(step_counts, window_number_df, steps_in_window),
+                                index=self.get_window_index(window_number_df),
+                                columns=columns)
+
+        return self.filter_and_write_window_counts(count_df, output_prefix=output_prefix,
+                                                   scaffold_black_list=scaffold_black_list,
+                                                   scaffold_white_list=scaffold_white_list,
+                                                   scaffold_syn_dict=scaffold_syn_dict,
+                                                   scaffolds_absent_in_reference=IdSet(),
+                                                   scaffolds_absent_in_vcf=IdSet(set(ref_scaf_len_df.index) - vcf_scaffolds),
+                                                   short_scaffolds_ids=short_scaffolds_ids)
+
+    @staticmethod
+    def get_genotype_array_from_sample_fields(sample_field_df, ploidy=2, dtype=np.int8):
+        """
+        Converts raw sample fields to packed genotype array (see MACE.Functions.Genotypes.get_genotype_array).
+        Only unique genotype strings are parsed.
+        :param sample_field_df: DataFrame with raw sample fields from vcf file. GT must be the first subfield
+        :param ploidy:
+        :param dtype: signed integer dtype of output array. int8 is enough for SNPs,
+                      multiallelic loci (i.e. STRs) might require int16 or int32
+        :return: array with shape (variants, samples, ploidy), -1 for missing alleles
+        """
+        gt_array = np.column_stack([sample_field_df[column].str.partition(":")[0].to_numpy()
+                                    for column in sample_field_df.columns])
+        code_array, genotype_list = pd.factorize(gt_array.ravel())
+
+        max_allele = np.iinfo(dtype).max
+        genotype_lut = np.full((len(genotype_list), ploidy), -1, dtype=dtype)
+        for genotype_index, genotype in enumerate(genotype_list):
+            alleles = [int(allele) if allele.isdigit() else -1 for allele in re.split("[/|]", genotype)[:ploidy]]
+            if max(alleles) > max_allele:
+                raise ValueError("ERROR!!! Allele index %i in genotype %s exceeds maximum "
+                                 "for %s (%i)" % (max(alleles), genotype, np.dtype(dtype).name, max_allele))
+            genotype_lut[genotype_index, :len(alleles)] = alleles
+
+        return genotype_lut[code_array].reshape(sample_field_df.shape[0], sample_field_df.shape[1], ploidy)
+
+    @staticmethod
+    def get_field_array_from_sample_fields(sample_field_df, format_array, field, dtype=np.float32):
+        """
+        Extracts numeric subfield from raw sample fields. Position of subfield is taken from FORMAT column,
+        which might differ between records.
+        :param sample_field_df: DataFrame with raw sample fields from vcf file
+        :param format_array: array-like with FORMAT column
+        :param field: subfield, i.e. DP
+        :param dtype:
+        :return: array (variants x samples), NaN for records without subfield and for missing values
+        """
+        value_array = np.full(sample_field_df.shape, np.nan, dtype=dtype)
+        format_code_array, format_list = pd.factorize(np.asarray(format_array))
+        for format_index, format_string in enumerate(format_list):
+            subfield_list = format_string.split(":")
+            if field not in subfield_list:
+                continue
+            field_index = subfield_list.index(field)
+            row_mask = format_code_array == format_index
+            for column_index, column in enumerate(sample_field_df.columns):
+                values = sample_field_df[column][row_mask].str.split(":", n=field_index + 1).str[field_index]
+                value_array[row_mask, column_index] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=dtype)
+
+        return value_array
+
+    def read_sample_field_by_chunks(self, vcf_file, field, samples=None, chunk_size=1000000, dtype=np.float32):
+        """
+        Reads numeric subfield of samples from vcf file(plain, gzipped or bzipped) by chunks of chunk_size records.
+        :param vcf_file:
+        :param field: subfield, i.e. DP
+        :param samples: samples to use. Default: all
+        :param chunk_size:
+        :param dtype:
+        :return: generator of tuples (scaffold array, 1-based position array, value array (variants x samples))
+        """
+        with metaopen(vcf_file, "r") as in_fd:
+            vcf_samples, header_len_df = self.read_vcf_header(in_fd)
+            samples_to_use = samples if samples else vcf_samples
+            absent_samples = [sample for sample in samples_to_use if sample not in vcf_samples]
+            if absent_samples:
+                raise ValueError("ERROR!!! Samples %s are absent in vcf file" % ",".join(absent_samples))
+            sample_columns = [9 + vcf_samples.index(sample) for sample in samples_to_use]
+            for chunk in self.read_vcf_records_by_chunks(in_fd, [0, 1, 8] + sample_columns, chunk_size=chunk_size,
+                                                         dtype={0: str, 1: np.int64}):
+                yield chunk[0].to_numpy(), chunk[1].to_numpy(), \
+                      self.get_field_array_from_sample_fields(chunk[sample_columns], chunk[8].to_numpy(), field,
+                                                              dtype=dtype)
+
+    def get_sample_field_histograms(self, vcf_file, field, samples=None, chunk_size=1000000):
+        """
+        Streams numeric subfield of samples from vcf file into per-sample histograms with integer bins of width 1.
+        Memory doesn't depend on number of records, medians, means and histograms with other bins could be
+        derived from the result (see MACE.Functions.Histograms).
+        :param vcf_file: path to vcf file(plain, gzipped or bzipped)
+        :param field: subfield, i.e. DP
+        :param samples: samples to use. Default: all
+        :param chunk_size: number of records to read at once
+        :return: tuple (list of samples, int64 array (samples x bins))
+        """
+        if samples is None:
+            with metaopen(vcf_file, "r") as in_fd:
+                samples = self.read_vcf_header(in_fd)[0]
+
+        histogram_array = np.zeros((len(samples), 1), dtype=np.int64)
+        for scaffold_array, position_array, value_array in self.read_sample_field_by_chunks(vcf_file, field,
+                                                                                            samples=samples,
+                                                                                            chunk_size=chunk_size):
+            histogram_array = update_integer_histograms(histogram_array, value_array)
+
+        return list(samples), histogram_array
+
+    def split_vcf_by_samples(self, vcf_file, output_prefix, samples=None, remove_ref_and_missing=True,
+                             compress=False, threads=1, chunk_size=100000):
+        """
+        Splits vcf file(plain, gzipped or bzipped) into per-sample vcf files by a single pass over the file.
+        File is read by chunks of chunk_size records, records of each sample are formatted (and compressed by bgzip)
+        in a thread pool and appended to its output file. So memory depends only on chunk size and
+        number of simultaneously opened files doesn't depend on number of samples.
+        :param vcf_file:
+        :param output_prefix: output files are named <output_prefix>.<sample>.vcf or <output_prefix>.<sample>.vcf.gz
+        :param samples: samples to extract. Default: all
+        :param remove_ref_and_missing: skip records where genotype of sample is homozygous reference or missing
+        :param compress: compress output files by bgzip
+        :param threads: number of threads
+        :param chunk_size: number of records to read at once
+        :return: OrderedDict sample -> number of written records
+        """
+        metadata = ""
+        with metaopen(vcf_file, "r") as in_fd:
+            while True:
+                line = in_fd.readline()
+                if (not line) or (line[:6] == "#CHROM"):
+                    break
+                metadata += line
+            header_list = line.strip().split("\t")
+            vcf_samples = header_list[9:]
+            samples_to_use = samples if samples else vcf_samples
+            absent_samples = [sample for sample in samples_to_use if sample not in vcf_samples]
+            if absent_samples:
+                raise ValueError("ERROR!!! Samples %s are absent in vcf file" % ",".join(absent_samples))
+            sample_columns = [9 + vcf_samples.index(sample) for sample in samples_to_use]
+            output_file_list = ["%s.%s.vcf%s" % (output_prefix, sample, ".gz" if compress else "")
+                                for sample in samples_to_use]
+
+            for sample, output_file in zip(samples_to_use, output_file_list):
+                header = (metadata + "\t".join(header_list[:9] + [sample]) + "\n").encode()
+                with open(output_file, "wb") as out_fd:
+                    out_fd.write(compress_bgzf(header) if compress else header)
+
+            def write_sample_records(sample_index, chunk, fixed_field_array, presence_array):
+                sample_field_array = chunk[sample_columns[sample_index]].to_numpy()
+                if presence_array is not None:
+                    fixed_field_array = fixed_field_array[presence_array[:, sample_index]]
+                    sample_field_array = sample_field_array[presence_array[:, sample_index]]
+                if len(sample_field_array) > 0:
+                    records = "".join(fixed_field_array + sample_field_array + "\n").encode()
+                    with open(output_file_list[sample_index], "ab") as out_fd:
+                        out_fd.write(compress_bgzf(records) if compress else records)
+                return len(sample_field_array)
+
+            record_number_array = np.zeros(len(samples_to_use), dtype=np.int64)
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                for chunk in self.read_vcf_records_by_chunks(in_fd, list(range(0, 9)) + sample_columns,
+                                                             chunk_size=chunk_size):
+                    fixed_field_array = (chunk[0].str.cat([chunk[column] for column in range(1, 9)],
+                                                          sep="\t") + "\t").to_numpy()
+                    presence_array = self.get_variant_presence_from_sample_fields(chunk[sample_columns]) \
+                        if remove_ref_and_missing else None
+                    record_number_array += np.array(list(executor.map(partial(write_sample_records, chunk=chunk,
+                                                                              fixed_field_array=fixed_field_array,
+                                                                              presence_array=presence_array),
+                                                                      range(len(samples_to_use)))))
+
+        if compress:
+            for output_file in output_file_list:
+                with open(output_file, "ab") as out_fd:
+                    out_fd.write(BGZF_EOF)
+
+        return OrderedDict(zip(samples_to_use, record_number_array))
+
+    summary_statistics = ("zygoty", "variants", "singletons", "presence", "windows", "heterozygous_windows")
+
+    def summarize_vcf_file(self, vcf_file, statistic_list, output_prefix, window_size=100000, window_step=None,
+                           reference_scaffold_lengths=None, per_sample_window_counts=False, heterozygous_mode="one",
+                           chunk_size=1000000, ploidy=2, scaffold_black_list=[], scaffold_white_list=[],
+                           scaffold_syn_dict=None):
+        """
+        Calculates several statistics in a single pass over vcf file(plain, gzipped or bzipped). File is read
+        by chunks of chunk_size records, genotypes of each chunk are parsed once and are shared by all statistics.
+        Allowed statistics and output files:
+            zygoty                  -   <output_prefix>.zygoty.counts, same as count_zygoty
+            variants                -   <output_prefix>.variant.counts, same as count_variants
+            singletons              -   <output_prefix>.singletons.counts, same as count_singletons, and
+                                        <output_prefix>.singletons.tsv with per-variant flags
+            presence                -   <output_prefix>.variant_presence, same as check_variant_presence
+            windows                 -   <output_prefix>.windows.*, same as count_variants_in_windows_from_file
+            heterozygous_windows    -   <output_prefix>.heterozygous_windows.*, counts of heterozygous variants
+                                        in windows
+        :param vcf_file: path to vcf file
+        :param statistic_list: list of statistics to calculate
+        :param output_prefix:
+        :param reference_scaffold_lengths: DataFrame or dict with scaffold lengths, used only for window statistics.
+                                           If not set, lengths are taken from contig lines in vcf metadata
+        :param per_sample_window_counts: count variants in windows for each sample independently
+        :param heterozygous_mode: 'one' - variant is heterozygous if at least one sample is heterozygous,
+                                  'all' - all samples have to be heterozygous.
+                                  Ignored if per_sample_window_counts is set
+        :param chunk_size: number of records to read at once
+        :param ploidy:
+        :param scaffold_black_list: scaffolds to skip in window statistics
+        :param scaffold_white_list: the only scaffolds to keep in window statistics
+        :param scaffold_syn_dict: synonyms of scaffolds for window statistics
+        :return: OrderedDict with counts for each statistic except per-variant ones (presence)
+        """
+        unknown_statistics = [statistic for statistic in statistic_list if statistic not in self.summary_statistics]
+        if unknown_statistics:
+            raise ValueError("ERROR!!! Unknown statistics: %s. Allowed: %s" % (",".join(unknown_statistics),
+                                                                               ",".join(self.summary_statistics)))
+        if heterozygous_mode not in ("one", "all"):
+            raise ValueError("ERROR!!! Unknown heterozygous mode: %s. Allowed: 'one', 'all'" % heterozygous_mode)
+
+        window_statistic_list = [statistic for statistic in statistic_list if statistic in ("windows", "heterozygous_windows")]
+        genotypes_required = per_sample_window_counts or bool(set(statistic_list) - {"windows"})
+
+        in_fd = metaopen(vcf_file, "r")
+        samples, header_len_df = self.read_vcf_header(in_fd)
+
+        if window_statistic_list:
+            window_stepppp = window_size if window_step is None else window_step
+            if window_stepppp > window_size:
+                in_fd.close()
+                raise ValueError("ERROR!!! Window step(%i) can't be larger then window size(%i)" % (window_stepppp, window_size))
+            elif (window_size % window_stepppp) != 0:
+                in_fd.close()
+                raise ValueError("ERROR!!! Window size(%i) is not a multiple of window step(%i)..." % (window_size, window_stepppp))
+
+            if reference_scaffold_lengths is None:
+                if header_len_df.empty:
+                    in_fd.close()
+                    raise ValueError("ERROR!!! No scaffold lengths were set, and vcf file has no contig metadata lines...")
+                ref_scaf_len_df = header_len_df
+            elif isinstance(reference_scaffold_lengths, pd.DataFrame):
+                ref_scaf_len_df = reference_scaffold_lengths
+            else:
+                ref_scaf_len_df = pd.DataFrame.from_dict(reference_scaffold_lengths, orient="index")
+                ref_scaf_len_df.columns = ["length"]
+
+            window_number_df = self.get_window_and_step_numbers(ref_scaf_len_df, window_size, window_stepppp)
+            short_scaffolds_ids = IdSet(ref_scaf_len_df.index[~ref_scaf_len_df.index.isin(window_number_df.index)].unique().to_list())
+            step_number = int(window_number_df["STEP"].sum())
+            window_columns = samples if per_sample_window_counts else (["All"] if len(samples) > 1 else samples)
+            step_count_dict = OrderedDict([(statistic, np.zeros((step_number, len(samples)) if per_sample_window_counts else step_number,
+                                                                dtype=np.int64)) for statistic in window_statistic_list])
+
+        # counts are initialized per sample to get correct output for vcf without records
+        zygoty_count_dict = OrderedDict([(zygoty, np.zeros(len(samples), dtype=np.int64))
+                                         for zygoty in ("homo", "hetero", "ref", "absent")])
+        variant_counts = np.zeros(len(samples), dtype=np.int64)
+        singleton_count_list = [np.zeros(len(samples), dtype=np.int64) for singleton_type in range(0, 3)]
+        per_variant_fd_dict = OrderedDict()
+        if "presence" in statistic_list:
+            per_variant_fd_dict["presence"] = open("%s.variant_presence" % output_prefix, "w")
+        if "singletons" in statistic_list:
+            per_variant_fd_dict["singletons"] = open("%s.singletons.tsv" % output_prefix, "w")
+
+        vcf_scaffolds = set()
+        header = True
+        for chunk in self.read_vcf_records_by_chunks(in_fd,
+                                                     list(range(0, 2)) + (list(range(9, 9 + len(samples))) if genotypes_required else []),
+                                                     chunk_size=chunk_size, dtype={0: str, 1: np.int64}):
+            chunk_scaffolds = pd.unique(chunk[0])
+            vcf_scaffolds |= set(chunk_scaffolds)
+
+            if genotypes_required:
+                genotype_array = self.get_genotype_array_from_sample_fields(chunk.iloc[:, 2:], ploidy=ploidy)
+                presence_array = get_variant_presence_array(genotype_array)
+
+            if "zygoty" in statistic_list:
+                for zygoty, counts in get_zygoty_counts(genotype_array).items():
+                    zygoty_count_dict[zygoty] = zygoty_count_dict[zygoty] + counts
+            if "variants" in statistic_list:
+                variant_counts = variant_counts + presence_array.sum(axis=0)
+            if "presence" in statistic_list:
+                presence_df = pd.DataFrame(presence_array, columns=samples)
+                presence_df.insert(0, "POS", chunk[1].to_numpy())
+                presence_df.insert(0, "CHROM", chunk[0].to_numpy())
+                presence_df.to_csv(per_variant_fd_dict["presence"], sep="\t", header=header, index=False)
+            if "singletons" in statistic_list:
+                singleton_array_list = get_singleton_masks(np.maximum(genotype_array, 0).reshape(len(genotype_array), -1))
+                singleton_count_list = [counts + singleton_array.sum(axis=0)
+                                        for counts, singleton_array in zip(singleton_count_list, singleton_array_list)]
+                flag_df = pd.concat([pd.DataFrame(singleton_array, columns=["%s.%s" % (sample, singleton_type) for sample in samples])
+                                     for singleton_array, singleton_type in zip(singleton_array_list, ("dosi", "hesi", "hosi"))],
+                                    axis=1)
+                flag_df.insert(0, "POS", chunk[1].to_numpy())
+                flag_df.insert(0, "CHROM", chunk[0].to_numpy())
+                flag_df.to_csv(per_variant_fd_dict["singletons"], sep="\t", header=header, index=False)
+
+            if window_statistic_list:
+                scaffolds_absent_in_reference = IdSet(chunk_scaffolds[~pd.Index(chunk_scaffolds).isin(ref_scaf_len_df.index)])
+                if scaffolds_absent_in_reference:
+                    in_fd.close()
+                    for fd in per_variant_fd_dict.values():
+                        fd.close()
+                    print(scaffolds_absent_in_reference)
+                    raise ValueError("ERROR!!! Some scaffolds from vcf file are absent in reference...")
+
+                # positions are converted to 0-based as in CollectionVCF
+                flat_step_indexes, retained = self.get_flat_step_indexes(chunk[0].to_numpy(), chunk[1].to_numpy() - 1,
+                                                                         window_number_df, window_stepppp)
+                for statistic in window_statistic_list:
+                    if statistic == "windows":
+                        step_count_dict[statistic] += self.count_steps(flat_step_indexes, window_number_df,
+                                                                       presence_array=presence_array[retained] if per_sample_window_counts else None)
+                        continue
+                    heterozygous_array = get_heterozygous_array(genotype_array)[retained]
+                    if per_sample_window_counts:
+                        step_count_dict[statistic] += self.count_steps(flat_step_indexes, window_number_df,
+                                                                       presence_array=heterozygous_array)
+                    else:
+                        heterozygous_mask = heterozygous_array.any(axis=1) if heterozygous_mode == "one" else heterozygous_array.all(axis=1)
+                        step_count_dict[statistic] += self.count_steps(flat_step_indexes[heterozygous_mask], window_number_df)
+            header = False
+        in_fd.close()
+        for fd in per_variant_fd_dict.values():
+            fd.close()
+
+        result_dict = OrderedDict()
+        if "zygoty" in statistic_list:
+            result_dict["zygoty"] = pd.DataFrame(zygoty_count_dict, index=samples).transpose()
+            result_dict["zygoty"].to_csv("%s.zygoty.counts" % output_prefix, sep="\t", header=True, index=True)
+        if "variants" in statistic_list:
+            result_dict["variants"] = pd.Series(variant_counts, index=samples)
+            result_dict["variants"].to_csv("%s.variant.counts" % output_prefix, sep="\t", header=True, index=True)
+        if "singletons" in statistic_list:
+            result_dict["singletons"] = pd.DataFrame(singleton_count_list, index=["double", "hetero", "homo"],
+                                                     columns=samples).transpose()
+            result_dict["singletons"]["all"] = result_dict["singletons"].sum(axis=1)
+            result_dict["singletons"].index.name = "sample"
+            result_dict["singletons"].to_csv("%s.singletons.counts" % output_prefix, sep="\t", header=True, index=True)
+
+        for statistic in window_statistic_list:
+            count_df = pd.DataFrame(self.convert_step_counts_to_window_counts(step_count_dict[statistic], window_number_df,
+                                                                              window_size // window_stepppp),
+                                    index=self.get_window_index(window_number_df),
+                                    columns=window_columns)
+            result_dict[statistic] = self.filter_and_write_window_counts(count_df,
+                                                                         output_prefix="%s.%s" % (output_prefix, statistic),
+                                                                         scaffold_black_list=scaffold_black_list,
+                                                                         scaffold_white_list=scaffold_white_list,
+                                                                         scaffold_syn_dict=scaffold_syn_dict,
+                                                                         scaffolds_absent_in_reference=IdSet(),
+                                                                         scaffolds_absent_in_vcf=IdSet(set(ref_scaf_len_df.index) - vcf_scaffolds),
+                                                                         short_scaffolds_ids=short_scaffolds_ids)
+
+        return result_dict
+
     @staticmethod
     def convert_variant_count_to_feature_df(count_df,  window_size, window_step, window_column="window",
                                             scaffold_column="#scaffold", value_column=None):
@@ -353,12 +1004,42 @@ class StatsVCF(FileRoutines):
         return feature_df[list(columns[:-2]) + ["start", "end", "window", columns[-1] if value_column is None else value_column]], \
                track_df[list(columns[:-2]) + ["start", "end", "window", columns[-1] if value_column is None else value_column]]
 
+    @staticmethod
+    def get_cumulative_feature_length(start_array, end_array, coordinate_array):
+        """
+        Calculates total length of feature parts located before each coordinate, i.e. sum of overlaps of
+        features with [0, coordinate). Uses sorted starts and ends of features and their prefix sums:
+            L(x) = x * S(x) - sum of starts < x - (x * E(x) - sum of ends < x),
+        where S(x) and E(x) are numbers of starts and ends < x. Overlapping features are counted independently.
+        :param start_array: 0-based starts of features
+        :param end_array: 0-based exclusive ends of features
+        :param coordinate_array:
+        :return: int64 array with cumulative lengths
+        """
+        coordinates = np.asarray(coordinate_array, dtype=np.int64)
+        length_array = np.zeros(len(coordinates), dtype=np.int64)
+        for sign, feature_coordinates in (1, start_array), (-1, end_array):
+            sorted_coordinates = np.sort(np.asarray(feature_coordinates, dtype=np.int64))
+            prefix_sum = np.zeros(len(sorted_coordinates) + 1, dtype=np.int64)
+            np.cumsum(sorted_coordinates, out=prefix_sum[1:])
+            number = np.searchsorted(sorted_coordinates, coordinates, side="left")
+            length_array += sign * (coordinates * number - prefix_sum[number])
+
+        return length_array
+
     def count_feature_length_in_windows(self, collection_gff, window_size, window_step,
                                         reference_scaffold_length_df,
                                         ignore_scaffolds_shorter_than_window=True, output_prefix=None,
                                         skip_empty_windows=False, expression=None, per_sample_output=False,
                                         scaffold_black_list=(), scaffold_white_list=(),
                                         scaffold_syn_dict=None):
+        """
+        Counts total length of features in windows. Features are treated as 0-based half-open intervals.
+        Overlapping features are counted independently.
+        Scaffolds are concatenated in a single coordinate system (scaffold by scaffold, each of them is trimmed
+        to the end of its last window), cumulative feature lengths are calculated at all step boundaries and
+        window counts are obtained as differences of them.
+        """
         window_stepppp = window_size if window_step is None else window_step
 
         if window_stepppp > window_size:
@@ -368,60 +1049,35 @@ class StatsVCF(FileRoutines):
             raise ValueError(
                 "ERROR!!! Window size(%i) is not a multiple of window step(%i)..." % (window_size, window_stepppp))
 
-        steps_in_window = window_size / window_stepppp
-
-        def count_windows(scaffold_length):
-            return self.count_window_number_in_scaffold(scaffold_length, window_size, window_stepppp)
-
-        number_of_windows_df = reference_scaffold_length_df.applymap(count_windows)
-        number_of_windows_df.columns = ["WINDOW"]
+        steps_in_window = window_size // window_stepppp
 
-        short_scaffolds_ids = number_of_windows_df[number_of_windows_df['WINDOW'] == 0]
-        short_scaffolds_ids = IdSet(short_scaffolds_ids.index.unique().to_list())
+        window_number_df = self.get_window_and_step_numbers(reference_scaffold_length_df, window_size, window_stepppp)
 
-        gff_scaffolds = set(reference_scaffold_length_df.scaffold_list)
-        reference_scaffolds = set(reference_scaffold_length_df.index.unique().to_list())
+        records = collection_gff.records
+        gff_scaffolds = records.index.get_level_values(0)
 
-        scaffolds_absent_in_reference = IdSet(gff_scaffolds - reference_scaffolds)
+        scaffolds_absent_in_reference = IdSet(gff_scaffolds[~gff_scaffolds.isin(reference_scaffold_length_df.index)].unique().to_list())
         if scaffolds_absent_in_reference:
-            print (scaffolds_absent_in_reference)
+            print(scaffolds_absent_in_reference)
             raise ValueError("ERROR!!! Some scaffolds from gff file are absent in reference...")
-        scaffolds_absent_in_gff = IdSet(reference_scaffolds - gff_scaffolds)
-        number_of_windows_non_zero_df = number_of_windows_df[number_of_windows_df['WINDOW'] > 0]
-
-        count_index = [[], []]
-        for scaffold in number_of_windows_non_zero_df.index:
-            count_index[0] += [scaffold] * number_of_windows_non_zero_df.loc[scaffold][0]
-            count_index[1] += list(np.arange(number_of_windows_non_zero_df.loc[scaffold][0]))
-        count_index = pd.MultiIndex.from_arrays(count_index, names=("CHROM", "WINDOW"))
 
-        count_df = pd.DataFrame(0, index=count_index, columns="counts")
+        scaffold_codes = pd.Categorical(gff_scaffolds, categories=window_number_df.index).codes
+        retained = scaffold_codes >= 0
+        scaffold_codes = scaffold_codes[retained]
 
-        for scaffold_id in number_of_windows_non_zero_df.index: #self.region_length:
-            #uncounted_tail_variants_number_dict[scaffold_id] = 0
-            if scaffold_id not in collection_gff.scaffold_list:
-                continue
-
-            for (start, end) in collection_gff.records.loc[scaffold_id][["start", "end"]].itertuples(index=False):#masked_region_dict[scaffold_id]:
-                max_start_step = start / window_stepppp
-                min_start_step = max(max_start_step - steps_in_window + 1, 0)
-                max_end_step = (end - 1) / window_stepppp
-                min_end_step = max(max_end_step - steps_in_window + 1, 0)
-
-                if min_start_step >= number_of_windows_non_zero_df.loc[scaffold_id]: #number_of_windows:
-                    break
-
-                for i in range(min_start_step, min(max_start_step + 1, min_end_step, number_of_windows_non_zero_df.loc[scaffold_id])):
-                    count_df.loc[(scaffold_id, i), "counts"] += (i * window_step) + window_size - start
+        scaffold_ends = window_number_df["STEP"].to_numpy()[scaffold_codes] * window_stepppp
+        scaffold_offsets = window_number_df["STEP_OFFSET"].to_numpy()[scaffold_codes] * window_stepppp
 
-                for i in range(min_end_step, min(max_start_step + 1,  number_of_windows_non_zero_df.loc[scaffold_id])):
-                    count_df.loc[(scaffold_id, i), "counts"] += end - start
+        start_array, end_array = [scaffold_offsets + np.clip(records[column].to_numpy(dtype=np.int64)[retained],
+                                                             0, scaffold_ends) for column in ("start", "end")]
 
-                for i in range(max_start_step + 1, min(min_end_step,  number_of_windows_non_zero_df.loc[scaffold_id])):
-                    count_df.loc[(scaffold_id, i), "counts"] += window_size
+        step_lengths = np.diff(self.get_cumulative_feature_length(start_array, end_array,
+                                                                  np.arange(window_number_df["STEP"].sum() + 1) * window_stepppp))
 
-                for i in range(max(max_start_step + 1, min_end_step), min(max_end_step + 1, number_of_windows_non_zero_df.loc[scaffold_id])):
-                    count_df.loc[(scaffold_id, i), "counts"] += end - (i * window_stepppp)
+        count_df = pd.DataFrame(self.convert_step_counts_to_window_counts(step_lengths, window_number_df,
+                                                                          steps_in_window),
+                                index=self.get_window_index(window_number_df),
+                                columns=["counts"])
 
         if output_prefix:
             count_df.to_csv("%s.gapped_and_masked_site_counts.tsv" % output_prefix, index=True, sep="\t")
@@ -463,18 +1119,26 @@ class StatsVCF(FileRoutines):
         vcf_df_filtered = vcf_df[["POS"]][vcf_df.index.isin(per_scaffold_counts[per_scaffold_counts["POS"] > 1].index,
                                                             level=0)]
 
-        print("%s\tCalculating distances..." % str(datetime.datetime.now()))
-        linkage_df = pd.DataFrame({"distance": vcf_df_filtered.groupby(level=0).apply(pdist)})
+        if method == "single":
+            # single linkage of positions is calculated from gaps between them, without distance matrix
+            print("%s\tCalculating linkage..." % str(datetime.datetime.now()))
+            linkage_df = pd.DataFrame({"linkage": vcf_df_filtered["POS"].groupby(level=0).apply(get_single_linkage_1d)})
+        else:
+            print("%s\tCalculating distances..." % str(datetime.datetime.now()))
+            linkage_df = pd.DataFrame({"distance": vcf_df_filtered.groupby(level=0).apply(pdist)})
 
-        print("%s\tCalculating linkage..." % str(datetime.datetime.now()))
-        linkage_df["linkage"] = linkage_df["distance"].agg(linkage, method=method)
+            print("%s\tCalculating linkage..." % str(datetime.datetime.now()))
+            linkage_df["linkage"] = linkage_df["distance"].agg(linkage, method=method)
 
         print("%s\tCalculating inconsistency..." % str(datetime.datetime.now()))
         linkage_df["inconsistent"] = linkage_df["linkage"].agg(inconsistent)
         # https://docs.scipy.org/doc/scipy-0.14.0/reference/generated/scipy.cluster.hierarchy.cophenet.html
 
         print("%s\tCalculating cophenet coefficient..." % str(datetime.datetime.now()))
-        linkage_df["cophenet"] = linkage_df.apply(lambda r: cophenet(r["linkage"], r["distance"])[0], axis=1)
+        if method == "single":
+            linkage_df["cophenet"] = vcf_df_filtered["POS"].groupby(level=0).agg(get_single_linkage_cophenet_1d)
+        else:
+            linkage_df["cophenet"] = linkage_df.apply(lambda r: cophenet(r["linkage"], r["distance"])[0], axis=1)
 
         if output_prefix:
             linkage_df.to_csv("%s.linkage_df.tab" % output_prefix, sep="\t", index_label="scaffold")
@@ -549,7 +1213,10 @@ class StatsVCF(FileRoutines):
                                    min_threshold=None,
                                    max_threshold=None,
                                    threshold_number=None,
-                                   threshold_step=None):
+                                   threshold_step=None,
+                                   threads=1,
+                                   chunked=None,
+                                   max_distance_number=100000000):
         """
         http://docs.scipy.org/doc/scipy/reference/generated/scipy.cluster.hierarchy.linkage.html#scipy.cluster.hierarchy.linkage
         allowed methods(used to calculate distance between clusters):
@@ -561,9 +1228,15 @@ class StatsVCF(FileRoutines):
         'centroid'    -   UPGMC algorithm
         'median'      -   WPGMC algorithm
         'ward'        -   incremental algorithm
+        Positions are clustered by MACE.Functions.Clustering.get_clusters_1d: single linkage is calculated without
+        pairwise distance matrix. In chunked mode, for 'complete', 'average', 'weighted' and 'ward' methods with
+        distance criterion only distance matrices of position chunks separated by gaps larger than maximal threshold
+        are calculated, cluster ids are numbered consecutively over chunks and cophenet is not calculated (NaN).
+        If chunked is None, chunked mode is used only for scaffolds with more than max_distance_number
+        pairwise distances.
+        Linkage of each scaffold is calculated once and is used for all thresholds.
+        If threads > 1 scaffolds are processed in a pool of processes.
         """
-        from scipy.spatial.distance import pdist
-        from scipy.cluster.hierarchy import linkage, dendrogram, inconsistent, cophenet, fcluster
         if threshold_tuple:
             threshold_list = threshold_tuple
         elif min_threshold and max_threshold:
@@ -580,25 +1253,31 @@ class StatsVCF(FileRoutines):
 
         vcf_df_filtered = vcf_df[["POS"]][vcf_df.index.isin(per_scaffold_counts[per_scaffold_counts["POS"] > 1].index,
                                                             level=0)]
-        cluster_df = pd.DataFrame(index=vcf_df_filtered.index, columns=threshold_list)
-        cophenet_df = pd.DataFrame(index=vcf_df_filtered.index.get_level_values(level=0).unique(), columns=["cophenet"])
-
-        for scaffold in cophenet_df.index:
-            print("%s\tHandling %s..." % (str(datetime.datetime.now()), scaffold))
-            print("%s\t\t%i variants" % (str(datetime.datetime.now()), len(vcf_df_filtered.loc[[scaffold]])))
-            print("%s\t\tCalculating distances..." % str(datetime.datetime.now()))
-            scaffold_distance = pdist(vcf_df_filtered.loc[[scaffold]])
-            print("%s\t\tCalculating linkage..." % str(datetime.datetime.now()))
-            scaffold_linkage = linkage(scaffold_distance, method=method)
-            print("%s\t\tCalculating cophenet coefficient..." % str(datetime.datetime.now()))
-            cophenet_df.loc[scaffold, "cophenet"] = cophenet(scaffold_linkage, scaffold_distance)[0]
-            print("%s\t\tCalculating clusters..." % str(datetime.datetime.now()))
-            for threshold in threshold_list:
-                #print len(cluster_df.loc[scaffold, threshold])
-                #print len(fcluster(scaffold_linkage, t=threshold, criterion=extracting_method))
-                cluster_df[threshold].loc[scaffold] = fcluster(scaffold_linkage, t=threshold,
-                                                               criterion=extracting_method,
-                                                               depth=depth)
+        scaffold_list = vcf_df_filtered.index.get_level_values(level=0).unique()
+        scaffold_index_dict = vcf_df_filtered.groupby(level=0).indices
+        position_array = vcf_df_filtered["POS"].to_numpy()
+        clustering_function = partial(get_clusters_1d, threshold_list=threshold_list, method=method,
+                                      extracting_method=extracting_method, depth=depth, chunked=chunked,
+                                      max_distance_number=max_distance_number)
+
+        print("%s\tClustering variants from %i scaffolds..." % (str(datetime.datetime.now()), len(scaffold_list)))
+        scaffold_position_list = [position_array[scaffold_index_dict[scaffold]] for scaffold in scaffold_list]
+        if threads > 1:
+            with Pool(threads) as pool:
+                result_list = pool.map(clustering_function, scaffold_position_list)
+        else:
+            result_list = list(map(clustering_function, scaffold_position_list))
+
+        # each worker returns label matrix for all thresholds, matrices are joined once
+        cluster_array = np.empty((len(vcf_df_filtered), len(threshold_list)), dtype=np.int32)
+        cophenet_list = []
+        for scaffold, (scaffold_cluster_array, cophenet_coefficient) in zip(scaffold_list, result_list):
+            cluster_array[scaffold_index_dict[scaffold]] = scaffold_cluster_array
+            cophenet_list.append(cophenet_coefficient)
+
+        cluster_df = pd.DataFrame(cluster_array, index=vcf_df_filtered.index, columns=threshold_list)
+        cophenet_df = pd.DataFrame({"cophenet": cophenet_list}, index=scaffold_list)
+
         cluster_number_df = cluster_df.groupby(level=0).nunique()
         if output_prefix:
             cluster_df.to_csv("%s.cluster" % output_prefix, sep="\t", index_label=True)
@@ -608,6 +1287,446 @@ class StatsVCF(FileRoutines):
         return cluster_df
     # ----------------------- Distance based stats end ----------------------
 
+    # ------------------------- Annotation based stats ------------------------
+    @staticmethod
+    def get_feature_df(annotation, feature_type_black_list=()):
+        """
+        Converts annotation to a flat table of features used to build interval index.
+        :param annotation: CollectionGFF, DataFrame with the same columns as CollectionGFF.records
+                           (0-based half-open coordinates) or dict of SeqRecords with features (i.e. parsed by BCBio.GFF).
+                           For SeqRecords sub_features of features are also included
+        :param feature_type_black_list: types of features to skip
+        :return: DataFrame with columns scaffold, start, end, featuretype, strand (1, -1 or 0 if unknown),
+                 gene_id, gene, gene_type (id, name and type of top-level feature)
+        """
+        if isinstance(annotation, dict):
+            row_list = []
+            for scaffold in annotation:
+                for feature_index, feature in enumerate(annotation[scaffold].features):
+                    gene_id = "%s:%i" % (scaffold, feature_index)
+                    gene = feature.qualifiers["Name"][0] if "Name" in feature.qualifiers else feature.id
+                    for sub_feature in [feature] + list(getattr(feature, "sub_features", [])):
+                        row_list.append([scaffold, int(sub_feature.location.start), int(sub_feature.location.end),
+                                         sub_feature.type, sub_feature.location.strand if sub_feature.location.strand else 0,
+                                         gene_id, gene, feature.type])
+            feature_df = pd.DataFrame.from_records(row_list, columns=["scaffold", "start", "end", "featuretype",
+                                                                      "strand", "gene_id", "gene", "gene_type"])
+        else:
+            records = annotation.records if isinstance(annotation, CollectionGFF) else annotation
+            records = records.reset_index()
+            feature_df = pd.DataFrame({"scaffold": records["scaffold"].to_numpy(),
+                                       "start": records["start"].to_numpy(dtype=np.int64),
+                                       "end": records["end"].to_numpy(dtype=np.int64),
+                                       "featuretype": records["featuretype"].to_numpy() if "featuretype" in records else "feature",
+                                       "strand": records["strand"].map({"+": 1, "-": -1}).fillna(0).astype(np.int8).to_numpy() if "strand" in records else 0})
+
+            def get_attribute(attribute):
+                if attribute in records:
+                    return records[attribute].replace(".", np.nan).reset_index(drop=True)
+                if "attributes" in records:
+                    return records["attributes"].str.extract("(?:^|;)%s=([^;,]+)" % attribute)[0].reset_index(drop=True)
+                return pd.Series(np.nan, index=feature_df.index)
+
+            id_series = get_attribute("ID")
+            # top-level feature is found by walking from parent to parent
+            gene_id_series = get_attribute("Parent").fillna(id_series)
+            parent_series = get_attribute("Parent")
+            parent_series.index = id_series
+            parent_series = parent_series[parent_series.index.notna() & ~parent_series.index.duplicated()].dropna()
+            while True:
+                grandparent_series = gene_id_series.map(parent_series)
+                if grandparent_series.isna().all():
+                    break
+                gene_id_series = grandparent_series.fillna(gene_id_series)
+            gene_id_series = gene_id_series.fillna(pd.Series(["row:%i" % i for i in range(len(feature_df))]))
+
+            top_level_mask = (id_series.notna() & ~id_series.duplicated()).to_numpy()
+            name_series = get_attribute("Name").fillna(id_series)[top_level_mask]
+            name_series.index = id_series[top_level_mask]
+            type_series = feature_df["featuretype"][top_level_mask]
+            type_series.index = id_series[top_level_mask]
+
+            feature_df["gene_id"] = gene_id_series.to_numpy()
+            feature_df["gene"] = gene_id_series.map(name_series).fillna(gene_id_series).to_numpy()
+            feature_df["gene_type"] = gene_id_series.map(type_series).to_numpy()
+
+        if feature_type_black_list:
+            feature_df = feature_df[~feature_df["featuretype"].isin(feature_type_black_list)].reset_index(drop=True)
+
+        return feature_df
+
+    @staticmethod
+    def get_variant_feature_overlaps(collection_vcf, feature_df):
+        """
+        Finds all pairs of variants and features containing them. Interval index is built once for all features
+        and is queried by all variants in a batch.
+        :param collection_vcf: CollectionVCF
+        :param feature_df: output of get_feature_df
+        :return: tuple of int64 arrays (variant index array, feature index array), indexes are positional
+        """
+        interval_index = get_interval_index(feature_df["scaffold"].to_numpy(), feature_df["start"].to_numpy(),
+                                            feature_df["end"].to_numpy())
+
+        return get_point_overlaps(interval_index, collection_vcf.records.index.get_level_values(0).to_numpy(),
+                                  np.asarray(collection_vcf.records["POS"]).ravel())
+
+    @staticmethod
+    def set_filter_by_mask(collection_vcf, filter_mask, filter_name):
+        """
+        Sets filter_name in FILTER field of variants selected by mask. PASS and . are replaced, other filters are kept.
+        :param collection_vcf: CollectionVCF parsed in mode with FILTER column
+        :param filter_mask: boolean array with the same length as collection_vcf.records
+        :param filter_name:
+        :return: None
+        """
+        filter_column = collection_vcf.records.columns[collection_vcf.records.columns.get_level_values(0) == "FILTER"][0]
+        filter_array = collection_vcf.records[filter_column].to_numpy(dtype=object, copy=True)
+        # lists are assigned one by one, otherwise numpy converts lists of equal length to 2-D array
+        for index in np.flatnonzero(filter_mask):
+            filter_list = filter_array[index]
+            filter_array[index] = [filter_name] if ("PASS" in filter_list) or ("." in filter_list) else filter_list + [filter_name]
+        collection_vcf.records[filter_column] = filter_array
+
+    def set_filter_by_intersection_with_feature(self, collection_vcf, annotation, filter_name, mode="cross",
+                                                feature_type_black_list=()):
+        """
+        Sets filter_name in FILTER field of variants overlapping ('cross' mode) or not overlapping ('no_cross' mode)
+        features from annotation.
+        :param collection_vcf: CollectionVCF parsed in mode with FILTER column
+        :param annotation: see get_feature_df
+        :param filter_name:
+        :param mode: 'cross' or 'no_cross'
+        :param feature_type_black_list: types of features to ignore
+        :return: boolean array, True for filtered variants
+        """
+        if mode not in ("cross", "no_cross"):
+            raise ValueError("ERROR!!! Unknown mode: %s. Allowed: 'cross', 'no_cross'" % mode)
+
+        feature_df = self.get_feature_df(annotation, feature_type_black_list=feature_type_black_list)
+        filter_mask = np.zeros(len(collection_vcf.records), dtype=bool)
+        filter_mask[self.get_variant_feature_overlaps(collection_vcf, feature_df)[0]] = True
+        if mode == "no_cross":
+            filter_mask = ~filter_mask
+
+        self.set_filter_by_mask(collection_vcf, filter_mask, filter_name)
+
+        return filter_mask
+
+    def get_location(self, collection_vcf, annotation, key="Loc", use_synonym=False, strand_key="strand",
+                     synonym_dict=None, feature_type_black_list=(), add_intergenic_label=True):
+        """
+        Finds types and strands of features containing variants.
+        :param collection_vcf: CollectionVCF
+        :param annotation: see get_feature_df
+        :param key: name of column with comma-separated sorted types of features
+        :param use_synonym: replace types of features by synonyms from synonym_dict
+        :param strand_key: name of column with strand of features: 1, -1, 0 if features have different
+                           or unknown strands, None if variant is not located inside features
+        :param synonym_dict:
+        :param feature_type_black_list: types of features to ignore
+        :param add_intergenic_label: set type to 'igc' for variants outside of features
+        :return: DataFrame with the same index as collection_vcf.records
+        """
+        feature_df = self.get_feature_df(annotation, feature_type_black_list=feature_type_black_list)
+        if use_synonym and synonym_dict:
+            feature_df["featuretype"] = feature_df["featuretype"].map(lambda s: synonym_dict.get(s, s))
+
+        variant_index_array, feature_index_array = self.get_variant_feature_overlaps(collection_vcf, feature_df)
+        overlap_df = pd.DataFrame({"variant": variant_index_array,
+                                   "featuretype": feature_df["featuretype"].to_numpy()[feature_index_array],
+                                   "strand": feature_df["strand"].to_numpy()[feature_index_array]})
+
+        location_df = pd.DataFrame(index=collection_vcf.records.index)
+        location_series = overlap_df[["variant", "featuretype"]].drop_duplicates().sort_values(["variant", "featuretype"]).groupby("variant")["featuretype"].agg(",".join)
+        location_df[key] = pd.Series(location_series.to_numpy(), index=location_series.index).reindex(np.arange(len(location_df))).to_numpy()
+        if add_intergenic_label:
+            # igc == intergenic
+            location_df[key] = location_df[key].fillna("igc")
+
+        strand_df = overlap_df.groupby("variant")["strand"].agg(["min", "max"])
+        strand_array = np.full(len(location_df), None, dtype=object)
+        strand_array[strand_df.index.to_numpy()] = np.where(strand_df["min"] == strand_df["max"],
+                                                            strand_df["min"], 0).tolist()
+        location_df[strand_key] = strand_array
+
+        return location_df
+
+    def find_location(self, collection_vcf, annotation, key="Ftype", strand_key="Fstrand", genes_key="Genes",
+                      genes_strand_key="Gstrand", feature_type_black_list=(), use_synonym=False, synonym_dict=None,
+                      add_intergenic_label=True, gene_feature_type="gene"):
+        """
+        Same as get_location, but additionally finds names and strands of genes containing variants.
+        :param gene_feature_type: type of features treated as genes
+        :return: DataFrame with the same index as collection_vcf.records and columns key, strand_key,
+                 genes_key (comma-separated names of genes) and genes_strand_key (comma-separated strands of genes)
+        """
+        location_df = self.get_location(collection_vcf, annotation, key=key, use_synonym=use_synonym,
+                                        strand_key=strand_key, synonym_dict=synonym_dict,
+                                        feature_type_black_list=feature_type_black_list,
+                                        add_intergenic_label=add_intergenic_label)
+
+        gene_df = self.get_feature_df(annotation, feature_type_black_list=feature_type_black_list)
+        gene_df = gene_df[gene_df["featuretype"] == gene_feature_type].reset_index(drop=True)
+        variant_index_array, gene_index_array = self.get_variant_feature_overlaps(collection_vcf, gene_df)
+        overlap_df = pd.DataFrame({"variant": variant_index_array,
+                                   "gene": gene_df["gene"].astype(str).to_numpy()[gene_index_array],
+                                   "strand": gene_df["strand"].astype(str).to_numpy()[gene_index_array]}).groupby("variant")
+
+        for column, source_column in ((genes_key, "gene"), (genes_strand_key, "strand")):
+            location_df[column] = overlap_df[source_column].agg(",".join).reindex(np.arange(len(location_df))).to_numpy()
+
+        return location_df
+
+    def variants_start_end(self, collection_vcf, annotation, left, right, skip_genes_without_five_utr=False,
+                           min_five_utr_len=10):
+        """
+        Finds variants around starts and ends of CDS of genes. Variants of each scaffold are sorted once and
+        variants in regions of all CDS are found by binary search.
+        :param collection_vcf: CollectionVCF
+        :param annotation: see get_feature_df
+        :param left: length of region upstream of CDS start/end (strand-aware)
+        :param right: length of region downstream of CDS start/end (strand-aware)
+        :param skip_genes_without_five_utr:
+        :param min_five_utr_len:
+        :return: tuple (list of variant coordinates relative to CDS starts, list of variant coordinates relative to
+                 CDS ends, list with [gene name, strand, scaffold, region start start, region start end,
+                 coordinates relative to CDS start, region end start, region end end,
+                 coordinates relative to CDS end] for each CDS)
+        """
+        feature_df = self.get_feature_df(annotation)
+        cds_df = feature_df[(feature_df["featuretype"] == "CDS") & (feature_df["gene_type"] == "gene")]
+        if skip_genes_without_five_utr:
+            five_utr_df = feature_df[(feature_df["featuretype"] == "five_prime_UTR") &
+                                     (feature_df["end"] - feature_df["start"] >= min_five_utr_len)]
+            cds_df = cds_df[cds_df["gene_id"].isin(five_utr_df["gene_id"])]
+
+        # 1-based coordinates
+        strand_array = np.where(cds_df["strand"].to_numpy() == -1, -1, 1)
+        plus_mask = strand_array == 1
+        cds_start_array = np.where(plus_mask, cds_df["start"].to_numpy() + 1, cds_df["end"].to_numpy())
+        cds_end_array = np.where(plus_mask, cds_df["end"].to_numpy(), cds_df["start"].to_numpy() + 1)
+        region_start_start_array = cds_start_array - np.where(plus_mask, left, right)
+        region_start_end_array = cds_start_array + np.where(plus_mask, right, left)
+        region_end_start_array = cds_end_array - np.where(plus_mask, left, right)
+        region_end_end_array = cds_end_array + np.where(plus_mask, right, left)
+
+        variant_scaffold_array = collection_vcf.records.index.get_level_values(0).to_numpy()
+        variant_position_array = np.asarray(collection_vcf.records["POS"]).ravel() + 1
+        scaffold_position_dict = {scaffold: np.sort(variant_position_array[index_array])
+                                  for scaffold, index_array in pd.Series(variant_scaffold_array).groupby(variant_scaffold_array).indices.items()}
+
+        cds_scaffold_array = cds_df["scaffold"].to_numpy()
+        region_bound_list = []
+        for region_start_array, region_end_array in ((region_start_start_array, region_start_end_array),
+                                                     (region_end_start_array, region_end_end_array)):
+            lower_array = np.zeros(len(cds_df), dtype=np.int64)
+            upper_array = np.zeros(len(cds_df), dtype=np.int64)
+            for scaffold, cds_index_array in pd.Series(cds_scaffold_array).groupby(cds_scaffold_array).indices.items():
+                if scaffold not in scaffold_position_dict:
+                    continue
+                lower_array[cds_index_array], upper_array[cds_index_array] = get_points_in_intervals(scaffold_position_dict[scaffold],
+                                                                                                       region_start_array[cds_index_array],
+                                                                                                       region_end_array[cds_index_array] + 1)
+            region_bound_list.append((lower_array, upper_array))
+
+        gene_variants_positions = []
+        all_variant_start_positions = []
+        all_variant_end_positions = []
+        for cds_index, (gene, chrom) in enumerate(zip(cds_df["gene"].to_numpy(), cds_scaffold_array)):
+            strand = strand_array[cds_index]
+            position_array = scaffold_position_dict.get(chrom, np.empty(0, dtype=np.int64))
+            start_coordinates = ((position_array[region_bound_list[0][0][cds_index]:region_bound_list[0][1][cds_index]] - cds_start_array[cds_index]) * strand).tolist()
+            end_coordinates = ((position_array[region_bound_list[1][0][cds_index]:region_bound_list[1][1][cds_index]] - cds_end_array[cds_index]) * strand).tolist()
+            all_variant_start_positions += start_coordinates
+            all_variant_end_positions += end_coordinates
+            gene_variants_positions.append([gene, strand, chrom, region_start_start_array[cds_index],
+                                            region_start_end_array[cds_index], start_coordinates,
+                                            region_end_start_array[cds_index], region_end_end_array[cds_index],
+                                            end_coordinates])
+
+        return all_variant_start_positions, all_variant_end_positions, gene_variants_positions
+
+    snpeff_columns = {"EFF": ["Effect", "Effect_Impact", "Functional_Class", "Codon_Change", "Amino_Acid_Change",
+                              "Amino_Acid_Length", "Gene_Name", "Transcript_BioType", "Gene_Coding",
+                              "Transcript_ID", "Exon_Rank", "Genotype_Number", "ERRORS", "WARNINGS"],
+                      "ANN": ["Allele", "Annotation",
+                              "Putative_impact", "Gene_Name",
+                              "Gene_ID", "Feature type",
+                              "Feature ID", "Transcript biotype",
+                              "Rank", "HGVS.c",
+                              "HGVS.p", "cDNA_position",
+                              "CDS_position", "Protein_position",
+                              "Distance_to_feature", "Errors_Warnings"]}
+
+    def parse_snpeff_entries(self, entry_series, snpeff_entry="ANN"):
+        """
+        Splits SnpEff entries from INFO field into effects and effects into fields. All splitting is done
+        by vectorized pandas string methods.
+        :param entry_series: Series with values of snpeff_entry, effects are separated by commas
+        :param snpeff_entry: ANN or EFF
+        :return: DataFrame with one row per effect and columns from snpeff_columns[snpeff_entry],
+                 index contains positions of parent entries in entry_series. Empty fields are replaced by '.'
+        """
+        column_list = self.snpeff_columns[snpeff_entry]
+        effect_series = entry_series.reset_index(drop=True).str.split(",").explode()
+        effect_series = effect_series[effect_series.notna() & (effect_series != "")]
+
+        if snpeff_entry == "EFF":
+            # Effect(field1|field2|...)
+            split_effect_df = effect_series.str.extract(r"^([^(]*)\((.*)\)$")
+            effect_df = pd.concat([split_effect_df[[0]], split_effect_df[1].str.split("|", expand=True)],
+                                  axis=1, ignore_index=True)
+        else:
+            effect_df = effect_series.str.split("|", expand=True)
+
+        effect_df = effect_df.iloc[:, :len(column_list)]
+        effect_df.columns = column_list[:effect_df.shape[1]]
+
+        return effect_df.reindex(columns=column_list).fillna(".").replace("", ".")
+
+    def extract_snpeff_info(self, vcf_file, output_file, snpeff_entry="ANN", output_format="tsv",
+                            effect_filter=None, chunk_size=100000):
+        """
+        Extracts SnpEff annotations from vcf file(plain, gzipped or bzipped) into a table with one row per effect.
+        File is read by chunks of chunk_size records, each chunk is parsed and written at once.
+        :param vcf_file:
+        :param output_file:
+        :param snpeff_entry: ANN or EFF
+        :param output_format: tsv or parquet. Parquet output requires pyarrow
+        :param effect_filter: dict with column names from snpeff_columns[snpeff_entry] as keys and collections of
+                              allowed values as values, i.e. {"Putative_impact": ["HIGH"]}. Records without
+                              any of allowed values in snpeff_entry are discarded before splitting of effects
+        :param chunk_size: number of records to read at once
+        :return: number of written effects
+        """
+        if snpeff_entry not in self.snpeff_columns:
+            raise ValueError("ERROR!!! Unknow SNPeff entry: %s. Only ANN or EFF are allowed..." % snpeff_entry)
+        if output_format not in ("tsv", "parquet"):
+            raise ValueError("ERROR!!! Unknown output format: %s. Only tsv or parquet are allowed..." % output_format)
+        unknown_columns = [column for column in (effect_filter or {}) if column not in self.snpeff_columns[snpeff_entry]]
+        if unknown_columns:
+            raise ValueError("ERROR!!! Unknown columns in effect filter: %s" % ",".join(unknown_columns))
+
+        if output_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+        record_header_list = ["Chrom", "Pos", "Ref", "Alt", "Filter"]
+        entry_regexp = "(?:^|;)%s=([^;]*)" % snpeff_entry
+        prefilter_regexp_list = ["|".join(map(re.escape, values)) for values in (effect_filter or {}).values()]
+
+        effect_number = 0
+        with metaopen(vcf_file, "r") as in_fd, open(output_file, "w" if output_format == "tsv" else "wb") as out_fd:
+            self.read_vcf_header(in_fd)
+            if output_format == "tsv":
+                out_fd.write("#" + "\t".join(record_header_list + self.snpeff_columns[snpeff_entry]) + "\n")
+            else:
+                parquet_schema = pa.schema([(column, pa.int64() if column == "Pos" else pa.string())
+                                            for column in record_header_list + self.snpeff_columns[snpeff_entry]])
+                parquet_writer = pq.ParquetWriter(out_fd, parquet_schema)
+            for chunk in self.read_vcf_records_by_chunks(in_fd, [0, 1, 3, 4, 6, 7], chunk_size=chunk_size):
+                entry_series = chunk[7].str.extract(entry_regexp)[0]
+                retained_mask = entry_series.notna()
+                # cheap check of raw strings, exact filtering is done after splitting
+                for prefilter_regexp in prefilter_regexp_list:
+                    retained_mask &= entry_series.str.contains(prefilter_regexp, na=False)
+                chunk = chunk[retained_mask.to_numpy()]
+                effect_df = self.parse_snpeff_entries(entry_series[retained_mask], snpeff_entry=snpeff_entry)
+
+                for column, values in (effect_filter or {}).items():
+                    effect_df = effect_df[effect_df[column].isin(values)]
+
+                record_df = chunk[[0, 1, 3, 4, 6]].iloc[effect_df.index.to_numpy()]
+                record_df.columns = record_header_list
+                effect_df = pd.concat([record_df.reset_index(drop=True), effect_df.reset_index(drop=True)], axis=1)
+                effect_df["Pos"] = effect_df["Pos"].astype(np.int64)
+                effect_number += len(effect_df)
+
+                if output_format == "tsv":
+                    effect_df.to_csv(out_fd, sep="\t", header=False, index=False)
+                else:
+                    parquet_writer.write_table(pa.Table.from_pandas(effect_df, schema=parquet_schema,
+                                                                    preserve_index=False))
+
+            if output_format == "parquet":
+                parquet_writer.close()
+
+        return effect_number
+
+    # ----------------------- Annotation based stats end ----------------------
+
+    # ------------------------- Reference based stats -------------------------
+    @staticmethod
+    def get_indel_homopolymer_positions(ref_array, alt_array, position_array):
+        """
+        Finds reference positions, whose homopolymer runs are affected by indels. For indels with common prefix of
+        alleles (i.e. A -> ATT) it is the first position after the prefix, for indels with common suffix
+        (i.e. TA -> A) - the last changed reference position or the position before the insertion.
+        :param ref_array: array with reference alleles
+        :param alt_array: array with alternative alleles, could contain NaN
+        :param position_array: array with 0-based positions of variants
+        :return: int64 array with positions, -1 for alleles which are not indels
+        """
+        homopolymer_position_list = []
+        for ref, alt, position in zip(ref_array, alt_array, position_array):
+            if (not isinstance(alt, str)) or (len(alt) == len(ref)):
+                homopolymer_position_list.append(-1)
+                continue
+            short_allele, long_allele = (alt, ref) if len(alt) < len(ref) else (ref, alt)
+            if long_allele.startswith(short_allele):
+                homopolymer_position_list.append(position + len(short_allele))
+            elif long_allele.endswith(short_allele):
+                homopolymer_position_list.append(position + len(ref) - len(short_allele) - 1)
+            else:
+                homopolymer_position_list.append(-1)
+
+        return np.array(homopolymer_position_list, dtype=np.int64)
+
+    def set_filter_for_indels_in_homopolymers(self, collection_vcf, reference, min_homopolymer_len=4,
+                                              filter_name="indel_in_homopolymer", cache_dir=None):
+        """
+        Sets filter_name in FILTER field of indels located in homopolymers. Homopolymer run index is built once
+        for the whole reference (and optionally cached, see MACE.Functions.Homopolymers.read_homopolymer_run_df),
+        all indels are checked against it by binary search.
+        :param collection_vcf: CollectionVCF parsed in mode with REF, ALT and FILTER columns
+        :param reference: path to fasta file, dict-like object with sequences or DataFrame produced by
+                          get_homopolymer_run_df with min_run_length not larger than min_homopolymer_len
+        :param min_homopolymer_len:
+        :param filter_name:
+        :param cache_dir: directory with cache of homopolymer run index, i.e. directory of fasta file.
+                          Used only if reference is a path to fasta file
+        :return: boolean array, True for filtered variants
+        """
+        if isinstance(reference, pd.DataFrame):
+            homopolymer_run_df = reference
+        elif isinstance(reference, (str, bytes)) or hasattr(reference, "__fspath__"):
+            homopolymer_run_df = read_homopolymer_run_df(reference, min_run_length=min_homopolymer_len,
+                                                         cache_dir=cache_dir)
+        else:
+            homopolymer_run_df = get_homopolymer_run_df(reference, min_run_length=min_homopolymer_len)
+
+        records = collection_vcf.records
+        column_level = records.columns.get_level_values(0)
+        ref_array = records.loc[:, column_level == "REF"].iloc[:, 0].astype(object).to_numpy()
+        scaffold_array = records.index.get_level_values(0).to_numpy()
+        position_array = np.asarray(records["POS"]).ravel()
+
+        filter_mask = np.zeros(len(records), dtype=bool)
+        for alt_column in records.columns[column_level == "ALT"]:
+            homopolymer_position_array = self.get_indel_homopolymer_positions(ref_array,
+                                                                              records[alt_column].astype(object).to_numpy(),
+                                                                              position_array)
+            indel_index_array = np.flatnonzero(homopolymer_position_array >= 0)
+            run_length_array = get_run_lengths_at_positions(homopolymer_run_df, scaffold_array[indel_index_array],
+                                                            homopolymer_position_array[indel_index_array])
+            filter_mask[indel_index_array[run_length_array >= min_homopolymer_len]] = True
+
+        self.set_filter_by_mask(collection_vcf, filter_mask, filter_name)
+
+        return filter_mask
+
+    # ----------------------- Reference based stats end -----------------------
+
     # ----------------------------Not rewritten yet--------------------------
 
     def rainfall_plot(self, plot_name, dpi=300, figsize=(20, 20), facecolor="#D6D6D6",
@@ -774,135 +1893,100 @@ class StatsVCF(FileRoutines):
             plt.savefig("%s/%s_log_scale.%s" % (plot_dir, plot_name, extension))
         plt.close()
 
-    def check_variant_presence(self, outfile=None):
-        if self.parsing_mode in self.parsing_modes_with_genotypes:
-
-            variant_presence = pd.concat([((self.records[sample]["GT"][0].notna()) & (self.records[sample]["GT"][0] != 0)) | ((self.records[sample]["GT"][1].notna()) & (self.records[sample]["GT"][1] != 0)) for sample in self.samples], axis=1)
-            variant_presence.columns = self.samples
-            if outfile:
-                variant_presence.to_csv(outfile, sep="\t", header=True, index=True)
-            return variant_presence
-        else:
-            raise ValueError("ERROR!!! Variant presence can't be counted for this parsing mode: %s."
-                             "Use 'coordinates_and_genotypes', 'genotypes' or 'complete modes'" % self.parsing_mode)
-
-    def get_uniq_variants(self, output_prefix):
-        variant_presence = self.check_variant_presence(outfile="%s.variant_presence" % output_prefix)
-        return variant_presence[variant_presence.apply(lambda s: True if np.sum(s) == 1 else False, axis=1)]
-
-    def count_uniq_variants(self, output_prefix, extension_list=("png",), figsize=(5, 5), dpi=200,
-                            title="Unique variants"):
-        if self.parsing_mode in self.parsing_modes_with_genotypes:
-
-            variant_presence = pd.concat([((self.records[sample]["GT"][0].notna()) & (self.records[sample]["GT"][0] != 0)) | ((self.records[sample]["GT"][1].notna()) & (self.records[sample]["GT"][1] != 0)) for sample in self.samples], axis=1)
-            variant_presence.columns = self.samples
-            uniq_variants = variant_presence[variant_presence.apply(lambda s: True if np.sum(s) == 1 else False, axis=1)]
-            uniq_variant_counts = uniq_variants.apply(np.sum)
-
-            if output_prefix:
-                #variant_presence.to_csv("%s.variant_presence" % output_prefix, sep="\t", header=True, index=True)
-                #uniq_variants.to_csv("%s.uniq_variants" % output_prefix, sep="\t", header=True, index=True)
-                uniq_variant_counts.to_csv("%s.uniq_variants.counts" % output_prefix, sep="\t", header=True, index=True)
-
-            fig = plt.figure(1, figsize=figsize, dpi=dpi)
-
-            bar_width = 0.5
-            bin_coord = np.arange(len(self.samples))
-
-            plt.bar(bin_coord, uniq_variant_counts, width=bar_width, edgecolor='white', color='blue',)
-
-            plt.ylabel('Variants', fontweight='bold')
-            plt.xlabel('Sample', fontweight='bold')
-            plt.xticks(bin_coord, self.samples, rotation=45)
-            plt.title(title, fontweight='bold')
-
-            for extension in extension_list:
-                plt.savefig("%s.%s" % (output_prefix, extension), bbox_inches='tight')
-            plt.close()
-
-            return uniq_variant_counts
-        else:
-            raise ValueError("ERROR!!! Variant presence can't be counted for this parsing mode: %s."
-                             "Use 'coordinates_and_genotypes', 'genotypes' or 'complete modes'" % self.parsing_mode)
-
-    def draw_sample_parameter_distribution(self, parameter, bin_width, output_prefix=None,
+    def draw_sample_parameter_distribution(self, vcf_file, parameter, bin_width, output_prefix=None,
                                            extension_list=("png",), suptitle=None,
                                            xlabel=None, ylabel=None, show_median=True,
                                            show_mean=True, median_relative=False, mean_relative=False, dpi=200,
-                                           subplot_size=3, xlimit=None, verbose=False, ylogbase=10):
-
-        param = self.records.xs(parameter, axis=1, level=1, drop_level=False)
-        param_mean = param.apply(np.mean)
-        param_median = param.apply(np.median)
+                                           subplot_size=3, xlimit=None, verbose=False, ylogbase=10,
+                                           samples=None, chunk_size=1000000, histogram_array=None,
+                                           relative_bin_width=0.1):
+        """
+        Draws distribution of numeric subfield of samples. Parameter is streamed from vcf file once into per-sample
+        histograms with integer bins (see get_sample_field_histograms), medians and means are exact and
+        are derived from these histograms. Precalculated histograms could be passed via histogram_array and samples,
+        in this case vcf file is not read, i.e. to draw absolute and relative distributions from the same counts.
+        :param vcf_file: path to vcf file(plain, gzipped or bzipped). Ignored if histogram_array is set
+        :param parameter: subfield, i.e. DP
+        :param bin_width: width of bins for absolute distribution
+        :param relative_bin_width: width of bins for median or mean relative distribution
+        :param samples: samples to use. Default: all. Required if histogram_array is set
+        :param chunk_size: number of records to read at once
+        :param histogram_array: output of get_sample_field_histograms for samples
+        :return: tuple (list of samples, histogram array)
+        """
+        if histogram_array is None:
+            samples, histogram_array = self.get_sample_field_histograms(vcf_file, parameter, samples=samples,
+                                                                        chunk_size=chunk_size)
+        elif samples is None:
+            raise ValueError("ERROR!!! Samples have to be set if histogram array is provided")
+        sample_number = len(samples)
+
+        param_mean = get_histogram_means(histogram_array)
+        param_median = get_histogram_medians(histogram_array)
+        param_max = get_histogram_maxs(histogram_array)
         if verbose:
             print("Median:")
-            print(param_median)
+            print(pd.Series(param_median, index=samples))
             print("Mean:")
-            print(param_mean)
+            print(pd.Series(param_mean, index=samples))
 
-        if median_relative:
-            param = param.astype(np.float32) / param_median
-            param_mean = param_mean.astype(np.float32) / param_median
-            param_median = param_median.astype(np.float32) / param_median
-        elif mean_relative:
-            param = param.astype(np.float32) / param_mean
-            param_mean = param_mean.astype(np.float32) / param_mean
-            param_median = param_median.astype(np.float32) / param_mean
+        if median_relative or mean_relative:
+            scale_array = param_median if median_relative else param_mean
+            param_mean = param_mean / scale_array
+            param_max = param_max / scale_array
+            param_median = param_median / scale_array
+            bin_width = relative_bin_width
+            bin_start = 0
+        else:
+            scale_array = None
+            bin_start = 1
+
+        max_median = np.nanmax(param_median)
+        max_value = np.nanmax(param_max)
+        # long tail is collapsed into a single bin
+        if max_value > max_median * 10:
+            bins = np.concatenate((np.arange(bin_start, max_median * 10, bin_width), [max_value]))
+        else:
+            bins = np.arange(bin_start, max_value, bin_width)
+        if len(bins) == 0:
+            bins = np.array([bin_start])
+        bins = np.concatenate((bins, [bins[-1] + bin_width, bins[-1] + 2 * bin_width]))
+        if verbose:
+            print("Bins:")
+            print(bins)
 
-        param_max = param.apply(np.max)
-        param_min = param.apply(np.min)
+        binned_histogram_array = rebin_histograms(histogram_array, bins, scale_array=scale_array)
 
         # selection of figure size
-        n = int(np.sqrt(self.sample_number))
-        if n * (n + 1) >= self.sample_number:
+        n = int(np.sqrt(sample_number))
+        if n * (n + 1) >= sample_number:
             m = n + 1
         else:
             n += 1
             m = n
-        if median_relative or mean_relative:
-            if param_max > max(param_median) * 10:
-                bins = np.arange(0, max(param_median) * 10, bin_width)
-                bins = np.concat(bins, [max(param_max)])
-            else:
-                bins = np.arange(0, max(param_max), 0.1)
-        else:
-            print(np.max(param_median))
-            print(np.max(param_median)[0])
-            print(max(param_median))
-            if param_max > max(param_median) * 10:
-                bins = np.arange(1, max(param_median) * 10, bin_width)
-                bins = np.concat(bins, [max(param_max)])
-            else:
-                bins = np.arange(1, max(param_max), bin_width)
-        bins = np.concatenate((bins, [bins[-1] + bin_width, bins[-1] + 2 * bin_width]))
 
-        print( "Bins:")
-        print( bins)
-
-        figure, subplot_array = plt.subplots(nrows=n, ncols=m, sharex=True, sharey=True,
+        figure, subplot_array = plt.subplots(nrows=n, ncols=m, sharex=True, sharey=True, squeeze=False,
                                              figsize=(m*subplot_size, n*subplot_size), dpi=dpi)
-        #print subplot_array
-        #print np.shape(subplot_array)
-        #print n, m
         for row in range(0, n):
             for col in range(0, m):
-                print( row, col)
                 sample_index = row * m + col
                 if ylabel and col == 0:
-                    subplot_array[row][col].ylabel = ylabel
+                    subplot_array[row][col].set_ylabel(ylabel)
                 if xlabel and row == n - 1:
-                    subplot_array[row][col].xlabel = xlabel
+                    subplot_array[row][col].set_xlabel(xlabel)
 
-                if sample_index >= self.sample_number:
+                if sample_index >= sample_number:
                     continue
-                sample_id = self.samples[sample_index]
-                #print param[sample_id]
-                # TODO: adjust function to deal not only with the first column inside parameter
-                subplot_array[row][col].hist(param[sample_id][parameter][0].dropna(), bins=bins, label=sample_id)
+                sample_id = samples[sample_index]
+                # counts are already binned, so each bin is drawn from its left edge with count as a weight
+                subplot_array[row][col].hist(bins[:-1], bins=bins, weights=binned_histogram_array[sample_index],
+                                             label=sample_id)
                 if show_median:
-                    subplot_array[row][col].axvline(x=float(param_median[sample_id]), label="median %.2f" % param_median, color="orange")
+                    subplot_array[row][col].axvline(x=param_median[sample_index],
+                                                    label="median %.2f" % param_median[sample_index], color="orange")
                 if show_mean:
-                    subplot_array[row][col].axvline(x=float(param_mean[sample_id]), label="mean %.2f" % param_mean, color="red")
+                    subplot_array[row][col].axvline(x=param_mean[sample_index],
+                                                    label="mean %.2f" % param_mean[sample_index], color="red")
                 if row == 0 and col == m - 1:
                     subplot_array[row][col].legend()
                 subplot_array[row][col].set_title(sample_id)
@@ -921,79 +2005,125 @@ class StatsVCF(FileRoutines):
             for extension in extension_list:
                 plt.savefig("%s.%s" % (output_prefix, extension), bbox_inches='tight')
 
-        xlim = xlimit if xlimit else np.max(param_median)*3
+        xlim = xlimit if xlimit else max_median * 3
         plt.xlim(xmax=xlim, xmin=0)
         if output_prefix:
             for extension in extension_list:
                 plt.savefig("%s.xlim%i.%s" % (output_prefix, xlim, extension), bbox_inches='tight')
-            plt.yscale('log', basey=ylogbase)
+            plt.yscale('log', base=ylogbase)
             for extension in extension_list:
                 plt.savefig("%s.xlim%i.ylog.%s" % (output_prefix, xlim, extension), bbox_inches='tight')
 
         plt.close()
 
-        return param
+        return samples, histogram_array
 
-    def get_coverage_distribution(self, output_prefix, bin_width=5, dpi=200, subplot_size=3, extension_list=("png",),
-                                  verbose=False):
-        if self.parsing_mode in self.parsing_modes_with_sample_coverage:
-            print("Drawing coverage distribution...")
-            self.draw_sample_parameter_distribution("DP", bin_width, output_prefix=output_prefix,
-                                                    extension_list=extension_list,
-                                                    suptitle="Coverage distribution",
-                                                    xlabel="Coverage", ylabel="Variants", show_median=True,
-                                                    show_mean=True, median_relative=False, mean_relative=False,
-                                                    dpi=dpi, subplot_size=subplot_size,
-                                                    verbose=verbose)
-            print("Drawing coverage distribution relative to median...")
-            self.draw_sample_parameter_distribution("DP", bin_width, output_prefix="%s.median_relative" % output_prefix,
-                                                    extension_list=extension_list,
-                                                    suptitle="Coverage distribution(Median relative)",
-                                                    xlabel="Coverage", ylabel="Variants", show_median=True,
-                                                    show_mean=True, median_relative=True, mean_relative=False,
-                                                    dpi=dpi, subplot_size=subplot_size)
-            print("Drawing coverage distribution relative to mean...")
-            self.draw_sample_parameter_distribution("DP", bin_width, output_prefix="%s.mean_relative" % output_prefix,
+    def get_coverage_distribution(self, vcf_file, output_prefix, bin_width=5, dpi=200, subplot_size=3,
+                                  extension_list=("png",), verbose=False, samples=None, chunk_size=1000000):
+        """
+        Draws absolute, median relative and mean relative distributions of coverage (DP) of samples.
+        DP is read from vcf file once, all three distributions are drawn from the same histograms.
+        :param vcf_file: path to vcf file(plain, gzipped or bzipped)
+        :param output_prefix:
+        :param bin_width: width of bins for absolute distribution
+        :param samples: samples to use. Default: all
+        :param chunk_size: number of records to read at once
+        :return: tuple (list of samples, histogram array)
+        """
+        samples, histogram_array = self.get_sample_field_histograms(vcf_file, "DP", samples=samples,
+                                                                    chunk_size=chunk_size)
+        for prefix, suptitle, median_relative, mean_relative in ((output_prefix, "Coverage distribution",
+                                                                  False, False),
+                                                                 ("%s.median_relative" % output_prefix,
+                                                                  "Coverage distribution(Median relative)",
+                                                                  True, False),
+                                                                 ("%s.mean_relative" % output_prefix,
+                                                                  "Coverage distribution(Mean relative)",
+                                                                  False, True)):
+            print("Drawing %s..." % suptitle.lower())
+            self.draw_sample_parameter_distribution(vcf_file, "DP", bin_width, output_prefix=prefix,
                                                     extension_list=extension_list,
-                                                    suptitle="Coverage distribution(Mean relative)",
+                                                    suptitle=suptitle,
                                                     xlabel="Coverage", ylabel="Variants", show_median=True,
-                                                    show_mean=True, median_relative=False, mean_relative=True,
-                                                    dpi=dpi, subplot_size=subplot_size)
+                                                    show_mean=True, median_relative=median_relative,
+                                                    mean_relative=mean_relative,
+                                                    dpi=dpi, subplot_size=subplot_size, verbose=verbose,
+                                                    samples=samples, histogram_array=histogram_array)
+
+        return samples, histogram_array
+
+    def calculate_masking(self, vcf_file, outfile, samples=None, sample_coverage=None, min_samples=1,
+                          max_coverage=2.5, min_coverage=None, chunk_size=1000000):
+        """
+        Masks positions with coverage outliers. Coverage of sample is an outlier if it is not less than
+        max_coverage * sample_coverage or not larger than min_coverage * sample_coverage. Position is masked
+        if it has outliers in at least min_samples samples. DP is read from vcf file by chunks and compared with
+        per-sample thresholds by broadcasting, masked positions are merged into intervals on the fly,
+        so memory doesn't depend on number of records.
+        :param vcf_file: path to vcf file(plain, gzipped or bzipped)
+        :param outfile: output BED file with merged masked intervals
+        :param samples: samples to use. Default: all
+        :param sample_coverage: list or dict with coverage of samples.
+                                If not set, median DP of samples is calculated in additional pass over vcf file
+        :param min_samples:
+        :param max_coverage:
+        :param min_coverage:
+        :param chunk_size: number of records to read at once
+        :return: number of masked positions
+        """
+        if samples is None:
+            with metaopen(vcf_file, "r") as in_fd:
+                samples = self.read_vcf_header(in_fd)[0]
+
+        if sample_coverage is None:
+            sample_coverage_array = get_histogram_medians(self.get_sample_field_histograms(vcf_file, "DP",
+                                                                                           samples=samples,
+                                                                                           chunk_size=chunk_size)[1])
+        elif isinstance(sample_coverage, dict):
+            sample_coverage_array = np.array([sample_coverage[sample] for sample in samples], dtype=np.float32)
         else:
-            raise ValueError("ERROR!!! Coverage distribution can't be counted for this parsing mode: %s."
-                             "Use 'pos_gt_dp' or other method parsing DP column from samples fields" % self.parsing_mode)
-
-    def calculate_masking(self, outfile, samples=None, sample_coverage=None, min_samples=1, max_coverage=2.5, min_coverage=None):
-        if self.parsing_mode in self.parsing_modes_with_sample_coverage:
-            samples_to_use = samples if samples else self.samples
-            coverage = self.records[samples_to_use].xs("DP", axis=1, level=1, drop_level=False)
-            if sample_coverage:
-                sp_coverage = pd.Series(sample_coverage, dtype=np.float32)
-                sp_coverage.index = pd.MultiIndex.from_arrays([samples_to_use,
-                                                               ["DP"] * len(samples_to_use),
-                                                               [0] * len(samples_to_use)])
-            else:
-                sp_coverage = coverage.apply(np.median)
-            #coverage = coverage / coverage_median
-            #print sp_coverage
-            #print "UUUU"
-            #print coverage.apply(np.median)
-            boolean_array = coverage >= (max_coverage * sp_coverage)
-            if min_coverage:
-                boolean_array &= coverage <= (min_coverage * sp_coverage)
+            sample_coverage_array = np.asarray(sample_coverage, dtype=np.float32)
+
+        masked_position_number = 0
+        # interval which could be extended by positions from the next chunk
+        last_interval = None
+        with open(outfile, "w") as out_fd:
+            for scaffold_array, position_array, coverage_array in self.read_sample_field_by_chunks(vcf_file, "DP",
+                                                                                                   samples=samples,
+                                                                                                   chunk_size=chunk_size):
+                outlier_array = coverage_array >= max_coverage * sample_coverage_array
+                if min_coverage:
+                    outlier_array |= coverage_array <= min_coverage * sample_coverage_array
+                masked_mask = np.count_nonzero(outlier_array, axis=1) >= min_samples
+                masked_position_number += np.count_nonzero(masked_mask)
+
+                scaffold_array = scaffold_array[masked_mask]
+                start_array = position_array[masked_mask] - 1
+                if last_interval is not None:
+                    scaffold_array = np.concatenate([[last_interval[0]], scaffold_array])
+                    start_array = np.concatenate([[last_interval[1]], start_array])
+                    end_array = np.concatenate([[last_interval[2]], start_array[1:] + 1])
+                else:
+                    end_array = start_array + 1
+                if len(start_array) == 0:
+                    continue
 
-            outliers = boolean_array.apply(np.sum, axis=1)
-            outliers = outliers[outliers >= min_samples]
-            #outliers = pd.concat([self.records[self.records.index.isin(outliers.index)]["POS"], outliers], axis=1)
-            outliers = self.records[self.records.index.isin(outliers.index)]["POS"]
+                # vcf file is sorted, so new interval starts at new scaffold or if there is a gap after the previous position
+                interval_start_array = np.flatnonzero(np.concatenate([[True],
+                                                                      (scaffold_array[1:] != scaffold_array[:-1]) |
+                                                                      (start_array[1:] > end_array[:-1])]))
+                interval_df = pd.DataFrame({"scaffold": scaffold_array[interval_start_array],
+                                            "start": start_array[interval_start_array],
+                                            "end": np.maximum.reduceat(end_array, interval_start_array)})
+                interval_df.iloc[:-1].to_csv(out_fd, sep="\t", header=False, index=False)
+                last_interval = tuple(interval_df.iloc[-1])
 
-            print("%i variants were masked" % np.shape(outliers)[0])
+            if last_interval is not None:
+                out_fd.write("%s\t%i\t%i\n" % last_interval)
 
-            self.write_df(outliers, outfile, format="simple_bed", type="1-based")
+        print("%i variants were masked" % masked_position_number)
 
-        else:
-            raise ValueError("ERROR!!! Masking can't be counted for this parsing mode: %s."
-                             "Use 'pos_gt_dp' or other method parsing DP column from samples fields" % self.parsing_mode)
+        return masked_position_number
 
     #########################################################################
     #                        In progress                                    #
@@ -1118,31 +2248,6 @@ class StatsVCF(FileRoutines):
                     else:
                         record.filter_list.append(filter_name)
 
-    def set_filter_by_intersection_with_feature(self, annotation_dict, filter_name, mode="cross",
-                                                feature_type_black_list=[]):
-        """
-
-        :param annotation_dict:
-        :param filter_name:
-        :param mode:
-        :return:
-        """
-        if mode == "cross":
-            def expression(scaffold, record):
-                if scaffold not in annotation_dict:
-                    return False
-                return record.check_intersection_with_features(scaffold, annotation_dict,
-                                                               feature_type_black_list=feature_type_black_list)
-
-        elif mode == "no_cross":
-            def expression(scaffold, record):
-                if scaffold not in annotation_dict:
-                    return True
-                return not record.check_intersection_with_features(scaffold, annotation_dict,
-                                                                   feature_type_black_list=feature_type_black_list)
-
-        self.set_filter(expression, filter_name)
-
     def check_presence(self, chrom, position, alt_list=None):
         """
         Checks presence of variant in collection
@@ -1172,16 +2277,6 @@ class StatsVCF(FileRoutines):
                               header=self.header, samples=self.samples, from_file=False)
                 for scaffold in self.records]
 
-    def get_location(self, annotation_dict, key="Loc", use_synonym=False, strand_key="strand",
-                     synonym_dict=None, feature_type_black_list=[]):
-        self.metadata.add_metadata("##INFO=<ID=%s,Number=.,Type=String,Description=\"Locations of variant\">" % key)
-        self.metadata.add_metadata("##INFO=<ID=%s,Number=.,Type=String,Description=\"Strand\">" % strand_key)
-        for scaffold in self.records:
-            for record in self.records[scaffold]:
-                record.get_location(scaffold, annotation_dict, key=key, use_synonym=use_synonym,
-                                    synonym_dict=synonym_dict, feature_type_black_list=feature_type_black_list,
-                                    strand_key=strand_key)
-
     @staticmethod
     def _reference(record):
         nucleotides = ["A", "C", "G", "T"]
@@ -1448,59 +2543,6 @@ class StatsVCF(FileRoutines):
                 else:
                     record.info_dict[info_name] = value
 
-    def parse_snpeff_info_record(self, string, snpeff_entry="ANN"):
-        if snpeff_entry == "EFF":
-            effect, parameters = string.split("(")
-            # remove closing bracket and split
-            parameters = parameters[:-1].split("|")
-            return [effect] + parameters
-
-        elif snpeff_entry == "ANN":
-            return string.split("|")
-
-    def extract_snpeff_info(self, output_file, snpeff_entry="ANN"):
-
-        snpeff_info_dict_keys = "EFF", "LOS", "NMD"
-        record_header_list = ["Chrom", "Pos", "Ref", "Alt", "Filter"]
-        if snpeff_entry == "EFF":
-            snpeff_header_list = ["Effect", "Effect_Impact", "Functional_Class", "Codon_Change", "Amino_Acid_Change",
-                                  "Amino_Acid_Length", "Gene_Name", "Transcript_BioType", "Gene_Coding",
-                                  "Transcript_ID", "Exon_Rank", "Genotype_Number", "ERRORS", "WARNINGS"]
-        elif snpeff_entry == "ANN":
-            snpeff_header_list = ["Allele", "Annotation",
-                                  "Putative_impact", "Gene_Name",
-                                  "Gene_ID", "Feature type",
-                                  "Feature ID", "Transcript biotype",
-                                  "Rank", "HGVS.c",
-                                  "HGVS.p", "cDNA_position",
-                                  "CDS_position", "Protein_position",
-                                  "Distance_to_feature", "Errors_Warnings"
-                                  ]
-        else:
-            raise ValueError("ERROR!!! Unknow SNPeff entry: %s. Only ANN or EFF are allowed..." % snpeff_entry)
-
-        #print(output_file)
-        with open(output_file, "w") as out_fd:
-            header_string = "#" + "\t".join(record_header_list + snpeff_header_list) + "\n"
-            out_fd.write(header_string)
-            for scaffold in self.records:
-                for record in self.records[scaffold]:
-                    common_part = "%s\t%i\t%s\t%s\t%s" % (scaffold, record.pos, record.ref, ",".join(record.alt_list),
-                                                          ",".join(record.filter_list))
-
-                    if snpeff_entry not in record.info_dict:
-                        continue
-
-                    for effect in record.info_dict[snpeff_entry]:
-                        effect_parameters = self.parse_snpeff_info_record(effect, snpeff_entry)
-                        num_parameters = len(effect_parameters)
-                        for i in range(0, num_parameters):
-                            if effect_parameters[i] == "":
-                                effect_parameters[i] = "."
-                        if num_parameters < 14:
-                            effect_parameters += ["." for i in range(num_parameters, 14)]
-                        out_fd.write(common_part + "\t" + "\t".join(effect_parameters) + "\n")
-
     def count_strandness(self, prefix):
         count_dict = OrderedDict({})
 
@@ -1526,71 +2568,6 @@ class StatsVCF(FileRoutines):
 
         return count_dict
 
-    def variants_start_end(self, left, right, record_dict, skip_genes_without_five_utr=False,
-                           min_five_utr_len=10):
-
-        gene_variants_positions = []
-        all_variant_start_positions = []
-        all_variant_end_positions = []
-
-        for record_id in record_dict:
-            for feature in record_dict[record_id].features:
-                if feature.type != "gene":
-                    continue
-                if skip_genes_without_five_utr:
-                    for sub_feature in feature.sub_features:
-                        if sub_feature.type == "five_prime_UTR" and len(sub_feature) >= min_five_utr_len:
-                            break
-                    else:
-                        continue
-                #print(feature.sub_features)
-                for sub_feature in feature.sub_features:
-                    if sub_feature.type != "CDS":
-                        continue
-                    chrom = record_id
-                    strand = sub_feature.strand
-                    CDS_start = sub_feature.location.start + 1 if strand == +1 else sub_feature.location.end
-                    CDS_end = sub_feature.location.end if strand == +1 else sub_feature.location.start + 1
-                    #region_start = CDS_start - (args.left * strand)
-                    #region_end = CDS_start + (args.right * strand)
-
-                    region_start_start = CDS_start - left if strand == +1 else CDS_start - right
-                    region_start_end = CDS_start + right if strand == +1 else CDS_start + left
-
-                    region_end_start = CDS_end - left if strand == +1 else CDS_end - right
-                    region_end_end = CDS_end + right if strand == +1 else CDS_end + left
-                    #print("aaa")
-                    start_coordinates = []
-                    end_coordinates = []
-                    for variant in self.records[record_id]:
-                        if region_start_start <= variant.pos <= region_start_end:
-                            start_coordinates.append((variant.pos - CDS_start) * strand)
-                        if region_end_start <= variant.pos <= region_end_end:
-                            end_coordinates.append((variant.pos - CDS_end) * strand)
-                    all_variant_start_positions += start_coordinates
-                    all_variant_end_positions += end_coordinates
-                    #print(feature.qualifiers)
-                    gene_variants_positions.append([feature.qualifiers["Name"], strand, chrom, region_start_start,
-                                                    region_start_end, start_coordinates,
-                                                    region_end_start, region_end_end,
-                                                    end_coordinates])
-        return all_variant_start_positions, all_variant_end_positions, gene_variants_positions
-
-    def find_location(self, record_dict, key="Ftype", strand_key="Fstrand", genes_key="Genes", genes_strand_key="Gstrand",
-                      feature_type_black_list=[],
-                      use_synonym=False, synonym_dict=None, add_intergenic_label=True):
-
-        self.metadata.add_metadata("##INFO=<ID=%s,Number=.,Type=String,Description=\"Types of features\">" % key)
-        self.metadata.add_metadata("##INFO=<ID=%s,Number=1,Type=String,Description=\"Strand of features\">" % strand_key)
-        self.metadata.add_metadata("##INFO=<ID=%s,Number=.,Type=String,Description=\"Names of genes\">" % genes_key)
-        self.metadata.add_metadata("##INFO=<ID=%s,Number=.,Type=String,Description=\"Strands of genes\">" % genes_strand_key)
-        for record in self:
-            record.find_location(record_dict, key=key, strand_key=strand_key,
-                                 genes_key=genes_key, genes_strand_key=genes_strand_key,
-                                 feature_type_black_list=feature_type_black_list,
-                                 use_synonym=use_synonym, synonym_dict=synonym_dict,
-                                 add_intergenic_label=add_intergenic_label)
-
     def draw_info_distribution(self, info_dict_key, expression, outfile_prefix,
                                extension_list=(".svg", ".png"), bins=None,):
         scaffold_distribution = OrderedDict()
@@ -1643,55 +2620,6 @@ class StatsVCF(FileRoutines):
             plt.savefig("%s%s" % (outfile_prefix, extension if extension[0] == "." else ".%s" % extension))
         plt.close()
 
-    def set_filter_for_indels_in_homopolymers(self, reference_dict, min_homopolymer_len=4,
-                                              filter_name="indel_in_homopolymer"):
-
-        def expression(scaffold, record):
-            if not record.check_indel():
-                False
-            if scaffold not in reference_dict:
-                raise ValueError("Scaffold %s is absent in reference" % scaffold)
-
-            scaffold_length = len(reference_dict[scaffold])
-
-            reference_pos = record.pos - 1
-            left_flank = None if record.pos == 1 else reference_dict[scaffold].seq[max(0, record.pos-20):record.pos]
-            right_flank = None if (record.pos + 1) == scaffold_length else reference_dict[scaffold].seq[record.pos+1: max(scaffold_length - 1,
-                                                                                                                          record.pos++20)]
-            ref_var_len = len(record.ref)
-            indel_type_list = [None for variant in record.alt_list]
-
-            for i in range(0, len(record.alt_list)):
-                alt_variant = record.alt_list[i]
-                alt_var_len = len(alt_variant)
-                if len(alt_variant) < ref_var_len:
-                    if record.ref[0:alt_var_len] == alt_variant:
-                        indel_type_list[i] = "right"
-                    elif record.ref[-alt_var_len:] == alt_variant:
-                        indel_type_list[i] = "left"
-                elif len(alt_variant) > ref_var_len:
-                    if alt_variant[0:ref_var_len] == record.ref:
-                        indel_type_list[i] = "right"
-                    elif alt_variant[-ref_var_len:] == record.ref:
-                        indel_type_list[i] = "left"
-                else:
-                    continue
-                homo_len = 1
-                if indel_type_list[i] == "right":
-                    for letter in range(1, len(right_flank)):
-                        if letter != right_flank[0]:
-                            break
-                        homo_len += 1
-                elif indel_type_list[i] == "left":
-                    for letter in range(-2, -len(right_flank)-1, -1):
-                        if letter != right_flank[0]:
-                            break
-                        homo_len += 1
-                if homo_len >= min_homopolymer_len:
-                    return True
-            return False
-        self.set_filter(expression, filter_name)
-
 
 if __name__ == "__main__":
     pass
\ No newline at end of file
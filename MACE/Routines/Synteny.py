@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+"""
+Routines for preprocessing of synteny blocks
+"""
+__author__ = 'Sergei F. Kliver'
+
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+
+class Synteny:
+
+    @staticmethod
+    def get_containing_intervals(start_array, end_array):
+        """
+        Finds for each interval all other intervals containing it, i.e. intervals j with
+        start_j <= start_i and end_j >= end_i. Intervals with same coordinates contain each other.
+        Sort-and-sweep: intervals are processed by increasing start, and only intervals overlapping
+        current start are kept in the list of active intervals sorted by end.
+        :param start_array:
+        :param end_array:
+        :return: list with arrays of positional indexes of containing intervals
+        """
+        start_array = np.asarray(start_array)
+        end_array = np.asarray(end_array)
+        interval_number = len(start_array)
+        containing_list = [None] * interval_number
+
+        # by increasing start and decreasing end, so containing intervals are processed first
+        order = np.lexsort((-end_array, start_array))
+        sorted_starts = start_array[order]
+        sorted_ends = end_array[order]
+
+        active_end_list = []
+        active_index_list = []
+        group_start = 0
+        while group_start < interval_number:
+            # intervals with identical coordinates are added together
+            group_end = group_start + 1
+            while (group_end < interval_number) and (sorted_starts[group_end] == sorted_starts[group_start]) \
+                    and (sorted_ends[group_end] == sorted_ends[group_start]):
+                group_end += 1
+
+            start = sorted_starts[group_start]
+            end = sorted_ends[group_start]
+
+            # active intervals ending before current start could not contain current or following intervals
+            removal_index = bisect_left(active_end_list, start)
+            if removal_index:
+                del active_end_list[:removal_index]
+                del active_index_list[:removal_index]
+
+            for index in order[group_start:group_end]:
+                insertion_index = bisect_left(active_end_list, end)
+                active_end_list.insert(insertion_index, end)
+                active_index_list.insert(insertion_index, index)
+
+            candidate_array = np.array(active_index_list[bisect_left(active_end_list, end):])
+            for index in order[group_start:group_end]:
+                containing_list[index] = candidate_array[candidate_array != index]
+
+            group_start = group_end
+
+        return containing_list
+
+    @staticmethod
+    def join_ids(id_array, index_array):
+        return ",".join(id_array[index_array]) if len(index_array) > 0 else pd.NA
+
+    def detect_nested_blocks(self, df,
+                             nested_in_block_column_name="nested_in",
+                             query_nested_in_block_column_name="query_nested_in",
+                             query_scaffold_id_column_name="qName",
+                             query_start_column_name="qStart", query_end_column_name="qEnd",
+                             target_nested_in_block_column_name="target_nested_in",
+                             target_scaffold_id_column_name="tName",
+                             target_start_column_name="tStart", target_end_column_name="tEnd",
+                             block_id_column_name="synteny_block_id"):
+        """
+        Detects blocks nested in other blocks from the same pair of query and target scaffolds.
+        Block is nested in query (target) if its query (target) coordinates are within coordinates of another block.
+        Blocks with same coordinates are considered nested in each other.
+        Column nested_in_block_column_name contains blocks in which block is nested both in query and target.
+        :return: copy of df with three additional columns containing comma-separated ids of blocks or NA
+        """
+        output_df = df.copy()
+        id_array = output_df[block_id_column_name].to_numpy().astype(str)
+        query_nested_in_list = [pd.NA] * len(output_df)
+        target_nested_in_list = [pd.NA] * len(output_df)
+        nested_in_list = [pd.NA] * len(output_df)
+
+        for index_array in output_df.groupby(by=[query_scaffold_id_column_name, target_scaffold_id_column_name],
+                                             sort=False).indices.values():
+            query_containing_list = self.get_containing_intervals(output_df[query_start_column_name].to_numpy()[index_array],
+                                                                  output_df[query_end_column_name].to_numpy()[index_array])
+            target_containing_list = self.get_containing_intervals(output_df[target_start_column_name].to_numpy()[index_array],
+                                                                   output_df[target_end_column_name].to_numpy()[index_array])
+
+            for index, query_containing, target_containing in zip(index_array,
+                                                                  query_containing_list,
+                                                                  target_containing_list):
+                query_nested_in_list[index] = self.join_ids(id_array, index_array[query_containing])
+                target_nested_in_list[index] = self.join_ids(id_array, index_array[target_containing])
+                if (len(query_containing) > 0) and (len(target_containing) > 0):
+                    # empty string if block is nested in different blocks in query and target
+                    nested_in_list[index] = ",".join(id_array[index_array[np.intersect1d(query_containing,
+                                                                                         target_containing)]])
+
+        output_df[query_nested_in_block_column_name] = query_nested_in_list
+        output_df[target_nested_in_block_column_name] = target_nested_in_list
+        output_df[nested_in_block_column_name] = nested_in_list
+
+        return output_df
+
+    def detect_same_coords_blocks(self, df,
+                                  query_same_coords_in_block_column_name="query_same_coords",
+                                  query_scaffold_id_column_name="qName",
+                                  query_start_column_name="qStart", query_end_column_name="qEnd",
+                                  target_same_coords_in_block_column_name="target_same_coords",
+                                  target_scaffold_id_column_name="tName",
+                                  target_start_column_name="tStart", target_end_column_name="tEnd",
+                                  block_id_column_name="synteny_block_id"):
+        """
+        Detects blocks with same query (target) scaffold and coordinates
+        :return: copy of df with two additional columns containing comma-separated ids of other blocks or NA
+        """
+        output_df = df.copy()
+        id_array = output_df[block_id_column_name].to_numpy().astype(str)
+
+        for same_coords_column_name, coordinate_column_list in [(query_same_coords_in_block_column_name,
+                                                                 [query_scaffold_id_column_name,
+                                                                  query_start_column_name,
+                                                                  query_end_column_name]),
+                                                                (target_same_coords_in_block_column_name,
+                                                                 [target_scaffold_id_column_name,
+                                                                  target_start_column_name,
+                                                                  target_end_column_name])]:
+            same_coords_list = [pd.NA] * len(output_df)
+            for index_array in output_df.groupby(by=coordinate_column_list, sort=False).indices.values():
+                if len(index_array) == 1:
+                    continue
+                for index in index_array:
+                    same_coords_list[index] = self.join_ids(id_array, index_array[index_array != index])
+
+            output_df[same_coords_column_name] = same_coords_list
+
+        return output_df
+
+    @staticmethod
+    def add_distances_to_adjacent_blocks(df, start_column_name="start", end_column_name="end"):
+        """
+        Adds distances to previous and next blocks from the same pair of scaffolds. Pairs of scaffolds are defined
+        by first two levels of the index, and df must be sorted by coordinates.
+        Block is considered embedded if it ends before the end of the previous block.
+        :return: copy of df with columns dist_upstream, dist_downstream, dist_end_start, dist_end_end and embedded
+        """
+        output_df = df.copy()
+        start_series = df[start_column_name].astype("Int64")
+        end_series = df[end_column_name].astype("Int64")
+        grouped_end_series = end_series.groupby(level=[0, 1], sort=False)
+        previous_end_series = grouped_end_series.shift(1)
+
+        output_df["dist_upstream"] = start_series - previous_end_series
+        output_df["dist_downstream"] = start_series.groupby(level=[0, 1], sort=False).shift(-1) - end_series
+        output_df["dist_end_start"] = start_series - previous_end_series
+        output_df["dist_end_end"] = end_series - previous_end_series
+        output_df["embedded"] = output_df["dist_end_end"] <= 0
+
+        return output_df
+
+    def get_adjacent_block_distances(self, bed_df,
+                                     scaffold_column_name="scaffold", start_column_name="start",
+                                     end_column_name="end", query_column_name="query",
+                                     query_start_column_name="query_start", query_end_column_name="query_end"):
+        """
+        Sorts blocks, removes embedded ones and calculates distances between adjacent blocks from the same
+        pair of scaffolds. Result doesn't depend on filtering parameters, so it is calculated once and
+        then filtered via filter_isolated_short_blocks for each combination of parameters.
+        :return: dataframe indexed by scaffold and query with block lengths and distances
+        """
+        sorting_column_list = [scaffold_column_name, start_column_name, end_column_name,
+                               query_column_name, query_start_column_name, query_end_column_name]
+        tmp_df = bed_df.reset_index(drop=False).set_index([scaffold_column_name,
+                                                           query_column_name]).sort_values(by=sorting_column_list,
+                                                                                           axis=0)
+        tmp_df["target_len"] = tmp_df[end_column_name] - tmp_df[start_column_name]
+        tmp_df["query_len"] = tmp_df[query_end_column_name] - tmp_df[query_start_column_name]
+
+        tmp_df = self.add_distances_to_adjacent_blocks(tmp_df, start_column_name=start_column_name,
+                                                       end_column_name=end_column_name)
+        tmp_df["embedded"].fillna(False, inplace=True)
+        # recalculate distances after removal of embedded blocks
+        return self.add_distances_to_adjacent_blocks(tmp_df[tmp_df["embedded"] <= 0],
+                                                     start_column_name=start_column_name,
+                                                     end_column_name=end_column_name)
+
+    @staticmethod
+    def filter_isolated_short_blocks(distance_df, min_block_len=1000000, max_dist_between_short_blocks=3000000):
+        """
+        Removes short blocks having no other blocks from the same pair of scaffolds nearby
+        :param distance_df: output of get_adjacent_block_distances
+        :param min_block_len:
+        :param max_dist_between_short_blocks:
+        :return: filtered distance_df
+        """
+        return distance_df[~((distance_df["target_len"] < min_block_len) &
+                             ((distance_df["dist_upstream"] > max_dist_between_short_blocks) | distance_df["dist_upstream"].isna()) &
+                             ((distance_df["dist_downstream"] > max_dist_between_short_blocks) | distance_df["dist_downstream"].isna()))]
+
+    @staticmethod
+    def get_gaps_to_previous_blocks(df, start_column_name="start", end_column_name="end"):
+        """
+        Calculates for each block distance from its start to the maximal end of preceding blocks
+        in the same run of blocks from the same pair of scaffolds. Pairs of scaffolds are defined by
+        first two levels of the index.
+        :return: float array, NaN for first block in each run
+        """
+        scaffold_array = df.index.get_level_values(0).to_numpy()
+        query_array = df.index.get_level_values(1).to_numpy()
+        run_id_array = np.cumsum(np.concatenate([[True], (scaffold_array[1:] != scaffold_array[:-1]) |
+                                                 (query_array[1:] != query_array[:-1])])) if len(df) > 0 else np.array([], dtype=int)
+        previous_max_end_series = pd.Series(df[end_column_name].to_numpy(dtype=np.float64)).groupby(run_id_array).cummax().groupby(run_id_array).shift(1)
+
+        return df[start_column_name].to_numpy(dtype=np.float64) - previous_max_end_series.to_numpy()
+
+    def merge_adjacent_blocks(self, df, max_dist_between_blocks=1000000, gap_array=None,
+                              start_column_name="start", end_column_name="end", color_column_name="color"):
+        """
+        Merges consecutive blocks from the same pair of scaffolds if distance between them is less than
+        max_dist_between_blocks. Pairs of scaffolds are defined by first two levels of the index.
+        :param df:
+        :param max_dist_between_blocks: non-negative integer
+        :param gap_array: output of get_gaps_to_previous_blocks, calculated if not set
+        :return: dataframe with merged blocks indexed by scaffold and query
+        """
+        if max_dist_between_blocks < 0:
+            raise ValueError("ERROR!!! Maximal distance between blocks should be non-negative!")
+        if gap_array is None:
+            gap_array = self.get_gaps_to_previous_blocks(df, start_column_name=start_column_name,
+                                                         end_column_name=end_column_name)
+
+        temp = df[[start_column_name, end_column_name, color_column_name]].reset_index(drop=False)
+        first_block_index_array = np.flatnonzero(np.isnan(gap_array) | (gap_array >= max_dist_between_blocks))
+
+        merged_df = temp.iloc[first_block_index_array].copy()
+        merged_df.columns = ["scaffold", "query", "start", "end", "color"]
+        if len(first_block_index_array) > 0:
+            merged_df["end"] = np.maximum.reduceat(temp[end_column_name].to_numpy(), first_block_index_array)
+        merged_df.set_index(["scaffold", "query"], inplace=True)
+        merged_df["target_len"] = merged_df["end"] - merged_df["start"]
+
+        return merged_df
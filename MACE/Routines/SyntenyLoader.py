@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+Loader of synteny input files (PSL/BED and per-genome tables) with optional binary cache
+"""
+__author__ = 'Sergei F. Kliver'
+
+import glob
+import hashlib
+from pathlib import Path
+from functools import partial
+from collections import OrderedDict
+
+import pandas as pd
+
+from RouToolPa.Parsers.PSL import CollectionPSL
+
+from MACE.Functions.Cache import read_with_cache
+
+
+class SyntenyLoader:
+    # extensions of optional lists of scaffold ids in genome directory
+    genome_dir_optional_list_extensions = ["orderlist", "invertlist", "queryswitchstrandlist", "targetswitchstrandlist"]
+
+    @staticmethod
+    def get_filenames_for_extension(dir_path, extension_list, force_uniq=True):
+        filelist = []
+        for extension in extension_list:
+            filelist += list(glob.glob(str(dir_path) + "/*{0}".format(extension)))
+        if not filelist:
+            return None
+        print(filelist)
+        if force_uniq:
+            if len(filelist) > 1:
+                raise ValueError("Found more than one file with extensions: {0} in directory {1}".format(",".join(extension_list),
+                                                                                                        str(dir_path)))
+            else:
+                return filelist[0]
+
+        return filelist
+
+    @staticmethod
+    def get_signature(obj):
+        """
+        Returns stable signature of the dict/pandas object to be used as a part of the cache key
+        """
+        if isinstance(obj, (pd.Series, pd.DataFrame)):
+            obj = obj.to_dict()
+        elif isinstance(obj, dict):
+            obj = {key: value.to_dict() if isinstance(value, (pd.Series, pd.DataFrame)) else value
+                   for key, value in obj.items()}
+
+        return hashlib.sha1(repr(obj).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def read_list(list_file, cache_dir=None):
+        return read_with_cache(list_file,
+                               lambda s: pd.read_csv(s, sep="\t", header=None, comment="#", usecols=[0],
+                                                     names=["scaffold"]),
+                               "list", cache_dir=cache_dir)["scaffold"]
+
+    @staticmethod
+    def read_len(len_file, cache_dir=None):
+        return read_with_cache(len_file,
+                               lambda s: pd.read_csv(s, sep="\t", header=None, comment="#", names=["scaffold", "length"],
+                                                     index_col=0),
+                               "len", cache_dir=cache_dir)
+
+    @staticmethod
+    def read_syn(syn_file, key_column=0, value_column=1, cache_dir=None):
+        return read_with_cache(syn_file,
+                               lambda s: pd.read_csv(s, usecols=(key_column, value_column), sep="\t", header=None,
+                                                     comment="#",
+                                                     names=["key", "syn"] if key_column <= value_column else ["syn", "key"]).set_index("key"),
+                               "syn", cache_dir=cache_dir, parameters=(key_column, value_column))
+
+    @staticmethod
+    def read_centromere_bed(bed_file, cache_dir=None):
+        return read_with_cache(bed_file,
+                               lambda s: pd.read_csv(s, usecols=(0, 1, 2), index_col=0, header=None, sep="\t",
+                                                     names=["scaffold_id", "start", "end"]),
+                               "centromere", cache_dir=cache_dir)
+
+    @staticmethod
+    def read_colors(color_file, cache_dir=None):
+        return read_with_cache(color_file,
+                               lambda s: pd.read_csv(s, sep="\t", header=0, names=["scaffold", "color"], index_col=0),
+                               "colors", cache_dir=cache_dir)
+
+    def read_genome_dir(self, genome_dir, syn_file_key_column=0, syn_file_value_column=1, cache_dir=None):
+        """
+        Reads per-genome tables from the genome directory. Whitelist and len files are obligatory,
+        all other files might be empty or absent.
+        :param genome_dir:
+        :param syn_file_key_column:
+        :param syn_file_value_column:
+        :param cache_dir: directory with cache files. If None, cache is not used
+        :return: OrderedDict with keys "whitelist", "len", "orderlist", "invertlist", "queryswitchstrandlist",
+                 "targetswitchstrandlist", "syn", "centromere" and "colors"
+        """
+        genome = Path(genome_dir).name
+        table_dict = OrderedDict()
+
+        # nonempty whitelist and len files are necessary for each genome
+        for extension, reader, label, hint in [["whitelist", self.read_list, "Whitelist",
+                                                "Add relevant scaffold ids to it!"],
+                                               ["len", self.read_len, "Lenlist",
+                                                "Add scaffold ids and its lengths to it!"]]:
+            filename = self.get_filenames_for_extension(genome_dir, extension_list=[extension])
+            if filename is None:
+                raise ValueError(f"ERROR!!! {label} for {genome} is absent!")
+            try:
+                table_dict[extension] = reader(filename, cache_dir=cache_dir)
+            except pd.errors.EmptyDataError:
+                raise pd.errors.EmptyDataError(f"ERROR!!! {label} for {genome} is empty. {hint}")
+
+        empty_centromere_df = pd.DataFrame(columns=["scaffold_id", "start", "end"]).set_index("scaffold_id")
+        empty_color_df = pd.DataFrame(columns=["scaffold", "color"]).set_index("scaffold")
+
+        for extension, reader, empty_table in [*[[list_extension, self.read_list, pd.Series(dtype=str)]
+                                                 for list_extension in self.genome_dir_optional_list_extensions],
+                                               ["syn", partial(self.read_syn, key_column=syn_file_key_column,
+                                                               value_column=syn_file_value_column),
+                                                pd.DataFrame(columns=["syn"])],
+                                               ["centromere.bed", self.read_centromere_bed, empty_centromere_df],
+                                               ["colors", self.read_colors, empty_color_df]]:
+            key = "centromere" if extension == "centromere.bed" else extension
+            filename = self.get_filenames_for_extension(genome_dir, extension_list=[extension])
+            if filename is None:
+                table_dict[key] = empty_table
+                continue
+            try:
+                table_dict[key] = reader(filename, cache_dir=cache_dir)
+            except pd.errors.EmptyDataError:
+                table_dict[key] = empty_table
+
+        return table_dict
+
+    @staticmethod
+    def read_psl(psl_file, target_white_list=None, query_white_list=None,
+                 target_black_list=None, query_black_list=None,
+                 target_syn_dict=None, query_syn_dict=None,
+                 cache_dir=None, **kwargs):
+        """
+        Reads PSL file in coordinates_only mode. Whole file is parsed (and cached) once,
+        and white/black lists and renaming are applied to the parsed table, so changes of them do not invalidate the cache.
+        :param psl_file:
+        :param target_white_list:
+        :param query_white_list:
+        :param target_black_list:
+        :param query_black_list:
+        :param target_syn_dict:
+        :param query_syn_dict:
+        :param cache_dir: directory with cache files. If None, cache is not used
+        :param kwargs: additional parsing options passed to CollectionPSL
+        :return: pandas.DataFrame with records
+        """
+        records = read_with_cache(psl_file,
+                                  lambda s: CollectionPSL(in_file=s, parsing_mode="coordinates_only", **kwargs).records,
+                                  "psl", cache_dir=cache_dir, parameters=sorted(kwargs.items()))
+
+        for column, white_list, black_list in [["tName", target_white_list, target_black_list],
+                                               ["qName", query_white_list, query_black_list]]:
+            if (white_list is not None) and (len(white_list) > 0):
+                records = records[records[column].isin(set(white_list))]
+            if (black_list is not None) and (len(black_list) > 0):
+                records = records[~records[column].isin(set(black_list))]
+
+        records = records.copy()
+        for column, syn_dict in [["tName", target_syn_dict], ["qName", query_syn_dict]]:
+            if syn_dict:
+                records[column] = records[column].replace(syn_dict)
+
+        return records
+
+    def read_synteny_bed(self, bed_file, scaffold_syn_dict=None, rename_dict=None, cache_dir=None):
+        """
+        Reads BED file in bed_synteny_track format. Synonyms are a part of the cache key.
+        :param bed_file:
+        :param scaffold_syn_dict:
+        :param rename_dict:
+        :param cache_dir: directory with cache files. If None, cache is not used
+        :return: pandas.DataFrame with records
+        """
+        from RouToolPa.Parsers.BED import CollectionBED
+
+        return read_with_cache(bed_file,
+                               lambda s: CollectionBED(in_file=s, header_in_file=True,
+                                                       format="bed_synteny_track", parsing_mode="all",
+                                                       scaffold_syn_dict=scaffold_syn_dict,
+                                                       rename_dict=rename_dict).records,
+                               "bed_synteny_track", cache_dir=cache_dir,
+                               parameters=(self.get_signature(scaffold_syn_dict), self.get_signature(rename_dict)))
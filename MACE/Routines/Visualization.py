@@ -3,6 +3,8 @@ import math
 import datetime
 
 from copy import deepcopy
+from functools import partial
+from multiprocessing import Pool
 from collections.abc import Iterable
 from collections import OrderedDict
 
@@ -23,6 +25,7 @@ from MACE.Visualization.Figures import *
 
 from MACE.Visualization.Legends import *
 from MACE.Functions.Generators import recursive_generator
+from MACE.Functions.Colors import get_threshold_colors
 from MACE.Visualization.Styles.Subplot import *
 from MACE.Visualization.Styles.Figure import *
 from MACE.Visualization.Styles.Feature import *
@@ -143,7 +146,8 @@ class Visualization(DrawingRoutines):
                                       track_group_label_fontstyle='normal',
                                       stranded_tracks=False,
                                       rounded_tracks=False,
-                                      stranded_end_tracks=False
+                                      stranded_end_tracks=False,
+                                      threads=1
                                       ):
 
         self.draw_windows(count_df, window_size, window_step, scaffold_length_df,
@@ -168,7 +172,8 @@ class Visualization(DrawingRoutines):
                           track_group_label_fontstyle=track_group_label_fontstyle,
                           stranded_tracks=stranded_tracks,
                           rounded_tracks=rounded_tracks,
-                          stranded_end_tracks=stranded_end_tracks
+                          stranded_end_tracks=stranded_end_tracks,
+                          threads=threads
                           )
 
     def draw_coverage_windows(self, count_df, window_size, window_step, scaffold_length_df,
@@ -193,7 +198,8 @@ class Visualization(DrawingRoutines):
                               track_group_label_fontstyle='normal',
                               stranded_tracks=False,
                               rounded_tracks=False,
-                              stranded_end_tracks=False
+                              stranded_end_tracks=False,
+                              threads=1
                               ):
 
         if absolute_coverage_values:
@@ -244,11 +250,72 @@ class Visualization(DrawingRoutines):
                                 track_group_label_fontstyle=track_group_label_fontstyle,
                                 stranded_tracks=stranded_tracks,
                                 rounded_tracks=rounded_tracks,
-                                stranded_end_tracks=stranded_end_tracks
+                                stranded_end_tracks=stranded_end_tracks,
+                                threads=threads
                                 )
 
         return fig
 
+    def draw_coverage_windows_per_scaffold(self, coverage_df_dict, window_size, window_step, scaffold_length_df,
+                                           mean_coverage_df, output_prefix, scaffold_list=None,
+                                           title_template="Coverage {0}", threads=1, **kwargs):
+        """
+        Draws a separated figure for each scaffold with coverage tracks of all samples.
+        Coverage tables are merged and grouped by scaffold only once: merged table is sorted by scaffold and
+        table of each scaffold is a slice defined by offset table. If threads > 1 figures are drawn
+        in a pool of processes.
+        :param coverage_df_dict: OrderedDict label -> coverage DataFrame indexed by (scaffold, window)
+        :param window_size:
+        :param window_step:
+        :param scaffold_length_df: DataFrame with scaffold lengths, indexed by scaffold
+        :param mean_coverage_df: DataFrame with mean coverage of samples, indexed by label
+        :param output_prefix: figures are saved to <output_prefix>.<scaffold>.<extension>
+        :param scaffold_list: scaffolds to draw. Default: all scaffolds present in coverage tables
+        :param title_template: template of figure title, {0} is replaced by scaffold id
+        :param threads: number of processes
+        :param kwargs: other options for draw_coverage_windows
+        :return:
+        """
+        merged_df = pd.concat(coverage_df_dict, names=["label"])
+        scaffold_codes, scaffolds = pd.factorize(merged_df.index.get_level_values(1))
+        # stable sort keeps order of labels and windows inside scaffold
+        merged_df = merged_df.iloc[np.argsort(scaffold_codes, kind="stable")].droplevel(1)
+        offset_array = np.concatenate([[0], np.cumsum(np.bincount(scaffold_codes, minlength=len(scaffolds)))])
+        scaffold_index_dict = dict(zip(scaffolds, range(len(scaffolds))))
+
+        argument_list = []
+        for scaffold in (scaffold_list if scaffold_list is not None else scaffolds):
+            if scaffold not in scaffold_index_dict:
+                continue
+            scaffold_index = scaffold_index_dict[scaffold]
+            scaffold_df = merged_df.iloc[offset_array[scaffold_index]:offset_array[scaffold_index + 1]]
+            labels = scaffold_df.index.get_level_values(0).unique()
+            length_df = scaffold_length_df.loc[[scaffold] * len(labels)]
+            length_df.index = labels
+            argument_list.append((scaffold_df, length_df, mean_coverage_df.loc[labels],
+                                  "{0}.{1}".format(output_prefix, scaffold), title_template.format(scaffold)))
+
+        drawing_function = partial(self.draw_scaffold_coverage_windows, window_size=window_size,
+                                   window_step=window_step, **kwargs)
+        if (threads > 1) and (len(argument_list) > 1):
+            with Pool(threads) as pool:
+                pool.starmap(partial(drawing_function, noninteractive_backend=True), argument_list)
+        else:
+            for arguments in argument_list:
+                drawing_function(*arguments)
+
+    def draw_scaffold_coverage_windows(self, count_df, scaffold_length_df, mean_coverage_df, output_prefix, title,
+                                       window_size=100000, window_step=None, noninteractive_backend=False, **kwargs):
+        """
+        Draws and closes coverage figure for a single scaffold. Used by draw_coverage_windows_per_scaffold,
+        could be run in a separated process.
+        :param noninteractive_backend: switch to non-interactive (Agg) backend, necessary for worker processes
+        """
+        if noninteractive_backend:
+            plt.switch_backend("Agg")
+        self.draw_coverage_windows(count_df, window_size, window_step, scaffold_length_df, mean_coverage_df,
+                                   output_prefix, title=title, close_figure=True, **kwargs)
+
     def draw_windows(self, count_df, window_size, window_step, scaffold_length_df,
                      output_prefix,
                      plot_type="densities",
@@ -271,81 +338,133 @@ class Visualization(DrawingRoutines):
                      track_group_label_fontstyle='normal',
                      stranded_tracks=False,
                      rounded_tracks=False,
-                     stranded_end_tracks=False
+                     stranded_end_tracks=False,
+                     threads=1
                      ):
-
+        """
+        Window tracks (coordinates and densities) are created only once and then are colored and drawn
+        for each colormap. If test_colormaps is set and threads > 1 colormaps are drawn in a pool of processes.
+        """
         track_group_dict = OrderedDict()
         window_step_final = window_step if window_step else window_size
         scaffolds = scaffold_order_list[::-1] if scaffold_order_list else count_df.index.get_level_values(level=0).unique().to_list()
-        scaffold_number = len(scaffolds)
-        # if test_colormaps:
-        #print(count_df)
-
-        #feature_df =
-
-        for colormap_entry in self.colormap_list if test_colormaps else [colormap]:
-            print("%s\tDrawing using %s colormap..." % (str(datetime.datetime.now()), colormap_entry))
-            if plot_type == "densities":
-                legend = DensityLegend(colormap=colormap_entry,
-                                       thresholds=thresholds)
-            elif plot_type == "coverage":
-                legend = CoverageLegend(colormap=colormap_entry,
-                                        thresholds=thresholds)
-            else:
-                legend = None
+        colormap_list = self.colormap_list if test_colormaps else [colormap]
 
-            if test_colormaps:
-                fig_title = (title + " (colormap %s)" % colormap_entry) if title else "Colormap %s" % colormap_entry
-            else:
-                fig_title = title
+        track_number = 0
 
-            # TODO: replace color recalculation for whole dataframe by replacenments in category
-            # TODO: switch to delivering masking as separate df
+        track_group_style = TrackGroupStyle(label_fontstyle=track_group_label_fontstyle)
 
-            track_number = 0
+        for chr in scaffolds: # count_df.index.get_level_values(level=0).unique():
+            track_group_dict[chr] = TrackGroup(label=chr if show_trackgroup_label else None,
+                                               style=track_group_style)
+            tracks_to_use = list(count_df.columns)
+            if "masked" in tracks_to_use:
+                tracks_to_use.remove("masked")
+            for track_name in tracks_to_use: #count_df.columns:
+                if count_df.loc[chr, [track_name]].isnull().values.any():
+                    # skip empty track
+                    continue
+                track_group_dict[chr][track_name] = WindowTrack(count_df.loc[chr, [track_name, "masked"] if "masked" in count_df.columns else [track_name]],
+                                                                window_size, window_step_final,
+                                                                x_end=scaffold_length_df.loc[chr].iloc[0],
+                                                                multiplier=multiplier,
+                                                                label=track_name if show_track_label else None,
+                                                                thresholds=thresholds,
+                                                                colors=colors, background=background,
+                                                                masked=masked, norm=norm)
+                track_number += 1
 
-            track_group_style = TrackGroupStyle(label_fontstyle=track_group_label_fontstyle)
+        drawing_options = {"output_prefix": output_prefix,
+                           "plot_type": plot_type,
+                           "figure_width": figure_width,
+                           "figure_height_per_scaffold": figure_height_per_scaffold,
+                           "dpi": dpi,
+                           "thresholds": thresholds,
+                           "title": title,
+                           "extensions": extensions,
+                           "test_colormaps": test_colormaps,
+                           "masking": masking,
+                           "subplots_adjust_left": subplots_adjust_left,
+                           "subplots_adjust_bottom": subplots_adjust_bottom,
+                           "subplots_adjust_right": subplots_adjust_right,
+                           "subplots_adjust_top": subplots_adjust_top}
+
+        if test_colormaps and (threads > 1):
+            with Pool(threads) as pool:
+                pool.starmap(partial(self.draw_window_track_groups, track_group_dict, track_number,
+                                     close_figure=True, noninteractive_backend=True, return_figure=False,
+                                     **drawing_options),
+                             [(colormap_entry, figure_number) for figure_number, colormap_entry in enumerate(colormap_list, start=1)])
+            return None
+
+        for colormap_entry in colormap_list:
+            fig = self.draw_window_track_groups(track_group_dict, track_number, colormap_entry, 1,
+                                                close_figure=test_colormaps or close_figure, **drawing_options)
 
-            for chr in scaffolds: # count_df.index.get_level_values(level=0).unique():
-                track_group_dict[chr] = TrackGroup(label=chr if show_trackgroup_label else None,
-                                                   style=track_group_style)
-                tracks_to_use = list(count_df.columns)
-                if "masked" in tracks_to_use:
-                    tracks_to_use.remove("masked")
-                for track_name in tracks_to_use: #count_df.columns:
-                    #print(chr)
-                    #print(track_name)
-                    if count_df.loc[chr, [track_name]].isnull().values.any():
-                        # skip empty track
-                        continue
-                    track_group_dict[chr][track_name] = WindowTrack(count_df.loc[chr, [track_name, "masked"] if "masked" in count_df.columns else [track_name]],
-                                                                    window_size, window_step_final,
-                                                                    x_end=scaffold_length_df.loc[chr].iloc[0],
-                                                                    multiplier=multiplier,
-                                                                    label=track_name if show_track_label else None,
-                                                                    colormap=colormap_entry,
-                                                                    thresholds=thresholds,
-                                                                    colors=colors, background=background,
-                                                                    masked=masked, norm=norm)
-                    track_group_dict[chr][track_name].add_color(masking=masking)
-                    track_number += 1
-            chromosome_subplot = Subplot(track_group_dict,
-                                         title=fig_title,
-                                         style=chromosome_subplot_style,
-                                         legend=legend)
-
-            fig = plt.figure(1, figsize=(figure_width, int(track_number * figure_height_per_scaffold)), dpi=dpi)
-
-            chromosome_subplot.draw()
-            plt.subplots_adjust(left=subplots_adjust_left, right=subplots_adjust_right,
-                                top=subplots_adjust_top, bottom=subplots_adjust_bottom)
+        return None if test_colormaps else fig
 
-            for ext in extensions:
-                plt.savefig("%s.%s.%s" % (output_prefix, colormap_entry, ext))
-            if test_colormaps or close_figure:
-                plt.close(1)
+    @staticmethod
+    def draw_window_track_groups(track_group_dict, track_number, colormap, figure_number, output_prefix,
+                                 plot_type="densities", figure_width=15, figure_height_per_scaffold=0.5, dpi=300,
+                                 thresholds=None, title=None, extensions=("png", ), test_colormaps=False,
+                                 masking=True, subplots_adjust_left=None, subplots_adjust_bottom=None,
+                                 subplots_adjust_right=None, subplots_adjust_top=None, close_figure=False,
+                                 noninteractive_backend=False, return_figure=True):
+        """
+        Colors already created window tracks using colormap and draws them. Used by draw_windows,
+        could be run in a separated process.
+        :param track_group_dict: OrderedDict of TrackGroups with WindowTracks
+        :param track_number:
+        :param colormap:
+        :param figure_number: number of matplotlib figure to use
+        :param noninteractive_backend: switch to non-interactive (Agg) backend, necessary for worker processes
+        :param return_figure: return figure. Must be False in worker processes as figures could not be pickled
+        :return: figure or None
+        """
+        if noninteractive_backend:
+            plt.switch_backend("Agg")
+
+        print("%s\tDrawing using %s colormap..." % (str(datetime.datetime.now()), colormap))
+        if plot_type == "densities":
+            legend = DensityLegend(colormap=colormap,
+                                   thresholds=thresholds)
+        elif plot_type == "coverage":
+            legend = CoverageLegend(colormap=colormap,
+                                    thresholds=thresholds)
+        else:
+            legend = None
 
-        return None if test_colormaps else fig
+        if test_colormaps:
+            fig_title = (title + " (colormap %s)" % colormap) if title else "Colormap %s" % colormap
+        else:
+            fig_title = title
+
+        for chr in track_group_dict:
+            for track_name in track_group_dict[chr]:
+                track = track_group_dict[chr][track_name]
+                if colormap and thresholds:
+                    track.style.colormap = colormap
+                    track.style.cmap = plt.get_cmap(colormap, len(thresholds))
+                    track.style.colors = [track.style.cmap(i) for i in range(0, len(thresholds))]
+                track.add_color(masking=masking)
+
+        chromosome_subplot = Subplot(track_group_dict,
+                                     title=fig_title,
+                                     style=chromosome_subplot_style,
+                                     legend=legend)
+
+        fig = plt.figure(figure_number, figsize=(figure_width, int(track_number * figure_height_per_scaffold)), dpi=dpi)
+
+        chromosome_subplot.draw()
+        plt.subplots_adjust(left=subplots_adjust_left, right=subplots_adjust_right,
+                            top=subplots_adjust_top, bottom=subplots_adjust_bottom)
+
+        for ext in extensions:
+            plt.savefig("%s.%s.%s" % (output_prefix, colormap, ext))
+        if close_figure:
+            plt.close(figure_number)
+
+        return fig if return_figure else None
 
     @staticmethod
     def color_threshold_expression(value, thresholds, colors, background):
@@ -373,11 +492,36 @@ class Visualization(DrawingRoutines):
                 return colors[i]
 
     @staticmethod
-    def add_color_to_track_df(track_df, expression, value_column_index=-1, value_column_name=None,
-                                masking=False, masked_color="grey"):
+    def add_color_to_track_df(track_df, expression=None, value_column_index=-1, value_column_name=None,
+                              masking=False, masked_color="grey", thresholds=None, colors=None, background="white"):
+        """
+        Adds 'color' column to track dataframe. If thresholds and colors are set, colors are assigned in a
+        vectorized way (see MACE.Functions.Colors.get_threshold_colors) and column is categorical,
+        otherwise expression is applied to each value.
+        :param track_df:
+        :param expression: function, returning color for a value. Ignored if thresholds and colors are set
+        :param value_column_index:
+        :param value_column_name:
+        :param masking:
+        :param masked_color:
+        :param thresholds:
+        :param colors:
+        :param background:
+        :return:
+        """
         output_df = track_df.copy()
+        value_series = output_df[value_column_name] if value_column_name else output_df.iloc[:, value_column_index]
+
+        if (thresholds is not None) and (colors is not None):
+            masked_array = (output_df["masked"] == True).to_numpy() if masking and ("masked" in output_df) else None
+            output_df["color"] = get_threshold_colors(value_series.to_numpy(), thresholds, colors, background,
+                                                      masked=masked_color, masked_array=masked_array)
+            return output_df
 
-        output_df["color"] = list(map(expression, output_df[value_column_name].to_list() if value_column_name else output_df.iloc[:, value_column_index].to_list()))
+        if expression is None:
+            raise ValueError("ERROR!!! Neither expression nor thresholds and colors were set!")
+
+        output_df["color"] = list(map(expression, value_series.to_list()))
         output_df["color"].astype('category', copy=False)
         if masking and ("masked" in output_df):
             output_df.loc[output_df["masked"] == True, "color"] = masked_color
@@ -442,7 +586,8 @@ class Visualization(DrawingRoutines):
                       xmax_multiplier=1.1, ymax_multiplier=1.1,
                       xtick_fontsize=None,
                       subplot_title_fontsize=None,
-                      subplot_title_fontweight='bold'
+                      subplot_title_fontweight='bold',
+                      figure_number=1
                       ):
 
         track_group_dict = OrderedDict()
@@ -547,8 +692,8 @@ class Visualization(DrawingRoutines):
         #print((figure_width,
         #                       max(1, int(scaffold_number * figure_height_per_scaffold + figure_header_height))))
         #print((scaffold_number, figure_height_per_scaffold, figure_header_height))
-        plt.figure(1, figsize=(figure_width,
-                               max(1, int(track_number * figure_height_per_scaffold + figure_header_height))), dpi=dpi)
+        plt.figure(figure_number, figsize=(figure_width,
+                                           max(1, int(track_number * figure_height_per_scaffold + figure_header_height))), dpi=dpi)
 
         chromosome_subplot.draw()
         plt.subplots_adjust(left=subplots_adjust_left, right=subplots_adjust_right,
@@ -558,7 +703,81 @@ class Visualization(DrawingRoutines):
             plt.savefig("%s.%s" % (output_prefix, ext))
 
         if close_figure:
-            plt.close(1)
+            plt.close(figure_number)
+
+    def draw_features_with_colormaps(self, track_df_dict, scaffold_length_df, scaffold_order_list, output_prefix,
+                                     thresholds, colormap_list, legend_type="density", feature_name="SNPs",
+                                     background="white", add_colormap_to_prefix=False, write_colored_tracks=False,
+                                     threads=1, **kwargs):
+        """
+        Colors tracks using thresholds and colors from each colormap and draws them via draw_features.
+        If threads > 1 and there are several colormaps, they are drawn in a pool of processes.
+        :param track_df_dict: dict with track dataframes, last column of each dataframe is used for coloring
+        :param scaffold_length_df:
+        :param scaffold_order_list:
+        :param output_prefix:
+        :param thresholds:
+        :param colormap_list:
+        :param legend_type: 'density' or 'coverage'
+        :param feature_name: feature name for density legend
+        :param background:
+        :param add_colormap_to_prefix: add colormap name to output prefix of figures
+        :param write_colored_tracks: write colored tracks to <output_prefix>.<colormap>.track.bed files
+        :param threads: number of processes
+        :param kwargs: other options for draw_features
+        :return:
+        """
+        drawing_function = partial(self.draw_colored_features, track_df_dict, scaffold_length_df,
+                                   scaffold_order_list, output_prefix, thresholds, legend_type=legend_type,
+                                   feature_name=feature_name, background=background,
+                                   add_colormap_to_prefix=add_colormap_to_prefix,
+                                   write_colored_tracks=write_colored_tracks, **kwargs)
+
+        if (threads > 1) and (len(colormap_list) > 1):
+            with Pool(threads) as pool:
+                pool.starmap(partial(drawing_function, noninteractive_backend=True),
+                             [(colormap, figure_number) for figure_number, colormap in enumerate(colormap_list, start=1)])
+        else:
+            for colormap in colormap_list:
+                drawing_function(colormap, 1)
+
+    def draw_colored_features(self, track_df_dict, scaffold_length_df, scaffold_order_list, output_prefix,
+                              thresholds, colormap, figure_number, legend_type="density", feature_name="SNPs",
+                              background="white", add_colormap_to_prefix=False, write_colored_tracks=False,
+                              noninteractive_backend=False, **kwargs):
+        """
+        Draws tracks colored using single colormap. Used by draw_features_with_colormaps,
+        could be run in a separated process.
+        :param noninteractive_backend: switch to non-interactive (Agg) backend, necessary for worker processes
+        """
+        if noninteractive_backend:
+            plt.switch_backend("Agg")
+
+        cmap = plt.get_cmap(colormap, len(thresholds))
+        colors = ["#" + "".join(["{:02X}".format(int(255 * channel)) for channel in cmap(i)[:3]])
+                  for i in range(0, len(thresholds))]
+
+        colored_track_df_dict = OrderedDict()
+        for track_label in track_df_dict:
+            colored_track_df_dict[track_label] = self.add_color_to_track_df(track_df_dict[track_label],
+                                                                            value_column_index=-1,
+                                                                            thresholds=thresholds,
+                                                                            colors=colors,
+                                                                            background=background)
+            if write_colored_tracks:
+                colored_track_df_dict[track_label].to_csv("{}.{}.track.bed".format(output_prefix, colormap),
+                                                          sep="\t", header=True, index=True)
+
+        if legend_type == "density":
+            legend = self.density_legend(colors, thresholds, feature_name=feature_name)
+        elif legend_type == "coverage":
+            legend = self.coverage_legend(colormap=colormap, thresholds=thresholds)
+        else:
+            legend = None
+
+        self.draw_features(colored_track_df_dict, scaffold_length_df, scaffold_order_list,
+                           "{}.{}".format(output_prefix, colormap) if add_colormap_to_prefix else output_prefix,
+                           legend=legend, figure_number=figure_number, **kwargs)
     """
     def draw_features(self, collection_gff, scaffold_length_df,
                       output_prefix,
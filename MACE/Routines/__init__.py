@@ -1,7 +1,11 @@
 from MACE.Routines.Stat import StatsVCF
 from MACE.Routines.Circos import Circos
 from MACE.Routines.Visualization import Visualization
+from MACE.Routines.Synteny import Synteny
+from MACE.Routines.SyntenyLoader import SyntenyLoader
 
 Circos = Circos()
 StatsVCF = StatsVCF()
 Visualization = Visualization()
+Synteny = Synteny()
+SyntenyLoader = SyntenyLoader()
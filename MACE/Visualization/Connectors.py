@@ -2,6 +2,8 @@
 from matplotlib.patches import Polygon
 from matplotlib.path import Path
 from matplotlib.patches import PathPatch
+from matplotlib.collections import PathCollection
+from matplotlib.colors import to_rgba_array
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -103,4 +105,88 @@ class CubicBezierConnector(Connector):
                      Path.LINETO,
                      Path.CURVE4, Path.CURVE4, Path.CURVE4,
                      Path.CLOSEPOLY, ]
-                     )
\ No newline at end of file
+                     )
+
+class CubicBezierConnectorCollection(PathCollection):
+    """
+    Vectorized analog of CubicBezierConnector: vertices of all connectors are calculated at once
+    and connectors are drawn as a single PathCollection.
+    Coordinates are arrays of shape (N, 2) with (x, y) of corresponding points of connectors.
+    """
+    path_commands = np.array([Path.MOVETO,
+                              Path.CURVE4, Path.CURVE4, Path.CURVE4,
+                              Path.LINETO,
+                              Path.CURVE4, Path.CURVE4, Path.CURVE4,
+                              Path.CLOSEPOLY, ], dtype=Path.code_type)
+
+    def __init__(self, top_start, top_end, bottom_start, bottom_end,
+                 x_fraction_parameter: float = 4,
+                 y_fraction_parameter: float = 4,
+                 y_shift: [None, float] = None,
+                 edgecolors="grey",
+                 facecolors="grey",
+                 alpha=0.3,
+                 fill: bool = True,
+                 zorder=None,
+                 linewidth=0,
+                 antialiased=False
+                 ):
+        self.top_start = np.asarray(top_start, dtype=np.float64)
+        self.top_end = np.asarray(top_end, dtype=np.float64)
+        self.bottom_start = np.asarray(bottom_start, dtype=np.float64)
+        self.bottom_end = np.asarray(bottom_end, dtype=np.float64)
+        self.x_fraction_parameter = x_fraction_parameter
+        self.y_fraction_parameter = y_fraction_parameter
+        self.y_shift = y_shift
+
+        self.path_coordinates = self.calculate_path_coordinates()
+
+        PathCollection.__init__(self,
+                                [Path(coordinates, self.path_commands) for coordinates in self.path_coordinates],
+                                facecolors=self.apply_alpha(facecolors, alpha) if fill else "none",
+                                edgecolors=self.apply_alpha(edgecolors, alpha),
+                                linewidths=linewidth,
+                                antialiased=antialiased,
+                                zorder=zorder)
+
+    def apply_alpha(self, colors, alpha):
+        """
+        Converts colors to RGBA array and sets alpha (single value or array with a value per connector)
+        """
+        rgba_array = to_rgba_array(colors)
+        if len(rgba_array) == 1:
+            rgba_array = np.repeat(rgba_array, len(self.path_coordinates), axis=0)
+        if alpha is not None:
+            rgba_array[:, 3] = alpha
+        return rgba_array
+
+    def calculate_path_coordinates(self):
+        """
+        :return: array of shape (N, 9, 2) with vertices of connectors
+        """
+        coordinates = np.zeros((len(self.top_start), 9, 2), dtype=np.float64)
+        coordinates[:, 0] = self.top_start
+        coordinates[:, 3] = self.bottom_start
+        coordinates[:, 4] = self.bottom_end
+        coordinates[:, 7] = self.top_end
+
+        if self.y_shift is None:
+            coordinates[:, 1, 0] = self.top_start[:, 0] + (self.bottom_start[:, 0] - self.top_start[:, 0]) / self.x_fraction_parameter
+            coordinates[:, 1, 1] = self.top_start[:, 1] + (self.top_end[:, 1] - self.top_start[:, 1]) / self.y_fraction_parameter
+            coordinates[:, 2, 0] = self.bottom_start[:, 0] - (self.bottom_start[:, 0] - self.top_start[:, 0]) / self.x_fraction_parameter
+            coordinates[:, 2, 1] = self.bottom_start[:, 1] + (self.bottom_end[:, 1] - self.bottom_start[:, 1]) / self.y_fraction_parameter
+            coordinates[:, 5, 0] = self.bottom_end[:, 0] - (self.bottom_end[:, 0] - self.top_end[:, 0]) / self.x_fraction_parameter
+            coordinates[:, 5, 1] = self.bottom_end[:, 1] - (self.bottom_end[:, 1] - self.bottom_start[:, 1]) / self.y_fraction_parameter
+            coordinates[:, 6, 0] = self.top_end[:, 0] + (self.bottom_end[:, 0] - self.top_end[:, 0]) / self.x_fraction_parameter
+            coordinates[:, 6, 1] = self.top_end[:, 1] - (self.top_end[:, 1] - self.top_start[:, 1]) / self.y_fraction_parameter
+        else:
+            coordinates[:, 1, 0] = self.top_start[:, 0]
+            coordinates[:, 1, 1] = self.top_start[:, 1] - self.y_shift / self.y_fraction_parameter
+            coordinates[:, 2, 0] = self.bottom_start[:, 0]
+            coordinates[:, 2, 1] = self.bottom_start[:, 1] + self.y_shift / self.y_fraction_parameter
+            coordinates[:, 5, 0] = self.bottom_end[:, 0]
+            coordinates[:, 5, 1] = self.bottom_end[:, 1] + self.y_shift / self.y_fraction_parameter
+            coordinates[:, 6, 0] = self.top_end[:, 0]
+            coordinates[:, 6, 1] = self.top_end[:, 1] - self.y_shift / self.y_fraction_parameter
+
+        return coordinates
@@ -1,15 +1,18 @@
 
 from MACE.Visualization.Styles.Track import default_track_style
 from MACE.Visualization.Styles.Feature import default_feature_style
+from MACE.Functions.Colors import get_threshold_colors
 
 
 import numpy as np
+import pandas as pd
 
 import matplotlib.pyplot as plt
 plt.ioff()
-from matplotlib.collections import PatchCollection
+from matplotlib.collections import PatchCollection, PolyCollection
 from matplotlib.patches import Rectangle, Circle, Ellipse, Polygon
 from matplotlib.lines import Line2D
+from matplotlib.colors import to_rgba_array
 
 
 class Track:
@@ -153,10 +156,76 @@ class Track:
                          "was not implemented in called descendant class")
         pass
 
+    @staticmethod
+    def create_rectangle_vertices(x_array, width_array, y_start, height):
+        """
+        Creates vertices of rectangles in a single array
+        :param x_array: array with left coordinates of rectangles
+        :param width_array: array with widths of rectangles or single width for all of them
+        :param y_start: bottom coordinate of rectangles
+        :param height: height of rectangles
+        :return: array of shape (N, 4, 2)
+        """
+        x_array = np.asarray(x_array, dtype=np.float64)
+        vertices = np.empty((len(x_array), 4, 2), dtype=np.float64)
+        vertices[:, 0:2, 0] = x_array[:, np.newaxis]
+        vertices[:, 2:4, 0] = (x_array + width_array)[:, np.newaxis]
+        vertices[:, (0, 3), 1] = y_start
+        vertices[:, 1:3, 1] = y_start + height
+
+        return vertices
+
+    def create_rectangle_collection(self, records, x_column, width, y_start, height, feature_style, zorder,
+                                    color_column=None, default_edge_color=False):
+        """
+        Creates single PolyCollection with rectangles for all records instead of separated Rectangle patches
+        :param records: dataframe with features/windows
+        :param x_column: column with left coordinates of rectangles
+        :param width: column with widths of rectangles or single width for all of them
+        :param y_start: bottom coordinate of rectangles
+        :param height: height of rectangles
+        :param feature_style:
+        :param zorder:
+        :param color_column: column with face colors. If absent face color from feature style is used
+        :param default_edge_color: use matplotlib default edge color (edgecolor=None) instead of edge color
+                                   from feature style
+        :return: PolyCollection or None if records are empty
+        """
+        if records.empty:
+            return None
+
+        vertices = self.create_rectangle_vertices(records[x_column].to_numpy(),
+                                                  records[width].to_numpy() if isinstance(width, str) else width,
+                                                  y_start, height)
+        if (color_column is not None) and (color_column in records.columns):
+            if isinstance(records[color_column].dtype, pd.CategoricalDtype):
+                # colors are converted to RGBA only once per category
+                face_colors = to_rgba_array(records[color_column].cat.categories)[records[color_column].cat.codes.to_numpy()]
+            else:
+                face_colors = records[color_column].to_list()
+        else:
+            face_colors = feature_style.face_color
+
+        return PolyCollection(vertices,
+                              closed=True,
+                              facecolors=face_colors,
+                              edgecolors=None if default_edge_color else feature_style.edge_color,
+                              linewidths=feature_style.edge_width,
+                              antialiased=False,
+                              zorder=zorder)
+
+    def create_rectangle_collections(self, style=None, feature_style=None, y_start=None, strand_column="strand"):
+        """
+        Track type dependent function, vectorized alternative to create_patch_function for rectangle patches
+        :return: (collection, None) or (forward_collection, reverse_collection)
+        """
+        raise ValueError("ERROR!!! Call for ancestor abstract class method, i.e this method "
+                         "was not implemented in called descendant class")
+
     def create_patch_collection(self, y_start=None, style=None, feature_style=None,
                                 track_xmin=None, track_xmax=None, patch_function=None,
                                 forward_patch_function=None, reverse_patch_function=None,
-                                strand_column="strand", *args, **kwargs):
+                                strand_column="strand", vectorized=True, *args, **kwargs):
         if self.records is None:
             return 0
         # TODO: add min and max coordinate filtering
@@ -167,6 +236,15 @@ class Track:
 
         y_track = y_start if y_start else self.y_start
 
+        # rectangles are drawn as a single PolyCollection (one per strand) built from vertex array
+        # unless custom patch functions were set
+        if vectorized and (used_feature_style.patch_type == "rectangle") and \
+                (patch_function is None) and (forward_patch_function is None) and (reverse_patch_function is None) and \
+                (self.patch_function is None) and (self.forward_patch_function is None) and \
+                (self.reverse_patch_function is None):
+            return self.create_rectangle_collections(style=used_style, feature_style=used_feature_style,
+                                                     y_start=y_track, strand_column=strand_column)
+
         # TODO: simplify following code, self.path function is already tuple of two functions or Nones.
         if not self.stranded:
             if patch_function:
@@ -720,6 +798,23 @@ class WindowTrack(Track):
         else:
             raise ValueError("ERROR!!! Unknown window type: %s" % self.window_type)
 
+    def add_color(self, masking=True, value_column="density", style=None):
+        """
+        Adds categorical 'color' column to the records using thresholds, colors, background and masked color
+        from track style. Windows with True in 'masked' column get masked color if masking is set.
+        :param masking:
+        :param value_column:
+        :param style:
+        :return:
+        """
+        used_style = style if style else self.style
+        masked_array = (self.records["masked"] == True).to_numpy() if masking and ("masked" in self.records.columns) else None
+
+        self.records["color"] = get_threshold_colors(self.records[value_column].to_numpy(),
+                                                     used_style.thresholds, used_style.colors,
+                                                     used_style.background, masked=used_style.masked,
+                                                     masked_array=masked_array)
+
     def create_patch_function(self, style=None, feature_style=None, y_start=None, *args, **kwargs):
 
         if feature_style.patch_type == "rectangle":
@@ -751,6 +846,14 @@ class WindowTrack(Track):
 
                 return create_patch, None
 
+    def create_rectangle_collections(self, style=None, feature_style=None, y_start=None, strand_column="strand"):
+        used_style = style if style else self.style
+        used_feature_style = feature_style if feature_style else self.feature_style
+
+        return self.create_rectangle_collection(self.records, "start", self.window_size, y_start,
+                                                used_style.height, used_feature_style,
+                                                used_style.zorder["element"], color_column="color"), None
+
 
 class FeatureTrack(Track):
 
@@ -809,6 +912,43 @@ class FeatureTrack(Track):
         if self.records is not None:
             self.records[self.feature_length_column_id] = self.records[self.feature_end_column_id] - self.records[self.feature_start_column_id]
 
+    def create_rectangle_collections(self, style=None, feature_style=None, y_start=None, strand_column="strand",
+                                     stranded=None):
+        used_style = style if style else self.style
+        used_feature_style = feature_style if feature_style else self.feature_style
+
+        stranded_feature = stranded if stranded is not None else self.stranded
+
+        if not stranded_feature:
+            return self.create_rectangle_collection(self.records, self.feature_start_column_id,
+                                                    self.feature_length_column_id, y_start, used_style.height,
+                                                    used_feature_style, used_style.zorder["element"],
+                                                    color_column=self.feature_color_column_id), None
+
+        if strand_column in self.records.columns:
+            forward_records = self.records[self.records[strand_column] == "+"]
+            reverse_records = self.records[self.records[strand_column] == "-"]
+        else:
+            forward_records = self.records
+            reverse_records = None
+
+        # as in create_patch_function, forward rectangles colored from column have no edge color set
+        forward_collection = self.create_rectangle_collection(forward_records, self.feature_start_column_id,
+                                                              self.feature_length_column_id,
+                                                              y_start + (used_style.height / 2),
+                                                              used_style.height / 2, used_feature_style,
+                                                              used_style.zorder["element"],
+                                                              color_column=self.feature_color_column_id,
+                                                              default_edge_color=self.feature_color_column_id in self.records.columns)
+        reverse_collection = None if reverse_records is None else \
+            self.create_rectangle_collection(reverse_records, self.feature_start_column_id,
+                                             self.feature_length_column_id, y_start,
+                                             used_style.height / 2, used_feature_style,
+                                             used_style.zorder["element"],
+                                             color_column=self.feature_color_column_id)
+
+        return forward_collection, reverse_collection
+
     def create_patch_function(self, style=None, feature_style=None, y_start=None, stranded=None, *args, **kwargs):
         if self.records is None:
             return 0
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Comparison of StatsVCF.count_feature_length_in_windows with brute-force per-position counting
+on simulated features
+"""
+__author__ = 'Sergei F. Kliver'
+
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from MACE.Routines import StatsVCF
+
+
+class SimulatedCollectionGFF:
+
+    def __init__(self, records):
+        self.records = records
+        self.scaffold_list = records.index.get_level_values(0).unique().to_list()
+
+
+def simulate_features(scaffold_number, scaffold_length, feature_number, max_feature_length, seed):
+    generator = np.random.default_rng(seed)
+    scaffold_ids = ["chr%i" % i for i in range(1, scaffold_number + 1)]
+    length_df = pd.DataFrame({"length": generator.integers(1, scaffold_length, scaffold_number)},
+                             index=pd.Index(scaffold_ids, name="scaffold"))
+
+    scaffold_array = np.sort(generator.integers(0, scaffold_number, feature_number))
+    start_array = generator.integers(0, length_df["length"].to_numpy()[scaffold_array])
+    end_array = np.minimum(start_array + generator.integers(1, max_feature_length, feature_number),
+                           length_df["length"].to_numpy()[scaffold_array])
+    records = pd.DataFrame({"start": start_array, "end": end_array},
+                           index=pd.MultiIndex.from_arrays([np.array(scaffold_ids)[scaffold_array],
+                                                            np.arange(0, feature_number)],
+                                                           names=("scaffold", "row")))
+    return SimulatedCollectionGFF(records), length_df
+
+
+def count_feature_length_in_windows_brute_force(collection_gff, window_size, window_step, length_df):
+    count_list = []
+    for scaffold in length_df.index:
+        scaffold_length = length_df.loc[scaffold, "length"]
+        window_number = StatsVCF.count_window_number_in_scaffold(scaffold_length, window_size, window_step)
+        if window_number == 0:
+            continue
+        coverage = np.zeros(scaffold_length, dtype=np.int64)
+        if scaffold in collection_gff.scaffold_list:
+            for start, end in collection_gff.records.loc[scaffold][["start", "end"]].itertuples(index=False):
+                coverage[start:end] += 1
+        count_list += [coverage[i * window_step: i * window_step + window_size].sum() for i in range(0, window_number)]
+    return np.array(count_list)
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument("-c", "--scaffold_number", action="store", dest="scaffold_number", default=10, type=int,
+                    help="Number of simulated scaffolds. Default: 10")
+parser.add_argument("-l", "--scaffold_length", action="store", dest="scaffold_length", default=1000000, type=int,
+                    help="Maximum length of simulated scaffolds. Default: 1000000")
+parser.add_argument("-n", "--feature_number", action="store", dest="feature_number", default=10000, type=int,
+                    help="Number of simulated features. Default: 10000")
+parser.add_argument("-m", "--max_feature_length", action="store", dest="max_feature_length", default=5000, type=int,
+                    help="Maximum length of simulated features. Default: 5000")
+parser.add_argument("-w", "--window_size", action="store", dest="window_size", default=100000, type=int,
+                    help="Size of the windows Default: 100000")
+parser.add_argument("-s", "--window_step", action="store", dest="window_step", default=10000, type=int,
+                    help="Step of the sliding windows. Default: 10000")
+parser.add_argument("--skip_brute_force", action="store_true", dest="skip_brute_force", default=False,
+                    help="Skip brute-force counting, i.e. only time vectorized implementation. Default: False")
+parser.add_argument("--seed", action="store", dest="seed", default=0, type=int,
+                    help="Seed for random generator. Default: 0")
+
+args = parser.parse_args()
+
+features, reference_length_df = simulate_features(args.scaffold_number, args.scaffold_length, args.feature_number,
+                                                  args.max_feature_length, args.seed)
+
+start_time = time.perf_counter()
+count_df = StatsVCF.count_feature_length_in_windows(features, args.window_size, args.window_step,
+                                                    reference_length_df)
+print("vectorized\t%.3f s" % (time.perf_counter() - start_time))
+
+if not args.skip_brute_force:
+    start_time = time.perf_counter()
+    brute_force_counts = count_feature_length_in_windows_brute_force(features, args.window_size, args.window_step,
+                                                                     reference_length_df)
+    print("brute-force\t%.3f s" % (time.perf_counter() - start_time))
+
+    if not np.array_equal(count_df["counts"].to_numpy(), brute_force_counts):
+        raise ValueError("ERROR!!! Vectorized counts differ from brute-force counts in %i windows" %
+                         int(np.sum(count_df["counts"].to_numpy() != brute_force_counts)))
+    print("Counts are identical in all %i windows" % len(count_df))
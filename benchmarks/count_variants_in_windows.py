@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Benchmark of engines used by StatsVCF.count_variants_in_windows on simulated variants
+"""
+__author__ = 'Sergei F. Kliver'
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from RouToolPa.Parsers.VCF import CollectionVCF
+from MACE.Routines import StatsVCF
+
+
+def simulate_collection(scaffold_number, scaffold_length, variant_number, seed):
+    generator = np.random.default_rng(seed)
+    scaffold_ids = ["chr%i" % i for i in range(1, scaffold_number + 1)]
+    length_df = pd.DataFrame({"length": generator.integers(scaffold_length // 2, scaffold_length,
+                                                           scaffold_number)},
+                             index=pd.Index(scaffold_ids, name="scaffold"))
+
+    scaffold_array = np.sort(generator.integers(0, scaffold_number, variant_number))
+    position_array = generator.integers(0, length_df["length"].to_numpy()[scaffold_array])
+
+    records = pd.DataFrame({("POS", "POS", "POS"): position_array})
+    records.index = pd.MultiIndex.from_arrays([np.array(scaffold_ids)[scaffold_array], np.arange(0, variant_number)],
+                                              names=("CHROM", "ROW"))
+    collection = CollectionVCF(records=records, samples=["simulated"], metadata={},
+                               parsing_mode="only_coordinates")
+    return collection, length_df
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument("-c", "--scaffold_number", action="store", dest="scaffold_number", default=30, type=int,
+                    help="Number of simulated scaffolds. Default: 30")
+parser.add_argument("-l", "--scaffold_length", action="store", dest="scaffold_length", default=100000000, type=int,
+                    help="Maximum length of simulated scaffolds. Default: 100000000")
+parser.add_argument("-n", "--variant_number", action="store", dest="variant_number", default=1000000, type=int,
+                    help="Number of simulated variants. Default: 1000000")
+parser.add_argument("-w", "--window_size", action="store", dest="window_size", default=100000, type=int,
+                    help="Size of the windows Default: 100000")
+parser.add_argument("-s", "--window_step", action="store", dest="window_step", default=10000, type=int,
+                    help="Step of the sliding windows. Default: 10000")
+parser.add_argument("-e", "--engines", action="store", dest="engines", default=("pandas", "numpy"),
+                    type=lambda s: s.split(","),
+                    help="Comma-separated list of engines to compare. Default: pandas,numpy")
+parser.add_argument("-r", "--repeats", action="store", dest="repeats", default=1, type=int,
+                    help="Number of repeats for each engine. Minimal time is reported. Default: 1")
+parser.add_argument("--seed", action="store", dest="seed", default=0, type=int,
+                    help="Seed for random generator. Default: 0")
+
+args = parser.parse_args()
+
+variants, reference_length_df = simulate_collection(args.scaffold_number, args.scaffold_length,
+                                                    args.variant_number, args.seed)
+
+count_df_dict = {}
+for engine in args.engines:
+    time_list = []
+    for repeat in range(0, args.repeats):
+        start_time = time.perf_counter()
+        count_df_dict[engine] = StatsVCF.count_variants_in_windows(variants, args.window_size, args.window_step,
+                                                                   reference_scaffold_lengths=reference_length_df,
+                                                                   scaffold_black_list=[], scaffold_white_list=[],
+                                                                   engine=engine)
+        time_list.append(time.perf_counter() - start_time)
+    print("%s\t%.3f s" % (engine, min(time_list)))
+
+for engine in args.engines[1:]:
+    difference = (count_df_dict[engine] - count_df_dict[args.engines[0]]).abs()
+    print("%s vs %s\tdifferent windows: %i\tmax difference: %i" % (engine, args.engines[0],
+                                                                   int((difference.iloc[:, 0] > 0).sum()),
+                                                                   int(difference.max().iloc[0])))
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+Comparison of Synteny.detect_nested_blocks and Synteny.detect_same_coords_blocks with brute-force
+pairwise comparison on simulated synteny blocks
+"""
+__author__ = 'Sergei F. Kliver'
+
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from MACE.Routines import Synteny
+
+
+def simulate_blocks(block_number, scaffold_number, scaffold_length, max_block_length, seed):
+    generator = np.random.default_rng(seed)
+    # coordinates are drawn from a coarse grid to get blocks with identical coordinates
+    block_df = pd.DataFrame({"qName": generator.integers(0, scaffold_number, block_number).astype(str),
+                             "tName": generator.integers(0, scaffold_number, block_number).astype(str)})
+    for prefix in "q", "t":
+        start_array = generator.integers(0, scaffold_length // 100, block_number) * 100
+        block_df[prefix + "Start"] = start_array
+        block_df[prefix + "End"] = start_array + generator.integers(1, max_block_length // 100, block_number) * 100
+    block_df["synteny_block_id"] = ["SB_{0}".format(block_id) for block_id in range(1, block_number + 1)]
+
+    return block_df
+
+
+def detect_blocks_brute_force(block_df):
+    id_array = block_df["synteny_block_id"].to_numpy()
+    column_dict = {column: [set() for i in range(0, len(block_df))] for column in ("query_same_coords",
+                                                                                   "target_same_coords",
+                                                                                   "query_nested_in",
+                                                                                   "target_nested_in",
+                                                                                   "nested_in")}
+    pair_array = (block_df["qName"] + ":" + block_df["tName"]).to_numpy()
+    for index in range(0, len(block_df)):
+        other = np.arange(len(block_df)) != index
+        nested_dict = {}
+        for prefix, side in ("q", "query"), ("t", "target"):
+            scaffolds = block_df[prefix + "Name"].to_numpy()
+            starts = block_df[prefix + "Start"].to_numpy()
+            ends = block_df[prefix + "End"].to_numpy()
+            same_coords = other & (scaffolds == scaffolds[index]) & (starts == starts[index]) & (ends == ends[index])
+            column_dict[side + "_same_coords"][index] = set(id_array[same_coords])
+            nested_dict[side] = set(id_array[other & (pair_array == pair_array[index]) &
+                                             (starts <= starts[index]) & (ends >= ends[index])])
+            column_dict[side + "_nested_in"][index] = nested_dict[side]
+        column_dict["nested_in"][index] = nested_dict["query"] & nested_dict["target"]
+
+    return column_dict
+
+
+def convert_to_sets(series):
+    return [set() if (pd.isna(value) or (value == "")) else set(value.split(",")) for value in series]
+
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument("-n", "--block_number", action="store", dest="block_number", default=3000, type=int,
+                    help="Number of simulated synteny blocks. Default: 3000")
+parser.add_argument("-c", "--scaffold_number", action="store", dest="scaffold_number", default=3, type=int,
+                    help="Number of simulated scaffolds in each genome. Default: 3")
+parser.add_argument("-l", "--scaffold_length", action="store", dest="scaffold_length", default=1000000, type=int,
+                    help="Length of simulated scaffolds. Default: 1000000")
+parser.add_argument("-m", "--max_block_length", action="store", dest="max_block_length", default=50000, type=int,
+                    help="Maximum length of simulated blocks. Default: 50000")
+parser.add_argument("--skip_brute_force", action="store_true", dest="skip_brute_force", default=False,
+                    help="Skip brute-force detection, i.e. only time sweep implementation. Default: False")
+parser.add_argument("--seed", action="store", dest="seed", default=0, type=int,
+                    help="Seed for random generator. Default: 0")
+
+args = parser.parse_args()
+
+blocks = simulate_blocks(args.block_number, args.scaffold_number, args.scaffold_length, args.max_block_length,
+                         args.seed)
+
+start_time = time.perf_counter()
+output_df = Synteny.detect_nested_blocks(Synteny.detect_same_coords_blocks(blocks))
+print("sweep\t%.3f s" % (time.perf_counter() - start_time))
+
+if not args.skip_brute_force:
+    start_time = time.perf_counter()
+    brute_force_dict = detect_blocks_brute_force(blocks)
+    print("brute-force\t%.3f s" % (time.perf_counter() - start_time))
+    for column in brute_force_dict:
+        difference_number = sum([a != b for a, b in zip(convert_to_sets(output_df[column]), brute_force_dict[column])])
+        if difference_number > 0:
+            raise ValueError("ERROR!!! Column %s differs from brute-force result for %i blocks" % (column,
+                                                                                                  difference_number))
+        print("%s\t%i blocks with entries\tidentical" % (column, output_df[column].notna().sum()))
@@ -6,7 +6,9 @@ import argparse
 
 import pandas as pd
 import numpy as np
-from RouToolPa.Parsers.VCF import CollectionVCF
+from MACE.Routines import StatsVCF
+from MACE.Functions.General import metaopen
+from MACE.Functions.Genotypes import get_allele_length_array, get_genotype_allele_lengths
 
 
 parser = argparse.ArgumentParser()
@@ -38,21 +40,21 @@ parser.add_argument("-o", "--output", action="store", dest="output", default=sys
                     help="Output file with length of STR allels.")
 parser.add_argument("-p", "--pop_df_file", action="store", dest="pop_df_file",
                     help="File to save encoded sample and pop ids. Default: not set")
+parser.add_argument("--ploidy", action="store", dest="ploidy", default=2, type=int,
+                    help="Ploidy of samples. Default: 2")
+parser.add_argument("--chunk_size", action="store", dest="chunk_size", default=10000, type=int,
+                    help="Number of loci per chunk. Default: 10000")
 
 args = parser.parse_args()
 
-str_vcf_col = CollectionVCF(in_file=args.input, parsing_mode="complete")
-sys.stderr.write(str(str_vcf_col))
-#sys.stderr.write(str(list(str_vcf_col.records.columns)))
-#sys.stderr.write("\n")
-#sys.stderr.write(str(str_vcf_col.parsing_mode))
-#sys.stderr.write("\n")
-#sys.stderr.write(str(str_vcf_col.parsing_parameters[str_vcf_col.parsing_mode]) + "\n")
+with metaopen(args.input, "r") as in_fd:
+    vcf_samples = StatsVCF.read_vcf_header(in_fd)[0]
+
 if args.pop_file:
     pop_df = pd.read_csv(args.pop_file, sep="\t", header=None, index_col="id", names=["id", "pop_id"])
 else:
-    pop_df = pd.DataFrame.from_records(zip(str_vcf_col.samples,
-                                           range(1, len(str_vcf_col.samples) + 1)), index=["id"], columns=["id", "pop_id"])
+    pop_df = pd.DataFrame.from_records(zip(vcf_samples,
+                                           range(1, len(vcf_samples) + 1)), index=["id"], columns=["id", "pop_id"])
 sample_orderlist = list(pop_df.index)
 
 pop_df["id_code"] = range(1, len(pop_df) + 1)
@@ -62,59 +64,50 @@ if args.amplicon_len_file:
     str_len_df = pd.read_csv(args.amplicon_len_file, sep="\t", header=0, usecols=(args.amplicon_id_column_name,
                                                                                   args.amplicon_len_column_name),
                              index_col=args.amplicon_id_column_name,)
-
-tmp = str_vcf_col.records.reset_index(drop=False).set_index(("ID", "ID", "ID"))
-if args.amplicon_len_file:
-    tmp["length"] = str_len_df
-
-genotype_df = tmp.xs("GT", level=1, axis=1)
-genotype_df = genotype_df[sample_orderlist]
-#genotype_df = genotype_df[sample_orderlist]
-#sys.stderr.write("\n" + str(genotype_df) + "\n")
-#sys.stderr.write("\n" + str(genotype_df.columns.get_level_values(0)[::-1]) + "\n")
-#sys.stderr.write("\n" + str(genotype_df[genotype_df.columns.get_level_values(0)[::-1]]) + "\n")
-#sys.stderr.write("\n" + str(genotype_df[genotype_df.columns.get_index_level(0)]) + "\n")
-
-allel_length_df = tmp[["REF", "ALT"]].applymap(lambda value: len(value) if isinstance(value, str) else np.nan).astype('Int32')
-
-if args.amplicon_len_file:
-    allel_length_df = allel_length_df[["REF", "ALT"]].subtract(allel_length_df[("REF", "REF", 0)], axis=0).astype('Int32').add(tmp["length"], axis=0)
-
-allel_length_df = allel_length_df.droplevel(0, axis=1)
-
-max_allel_number = len(allel_length_df.columns)
-genotype_column_number = len(genotype_df.columns)
-merged_df = pd.merge(allel_length_df, genotype_df, left_index=True, right_index=True)
-#sys.stderr.write("\n" + str(merged_df) + "\n")
-genotype_length_array = []
-for row in merged_df.itertuples(index=False):
-    new_row = []
-    for genotype in row[max_allel_number:]:
-        new_row.append(row[genotype] if not pd.isnull(genotype) else np.NaN)
-    genotype_length_array.append(new_row)
-
-new_genotype_df = pd.DataFrame.from_records(genotype_length_array,
-                                            index=genotype_df.index,
-                                            columns=genotype_df.columns).astype('Int32')
-
-allel_df = new_genotype_df.transpose().droplevel(level=1)
-allel_df.index.name = "sample"
+    str_len_df.index = str_len_df.index.astype(str)
+
+sample_columns = [9 + vcf_samples.index(sample) for sample in sample_orderlist]
+locus_id_list = []
+genotype_length_list = []
+with metaopen(args.input, "r") as in_fd:
+    StatsVCF.read_vcf_header(in_fd)
+    for chunk in StatsVCF.read_vcf_records_by_chunks(in_fd, [2, 3, 4] + sample_columns, chunk_size=args.chunk_size):
+        allel_length_array = get_allele_length_array(chunk[3], chunk[4])
+        if args.amplicon_len_file:
+            # lengths are shifted to amplicon length of reference allel, loci absent in amplicon file are set to NA
+            amplicon_len_array = str_len_df[args.amplicon_len_column_name].reindex(chunk[2]).to_numpy(dtype=np.float64)
+            shifted_length_array = allel_length_array - allel_length_array[:, :1] + \
+                                   np.nan_to_num(amplicon_len_array, nan=0)[:, None]
+            allel_length_array = np.where((allel_length_array >= 0) & ~np.isnan(amplicon_len_array)[:, None],
+                                          shifted_length_array, -1).astype(np.int32)
+
+        genotype_array = StatsVCF.get_genotype_array_from_sample_fields(chunk[sample_columns], ploidy=args.ploidy,
+                                                                        dtype=np.int32)
+        genotype_length_list.append(get_genotype_allele_lengths(allel_length_array,
+                                                                genotype_array).reshape(len(chunk), -1))
+        locus_id_list.append(chunk[2].to_numpy())
+
+locus_id_array = np.concatenate(locus_id_list) if locus_id_list else np.empty(0, dtype=str)
 
 if args.encode_ids and args.pop_df_file:
     pop_df.to_csv(args.pop_df_file, sep="\t", header=True, index=True)
 
-if args.encode_ids and args.add_population_column:
-    allel_df["pop_id"] = pop_df["pop_id_code"]
-elif args.add_population_column:
-    allel_df["pop_id"] = pop_df["pop_id"]
-if args.add_population_column:  # make pop_id column first
-    allel_df = allel_df[[list(allel_df.columns)[-1]] + list(allel_df.columns)[:-1]]
-
-#sys.stdout.write("\n" + str(allel_df) + "\n ")
-#sys.stdout.write("\n" + str(allel_df.reindex(sample_orderlist)) + "\n ")
-
-if args.encode_ids:
-    allel_df.rename(index=pop_df["id_code"], inplace=True)
-    #allel_df.sort_values(by='sample')
-
-allel_df.to_csv(args.output, sep="\t", index=True, na_rep=args.na_replacement)
+# each sample is represented by ploidy rows
+row_id_array = np.repeat(pop_df["id_code"].to_numpy() if args.encode_ids else np.array(sample_orderlist),
+                         args.ploidy).astype(str)
+if args.add_population_column:
+    row_pop_id_array = np.repeat(pop_df["pop_id_code" if args.encode_ids else "pop_id"].to_numpy(),
+                                 args.ploidy).astype(str)
+
+out_fd = open(args.output, "w") if isinstance(args.output, str) else args.output
+out_fd.write("\t".join(["sample"] + (["pop_id"] if args.add_population_column else []) +
+                       list(locus_id_array)) + "\n")
+# rows of output are columns of chunks, so each row is collected from all chunks and formatted on the fly
+for row_index in range(len(row_id_array)):
+    out_fd.write("\t".join([row_id_array[row_index]] +
+                           ([row_pop_id_array[row_index]] if args.add_population_column else []) +
+                           [str(length) if length >= 0 else args.na_replacement
+                            for genotype_length_array in genotype_length_list
+                            for length in genotype_length_array[:, row_index].tolist()]) + "\n")
+if out_fd is not sys.stdout:
+    out_fd.close()
@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 __author__ = 'Sergei F. Kliver'
 
+import os
 import argparse
 
 from RouToolPa.Parsers.VCF import CollectionVCF
-from RouToolPa.Parsers.Sequence import CollectionSequence
+from RouToolPa.Collections.General import IdList
 from MACE.Routines import StatsVCF
+from MACE.Functions.Sequence import get_scaffold_length_df
 
 parser = argparse.ArgumentParser()
 
@@ -22,21 +24,42 @@ parser.add_argument("-s", "--window_step", action="store", dest="window_step", d
                     help="Step of the sliding windows. Default: window size, i.e windows are staking")
 parser.add_argument("-e", "--per_sample", action="store_true", dest="per_sample", default=False,
                     help="Count variants for each sample independently. Default: count all samples together")
+parser.add_argument("-a", "--scaffold_white_list", action="store", dest="scaffold_white_list", default=[],
+                    type=lambda s: IdList(filename=s) if os.path.exists(s) else s.split(","),
+                    help="Comma-separated list or file with the only scaffolds to count. Default: all")
+parser.add_argument("-b", "--scaffold_black_list", action="store", dest="scaffold_black_list", default=[],
+                    type=lambda s: IdList(filename=s) if os.path.exists(s) else s.split(","),
+                    help="Comma-separated list or file with scaffolds to skip. Default: not set")
 
+parser.add_argument("--streaming", action="store_true", dest="streaming", default=False,
+                    help="Read vcf file by chunks without parsing whole file into memory. Default: False")
+parser.add_argument("--chunk_size", action="store", dest="chunk_size", default=1000000, type=int,
+                    help="Number of records per chunk in streaming mode. Default: 1000000")
 parser.add_argument("-p", "--parsing_mode", action="store", dest="parsing_mode", default="parse",
                     help="Parsing mode for input sequence file. "
                          "Possible variants: 'index_db', 'index', 'parse'(default)")
 
 args = parser.parse_args()
 
-variants = CollectionVCF(in_file=args.input, parsing_mode='genotypes')
-
 if args.reference:
-    reference_length_df = CollectionSequence(in_file=args.reference, format="fasta", parsing_mode="parse", get_stats=True).seq_lengths
+    reference_length_df = get_scaffold_length_df(args.reference, sort_by_length=True)
 else:
     reference_length_df = None
 
-StatsVCF.count_variants_in_windows(variants, args.window_size, args.window_step,
-                                   reference_scaffold_lengths=reference_length_df,
-                                   ignore_scaffolds_shorter_than_window=True, output_prefix=args.output_prefix,
-                                   skip_empty_windows=False, expression=None, per_sample_output=args.per_sample)
+if args.streaming:
+    StatsVCF.count_variants_in_windows_from_file(args.input, args.window_size, args.window_step,
+                                                 reference_scaffold_lengths=reference_length_df,
+                                                 output_prefix=args.output_prefix,
+                                                 per_sample_output=args.per_sample,
+                                                 chunk_size=args.chunk_size,
+                                                 scaffold_black_list=args.scaffold_black_list,
+                                                 scaffold_white_list=args.scaffold_white_list)
+else:
+    variants = CollectionVCF(in_file=args.input, parsing_mode='genotypes')
+
+    StatsVCF.count_variants_in_windows(variants, args.window_size, args.window_step,
+                                       reference_scaffold_lengths=reference_length_df,
+                                       ignore_scaffolds_shorter_than_window=True, output_prefix=args.output_prefix,
+                                       skip_empty_windows=False, expression=None, per_sample_output=args.per_sample,
+                                       scaffold_black_list=args.scaffold_black_list,
+                                       scaffold_white_list=args.scaffold_white_list)
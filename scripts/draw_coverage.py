@@ -2,13 +2,13 @@
 __author__ = 'Sergei F. Kliver'
 import os
 import argparse
-from functools import partial
 from copy import deepcopy
 
 import pandas as pd
 import matplotlib.pyplot as plt
 from RouToolPa.Collections.General import SynDict, IdList
 from MACE.Routines import Visualization, StatsVCF
+from MACE.Functions.Sequence import get_scaffold_length_df
 
 
 def rgb_tuple_to_hex(rgb_tuple):
@@ -80,7 +80,8 @@ parser.add_argument("-z", "--scaffold_ordered_list", action="store", dest="scaff
                          "Scaffolds absent in this list are drawn last and in order according to vcf file . "
                          "Default: not set")
 parser.add_argument("-n", "--scaffold_length_file", action="store", dest="scaffold_length_file", required=True,
-                    help="File with lengths of scaffolds")
+                    help="File with lengths of scaffolds (.len or .fai) or fasta file with reference. "
+                         "Lengths of fasta file are counted once and cached next to it")
 parser.add_argument("--scaffold_syn_file", action="store", dest="scaffold_syn_file",
                     help="File with scaffold id synonyms")
 parser.add_argument("--syn_file_key_column", action="store", dest="syn_file_key_column",
@@ -105,6 +106,9 @@ parser.add_argument("--split_coverage_thresholds", action="store_true", dest="sp
                          "Doesn't work if --coverage_thresholds is set")
 parser.add_argument("--test_colormaps", action="store_true", dest="test_colormaps",
                     help="Test colormaps. If set --colormap option will be ignored")
+parser.add_argument("--threads", action="store", dest="threads", default=1, type=int,
+                    help="Number of processes to use for drawing with different colormaps. "
+                         "Works only if --test_colormaps is set. Default: 1")
 
 parser.add_argument("--hide_track_label", action="store_true", dest="hide_track_label", default=False,
                     help="Hide track label. Default: False")
@@ -190,9 +194,7 @@ scaffold_to_keep = StatsVCF.get_filtered_entry_list(coverage_df.index.get_level_
                                                     entry_white_list=args.scaffold_white_list)
 
 coverage_df = coverage_df[coverage_df.index.isin(scaffold_to_keep, level=0)]
-chr_len_df = pd.read_csv(args.scaffold_length_file, sep='\t', header=None, names=("scaffold", "length"), index_col=0,
-                         converters={args.scaffold_column_name: str,})
-chr_len_df.index = pd.Index(list(map(str, chr_len_df.index)))
+chr_len_df = get_scaffold_length_df(args.scaffold_length_file)
 
 if args.scaffold_syn_file:
     coverage_df.rename(index=chr_syn_dict, inplace=True)
@@ -214,9 +216,6 @@ args.coverage_thresholds = (0.0, 0.125, 0.25, 0.375, 0.5, 0.625, 0.75,
                             1.75, 1.875, 2.0, 2.125, 2.25) if args.split_coverage_thresholds else args.coverage_thresholds
 
 track_df_dict = {}
-cmap = plt.get_cmap(args.colormap, len(args.coverage_thresholds))
-colors = [rgb_tuple_to_hex(cmap(i)[:3]) for i in range(0, len(args.coverage_thresholds))]
-
 
 for mean_coverage, track_label in zip(args.mean_coverage_list, args.coverage_column_name_list):
     feature_df, track_df = StatsVCF.convert_variant_count_to_feature_df(coverage_df,
@@ -224,54 +223,49 @@ for mean_coverage, track_label in zip(args.mean_coverage_list, args.coverage_col
                                                                         args.window_step,
                                                                         value_column=track_label)
     track_df[track_label] /= mean_coverage
-    color_expression = partial(Visualization.color_threshold_expression,
-                               thresholds=args.coverage_thresholds,
-                               colors=colors,
-                               background="white")
-
-    track_with_colors_df = Visualization.add_color_to_track_df(track_df,
-                                                               color_expression,
-                                                               value_column_index=-1 # TODO fix it, add support for multiple tracks in the file
-                                                               )
-    #print(track_with_colors_df)
-    track_df_dict[track_label] = track_with_colors_df
+    track_df_dict[track_label] = track_df
 #print(track_df_dict)
-Visualization.draw_features(track_df_dict,
-                            chr_len_df,
-                            args.scaffold_ordered_list,
-                            args.output_prefix,
-                            legend=Visualization.coverage_legend(colormap=args.colormap, thresholds=args.coverage_thresholds), #Visualization.density_legend(colors, args.coverage_thresholds),
-                            # query_species_color_df_dict,
-                            centromere_df=centromere_df,
-                            highlight_df=args.highlight_file,
-                            figure_width=args.figure_width,
-                            figure_height_per_scaffold=args.figure_height_per_scaffold,
-                            dpi=300,
-                            default_color="red",
-                            title=args.title,
-                            extensions=args.output_formats,
-                            feature_start_column_id="start",
-                            feature_end_column_id="end",
-                            feature_color_column_id="color",
-                            feature_length_column_id="length",
-                            subplots_adjust_left=args.subplots_adjust_left,
-                            subplots_adjust_bottom=args.subplots_adjust_bottom,
-                            subplots_adjust_right=args.subplots_adjust_right,
-                            subplots_adjust_top=args.subplots_adjust_top,
-                            show_track_label=not args.hide_track_label,
-                            show_trackgroup_label=True,
-                            close_figure=True,
-                            subplot_scale=False,
-                            track_group_scale=False,
-                            track_group_distance=2,
-                            xmax_multiplier=1.3, ymax_multiplier=1.00,
-                            stranded_tracks=args.stranded,
-                            rounded_tracks=args.rounded,
-                            stranded_end_tracks=args.stranded_end,
-                            xtick_fontsize=args.x_tick_fontsize,
-                            subplot_title_fontsize=args.title_fontsize,
-                            subplot_title_fontweight='bold'
-                            )
+Visualization.draw_features_with_colormaps(track_df_dict,
+                                           chr_len_df,
+                                           args.scaffold_ordered_list,
+                                           args.output_prefix,
+                                           args.coverage_thresholds,
+                                           Visualization.colormap_list if args.test_colormaps else [args.colormap],
+                                           legend_type="coverage",
+                                           background="white",
+                                           add_colormap_to_prefix=args.test_colormaps,
+                                           threads=args.threads,
+                                           # query_species_color_df_dict,
+                                           centromere_df=centromere_df,
+                                           highlight_df=args.highlight_file,
+                                           figure_width=args.figure_width,
+                                           figure_height_per_scaffold=args.figure_height_per_scaffold,
+                                           dpi=300,
+                                           default_color="red",
+                                           title=args.title,
+                                           extensions=args.output_formats,
+                                           feature_start_column_id="start",
+                                           feature_end_column_id="end",
+                                           feature_color_column_id="color",
+                                           feature_length_column_id="length",
+                                           subplots_adjust_left=args.subplots_adjust_left,
+                                           subplots_adjust_bottom=args.subplots_adjust_bottom,
+                                           subplots_adjust_right=args.subplots_adjust_right,
+                                           subplots_adjust_top=args.subplots_adjust_top,
+                                           show_track_label=not args.hide_track_label,
+                                           show_trackgroup_label=True,
+                                           close_figure=True,
+                                           subplot_scale=False,
+                                           track_group_scale=False,
+                                           track_group_distance=2,
+                                           xmax_multiplier=1.3, ymax_multiplier=1.00,
+                                           stranded_tracks=args.stranded,
+                                           rounded_tracks=args.rounded,
+                                           stranded_end_tracks=args.stranded_end,
+                                           xtick_fontsize=args.x_tick_fontsize,
+                                           subplot_title_fontsize=args.title_fontsize,
+                                           subplot_title_fontweight='bold'
+                                           )
 """    
 Visualization.draw_coverage_windows(coverage_df, args.window_size, args.window_step, chr_len_df,
                                     average_coverage_dict,
@@ -282,6 +276,7 @@ Visualization.draw_coverage_windows(coverage_df, args.window_size, args.window_s
                                     extensions=args.output_formats,
                                     scaffold_order_list=args.scaffold_ordered_list,
                                     test_colormaps=args.test_colormaps,
+                                    threads=args.threads,
                                     thresholds=(0.0, 0.125, 0.25, 0.375, 0.5, 0.625, 0.75,
                                                 0.875, 1.0, 1.125, 1.25, 1.375, 1.5, 1.625,
                                                 1.75, 1.875, 2.0, 2.125, 2.25) if args.split_coverage_thresholds else args.coverage_thresholds,
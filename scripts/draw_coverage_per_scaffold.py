@@ -11,6 +11,7 @@ from BCBio import GFF
 from RouToolPa.Collections.General import SynDict, IdList
 from RouToolPa.Parsers.VCF import CollectionVCF
 from MACE.Routines import Visualization, StatsVCF
+from MACE.Functions.Sequence import get_scaffold_length_df
 
 parser = argparse.ArgumentParser()
 
@@ -65,7 +66,8 @@ parser.add_argument("-z", "--scaffold_ordered_list", action="store", dest="scaff
                          "Scaffolds absent in this list are drawn last and in order according to vcf file . "
                          "Default: not set")
 parser.add_argument("-n", "--scaffold_length_file", action="store", dest="scaffold_length_file", required=True,
-                    help="File with lengths of scaffolds")
+                    help="File with lengths of scaffolds (.len or .fai) or fasta file with reference. "
+                         "Lengths of fasta file are counted once and cached next to it")
 parser.add_argument("--scaffold_syn_file", action="store", dest="scaffold_syn_file",
                     help="File with scaffold id synonyms")
 parser.add_argument("--syn_file_key_column", action="store", dest="syn_file_key_column",
@@ -101,6 +103,8 @@ parser.add_argument("--figure_width", action="store", dest="figure_width", type=
 parser.add_argument("--figure_height_per_scaffold", action="store", dest="figure_height_per_scaffold",
                     type=float, default=0.5,
                     help="Height of figure per chromosome track. Default: 0.5")
+parser.add_argument("-t", "--threads", action="store", dest="threads", type=int, default=1,
+                    help="Number of processes used to draw figures of scaffolds. Default: 1")
 
 args = parser.parse_args()
 
@@ -111,14 +115,13 @@ chr_syn_dict = SynDict(filename=args.scaffold_syn_file,
                        key_index=args.syn_file_key_column,
                        value_index=args.syn_file_value_column)
 
-chr_len_df = pd.read_csv(args.scaffold_length_file, sep='\t', header=None, names=("scaffold", "length"), index_col=0)
+chr_len_df = get_scaffold_length_df(args.scaffold_length_file)
 
 if args.scaffold_syn_file:
     chr_len_df.rename(index=chr_syn_dict, inplace=True)
 
 coverage_df_dict = OrderedDict()
 
-final_scaffold_set = set()
 for entry, label in zip(args.input, args.label_list):
     coverage_df = pd.read_csv(entry, sep="\t", usecols=[args.scaffold_column_name,
                                                              args.window_column_name] + args.coverage_column_name_list,
@@ -133,46 +136,22 @@ for entry, label in zip(args.input, args.label_list):
         coverage_df.rename(index=chr_syn_dict, inplace=True)
 
     coverage_df_dict[label] = coverage_df
-    #print("AAA")
-    #print(coverage_df_dict[label].index.get_level_values(0).unique().to_list())
-    final_scaffold_set |= set(coverage_df_dict[label].index.get_level_values(0).unique().to_list())
-
-#print(final_scaffold_set)
-#print(chr_syn_dict)
-for scaf in final_scaffold_set:
-    scaf_df_list = []
-    #len_df = pd.DataFrame(columns=["length"])
-    len_dict = OrderedDict()
-    for label in args.label_list:
-        scaf_df_list.append(coverage_df_dict[label].loc[[scaf]])
-        #print(scaf_df_list[-1])
-        #print(label)
-        scaf_df_list[-1].rename(index={scaf: label}, inplace=True)
-        len_dict[label] = chr_len_df.loc[scaf]
-    len_df = pd.DataFrame.from_dict(len_dict, orient="index")
-    #print(len_df)
-    #merged_coverage_df_dict[scaf] = pd.concat(scaf_df_list)
-    #print(scaf)
-    Visualization.draw_coverage_windows(pd.concat(scaf_df_list),
-                                        args.window_size, args.window_step, len_df,
-                                        mean_coverage_df,
-                                        "{0}.{1}".format(args.output_prefix, scaf),
-                                        figure_width=args.figure_width,
-                                        figure_height_per_scaffold=args.figure_height_per_scaffold, dpi=300,
-                                        colormap=args.colormap, title="Coverage {0}".format(scaf),
-                                        extensions=args.output_formats,
-                                        scaffold_order_list=args.scaffold_ordered_list,
-                                        test_colormaps=args.test_colormaps,
-                                        thresholds=args.coverage_thresholds,
-                                        absolute_coverage_values=args.absolute_coverage_values,
-                                        subplots_adjust_left=args.subplots_adjust_left,
-                                        subplots_adjust_bottom=args.subplots_adjust_bottom,
-                                        subplots_adjust_right=args.subplots_adjust_right,
-                                        subplots_adjust_top=args.subplots_adjust_top,
-                                        show_track_label=True,
-                                        show_trackgroup_label=True,
-                                        close_figure=True
-                                        )
-
-
 
+Visualization.draw_coverage_windows_per_scaffold(coverage_df_dict, args.window_size, args.window_step, chr_len_df,
+                                                 mean_coverage_df, args.output_prefix,
+                                                 title_template="Coverage {0}",
+                                                 threads=args.threads,
+                                                 figure_width=args.figure_width,
+                                                 figure_height_per_scaffold=args.figure_height_per_scaffold, dpi=300,
+                                                 colormap=args.colormap,
+                                                 extensions=args.output_formats,
+                                                 scaffold_order_list=args.scaffold_ordered_list,
+                                                 test_colormaps=args.test_colormaps,
+                                                 thresholds=args.coverage_thresholds,
+                                                 absolute_coverage_values=args.absolute_coverage_values,
+                                                 subplots_adjust_left=args.subplots_adjust_left,
+                                                 subplots_adjust_bottom=args.subplots_adjust_bottom,
+                                                 subplots_adjust_right=args.subplots_adjust_right,
+                                                 subplots_adjust_top=args.subplots_adjust_top,
+                                                 show_track_label=True,
+                                                 show_trackgroup_label=True)
@@ -3,7 +3,6 @@ __author__ = 'Sergei F. Kliver'
 import os
 
 import argparse
-import glob
 from functools import partial
 from pathlib import Path
 from collections import OrderedDict
@@ -20,8 +19,8 @@ from matplotlib.patches import Rectangle
 from matplotlib.lines import Line2D
 
 from MACE.Visualization.Polygons import LinearChromosome
-from MACE.Visualization.Connectors import CubicBezierConnector
-from RouToolPa.Parsers.PSL import CollectionPSL
+from MACE.Visualization.Connectors import CubicBezierConnectorCollection
+from MACE.Routines import Synteny, SyntenyLoader
 
 
 def split_comma_separated_list(string):
@@ -36,22 +35,6 @@ def rgb_tuple_to_hex(rgb_tuple):
     return color_code
 
 
-def get_filenames_for_extension(dir_path, extension_list, force_uniq=True):
-    filelist = []
-    for extension in extension_list:
-        filelist += list(glob.glob(str(dir_path) + "/*{0}".format(extension)))
-    if not filelist:
-        return None
-    print(filelist)
-    if force_uniq:
-        if len(filelist) > 1:
-            raise ValueError("Found more than one file with extensions: {0} in directory {1}".format(",".join(extension_list, str(dir_path))))
-        else:
-            return filelist[0]
-
-    return filelist
-
-
 def invert_coordinates_in_synteny_table(df, scaffold_list, length_df, scaffold_column, start_column, end_column, strand_column, inverted_scaffolds_label="'"):
     temp_df = deepcopy(df)
     columns_list = list(temp_df.columns)
@@ -118,6 +101,9 @@ parser.add_argument("-i", "--input_dir", action="store", dest="input_dir", requi
                          "Subfolders should have same name as genomes in --genome_orderlist"
                          "Each subfolder should contain: *.whitelist, *.len and synteny file "
                          "(except for the last genome). *.orderlist, *.invertlist and *.syn file are optional")
+parser.add_argument("--cache_dir", action="store", dest="cache_dir", default=None,
+                    help="Directory to store parsed input files in binary format. "
+                         "Cache is reused on later runs if input files were not changed. Default: not set, i.e. no cache")
 parser.add_argument("--genome_orderlist", action="store", dest="genome_orderlist", required=True,
                     type=split_comma_separated_list,
                     help="Comma-separated list of genomes to be used in figure.")
@@ -266,110 +252,24 @@ for genome in genome_orderlist:
     print(data_dir_path / genome)
     #print(get_filenames_for_extension(data_dir_path / genome, extension_list=["whitelist"]))
 
-whitelist_series_dict = {}
-orderlist_series_dict = {}
-invertlist_series_dict = {}
-lenlist_df_dict = {}
-syn_df_dict = {}
-color_df_dict = {}
-queryswithstrandlist_series_dict = {}
-targetswithstrandlist_series_dict = {}
-centromere_df_dict = {}
+genome_table_dict = {genome: SyntenyLoader.read_genome_dir(data_dir_path / genome,
+                                                           syn_file_key_column=syn_file_key_column,
+                                                           syn_file_value_column=syn_file_value_column,
+                                                           cache_dir=args.cache_dir) for genome in genome_orderlist}
+
+whitelist_series_dict = {genome: genome_table_dict[genome]["whitelist"] for genome in genome_orderlist}
+orderlist_series_dict = {genome: genome_table_dict[genome]["orderlist"] for genome in genome_orderlist}
+invertlist_series_dict = {genome: genome_table_dict[genome]["invertlist"] for genome in genome_orderlist}
+lenlist_df_dict = {genome: genome_table_dict[genome]["len"] for genome in genome_orderlist}
+syn_df_dict = {genome: genome_table_dict[genome]["syn"] for genome in genome_orderlist}
+color_df_dict = {genome: genome_table_dict[genome]["colors"] for genome in genome_orderlist}
+queryswithstrandlist_series_dict = {genome: genome_table_dict[genome]["queryswitchstrandlist"] for genome in genome_orderlist}
+targetswithstrandlist_series_dict = {genome: genome_table_dict[genome]["targetswitchstrandlist"] for genome in genome_orderlist}
+centromere_df_dict = {genome: genome_table_dict[genome]["centromere"] for genome in genome_orderlist}
+
 for genome in genome_orderlist:
-    # nonempty whitelist file is necessary for each genome
-    try:
-        whitelist_series_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["whitelist"]),
-                                                    sep="\t", header=None, comment="#").squeeze("columns")
-    except pd.errors.EmptyDataError:
-        raise pd.errors.EmptyDataError(f"ERROR!!! Whitelist for {genome} is empty. Add relevant scaffold ids to it!")
-    except ValueError:
-        raise ValueError(f"Whitelist for {genome} is absent!")
-    # nonempty lenlist file is necessary for each genome
-    try:
-        lenlist_df_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["len"]),
-                                             sep="\t", header=None, comment="#", names=["scaffold", "length"], index_col=0)
-    except pd.errors.EmptyDataError:
-        raise pd.errors.EmptyDataError(f"ERROR!!! lenlist for {genome} is empty. add scaffold ids and its lengths to it!")
-    except ValueError:
-        raise ValueError(f"Lenlist for {genome} is absent!")
-    # orderlist might be empty or absent
-    if get_filenames_for_extension(data_dir_path / genome, extension_list=["orderlist"]) is None:
-        orderlist_series_dict[genome] = pd.Series(dtype=str)
-    else:
-        try:
-            orderlist_series_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["orderlist"]),
-                                                        sep="\t", header=None, comment="#").squeeze("columns")
-        except pd.errors.EmptyDataError:
-            orderlist_series_dict[genome] = pd.Series(dtype=str)
-
-    # invertlist might be empty or absent
-    if get_filenames_for_extension(data_dir_path / genome, extension_list=["invertlist"]) is None:
-        invertlist_series_dict[genome] = pd.Series(dtype=str)
-    else:
-        try:
-            invertlist_series_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["invertlist"]),
-                                                         sep="\t", header=None, comment="#").squeeze("columns")
-        except pd.errors.EmptyDataError:
-            invertlist_series_dict[genome] = pd.Series(dtype=str)
-
-    # queryswitchstrandlist might be empty or absent
-    if get_filenames_for_extension(data_dir_path / genome, extension_list=["queryswitchstrandlist"]) is None:
-        queryswithstrandlist_series_dict[genome] = pd.Series(dtype=str)
-    else:
-        try:
-            queryswithstrandlist_series_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["queryswitchstrandlist"]),
-                                                                   sep="\t", header=None, comment="#").squeeze("columns")
-        except pd.errors.EmptyDataError:
-            queryswithstrandlist_series_dict[genome] = pd.Series(dtype=str)
-
-    # targetswitchstrandlist might be empty or absent
-    if get_filenames_for_extension(data_dir_path / genome, extension_list=["targetswitchstrandlist"]) is None:
-        targetswithstrandlist_series_dict[genome] = pd.Series(dtype=str)
-    else:
-        try:
-            targetswithstrandlist_series_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["targetswitchstrandlist"]),
-                                                                    sep="\t", header=None, comment="#").squeeze("columns")
-        except pd.errors.EmptyDataError:
-            targetswithstrandlist_series_dict[genome] = pd.Series(dtype=str)
-
-    # syn file might be empty or absent
-    if get_filenames_for_extension(data_dir_path / genome, extension_list=["syn"]) is None:
-        syn_df_dict[genome] = pd.DataFrame(columns=["syn"])
-    else:
-        try:
-            syn_df_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["syn"]), usecols=(syn_file_key_column, syn_file_value_column),
-                                              sep="\t", header=None, comment="#",
-                                              names=["key", "syn"] if syn_file_key_column <= syn_file_value_column else ["syn", "key"]).set_index("key")
-        except pd.errors.EmptyDataError:
-            syn_df_dict[genome] = pd.DataFrame(columns=["syn"])
-
-    # centromere.bed might be empty or absent
-    if get_filenames_for_extension(data_dir_path / genome, extension_list=["centromere.bed"]) is None:
-        centromere_df_dict[genome] = pd.DataFrame(columns=["scaffold_id", "start", "end"])
-        centromere_df_dict[genome].set_index("scaffold_id", inplace=True)
-    else:
-        try:
-            centromere_df_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["centromere.bed"]),
-                                                     usecols=(0, 1, 2),
-                                                     index_col=0,
-                                                     header=None,
-                                                     sep="\t", names=["scaffold_id", "start", "end"])
-        except pd.errors.EmptyDataError:
-            centromere_df_dict[genome] = pd.DataFrame(columns=["scaffold_id", "start", "end"])
-            centromere_df_dict[genome].set_index("scaffold_id", inplace=True)
     centromere_df_dict[genome].rename(index=syn_df_dict[genome]["syn"].to_dict(), inplace=True)
 
-    # color file might be empty or absent
-    if get_filenames_for_extension(data_dir_path / genome, extension_list=["colors"]) is None:
-        color_df_dict[genome] = pd.DataFrame(columns=["color"])
-    else:
-        try:
-            color_df_dict[genome] = pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["colors"]),
-                                                sep="\t", header=0, names=["scaffold", "color"], index_col=0)
-        except pd.errors.EmptyDataError:
-            color_df_dict[genome] = pd.DataFrame(columns=["scaffold_id", "color"])
-            color_df_dict[genome].set_index("scaffold_id", inplace=True)
-
 # ---------------------------- Read genome config if it was set --------------------------------------
 if args.genome_config:
     genome_config_tmp_dict = OrderedDict()
@@ -467,22 +367,20 @@ if synteny_format == "psl":
     synteny_dict = {}
     for genome_index in range(0, len(genome_orderlist)-1):
         print("\n")
-        print("Filename: {0}".format(get_filenames_for_extension(data_dir_path / genome_orderlist[genome_index],
+        print("Filename: {0}".format(SyntenyLoader.get_filenames_for_extension(data_dir_path / genome_orderlist[genome_index],
                                                                                                   extension_list=["psl", "psl.gz"])))
         print("Query: {0}".format(genome_orderlist[genome_index]))
         print("Target: {0}".format(genome_orderlist[genome_index + 1]))
-        synteny_dict[genome_orderlist[genome_index]] = CollectionPSL(get_filenames_for_extension(data_dir_path / genome_orderlist[genome_index],
-                                                                                                  extension_list=["psl", "psl.gz"]),
-                                                                     target_white_list=whitelist_series_dict[genome_orderlist[genome_index + 1]],
-                                                                     query_white_list=whitelist_series_dict[genome_orderlist[genome_index]],
-                                                                     #target_syn_dict=syn_df_dict[genome_orderlist[genome_index + 1]]["syn"].to_dict(),
-                                                                     #query_syn_dict=syn_df_dict[genome_orderlist[genome_index]]["syn"].to_dict(),
-                                                                     parsing_mode="coordinates_only").records.sort_values(by=[query_scaffold_id_column_name,
-                                                                                                                              query_start_column_name,
-                                                                                                                              query_end_column_name,
-                                                                                                                              target_scaffold_id_column_name,
-                                                                                                                              target_start_column_name,
-                                                                                                                              target_end_column_name])
+        synteny_dict[genome_orderlist[genome_index]] = SyntenyLoader.read_psl(SyntenyLoader.get_filenames_for_extension(data_dir_path / genome_orderlist[genome_index],
+                                                                                                                      extension_list=["psl", "psl.gz"]),
+                                                                              target_white_list=whitelist_series_dict[genome_orderlist[genome_index + 1]],
+                                                                              query_white_list=whitelist_series_dict[genome_orderlist[genome_index]],
+                                                                              cache_dir=args.cache_dir).sort_values(by=[query_scaffold_id_column_name,
+                                                                                                                        query_start_column_name,
+                                                                                                                        query_end_column_name,
+                                                                                                                        target_scaffold_id_column_name,
+                                                                                                                        target_start_column_name,
+                                                                                                                        target_end_column_name])
 else:
     raise ValueError("ERROR!!! {0} format is not implemented yet!".format("psl"))
 
@@ -501,98 +399,6 @@ genome_number = len(genome_orderlist)
 ##----------------------- Detect nested blocks ----------------------------------------
 
 
-def detect_nested_blocks(df,
-                         nested_in_block_column_name,
-                         #query_same_cooords_in_block_column_name,
-                         query_nested_in_block_column_name,
-                         query_scaffold_id_column_name,
-                         query_start_column_name, query_end_column_name,
-                         #target_same_cooords_in_block_column_name,
-                         target_nested_in_block_column_name,
-                         target_scaffold_id_column_name,
-                         target_start_column_name, target_end_column_name):
-    sorted_df = df.sort_values(by=[query_scaffold_id_column_name, query_start_column_name, query_end_column_name])
-    for column_name in query_nested_in_block_column_name, target_nested_in_block_column_name: #, query_same_cooords_in_block_column_name, target_same_cooords_in_block_column_name:
-        sorted_df[column_name] = pd.NA
-    #sorted_df[query_nested_in_block_column_name] = pd.NA
-    #sorted_df[target_nested_in_block_column_name] = pd.NA
-
-    for row_index in range(0, len(sorted_df)):
-        block_start = sorted_df.iloc[row_index][query_start_column_name]
-        block_end = sorted_df.iloc[row_index][query_end_column_name]
-        #check_df = sorted_df.iloc[:row_index]
-        #print(sorted_df.iloc[row_index])
-        #print(check_df)
-        nested_in_block_set = set(sorted_df.iloc[:row_index][sorted_df.iloc[:row_index][query_end_column_name] >= block_end]['synteny_block_id'])
-        nested_in_block_set |= set(sorted_df.iloc[row_index+1:][(sorted_df.iloc[row_index+1:][query_start_column_name] == block_start) & (sorted_df.iloc[row_index+1:][query_end_column_name] >= block_end)]['synteny_block_id'])
-
-        #print(nested_in_block_set)
-        if nested_in_block_set:
-            sorted_df[query_nested_in_block_column_name].iloc[row_index] = ",".join(nested_in_block_set)
-
-        #same_coords_set = set(sorted_df[(sorted_df[query_start_column_name] == block_start) & (sorted_df[query_end_column_name] == block_end)]['synteny_block_id'])
-        #same_coords_set.remove(sorted_df.iloc[row_index]['synteny_block_id'])
-
-        #if same_coords_set:
-        #    sorted_df[query_same_cooords_in_block_column_name].iloc[row_index] = ",".join(same_coords_set)
-
-    sorted_df = sorted_df.sort_values(by=[target_scaffold_id_column_name, target_start_column_name, target_end_column_name])
-    for row_index in range(0, len(sorted_df)):
-        block_start = sorted_df.iloc[row_index][target_start_column_name]
-        block_end = sorted_df.iloc[row_index][target_end_column_name]
-        #check_df = sorted_df.iloc[:row_index]
-        nested_in_block_set = set(sorted_df.iloc[:row_index][sorted_df.iloc[:row_index][target_end_column_name] >= block_end]['synteny_block_id'])
-        nested_in_block_set |= set(sorted_df.iloc[row_index+1:][(sorted_df.iloc[row_index+1:][target_start_column_name] == block_start) & (sorted_df.iloc[row_index+1:][target_end_column_name] >= block_end)]['synteny_block_id'])
-
-        if nested_in_block_set:
-            sorted_df[target_nested_in_block_column_name].iloc[row_index] = ",".join(nested_in_block_set)
-
-        #same_coords_set = set(sorted_df[(sorted_df[target_start_column_name] == block_start) & (sorted_df[target_end_column_name] == block_end)]['synteny_block_id'])
-        #same_coords_set.remove(sorted_df.iloc[row_index]['synteny_block_id'])
-        #if same_coords_set:
-        #    sorted_df[target_same_cooords_in_block_column_name].iloc[row_index] = ",".join(same_coords_set)
-
-    def get_nested(row):
-        if row.hasnans:
-            return pd.NA
-        else:
-            return ",".join(set(row.iloc[0].split(",")) & set(row.iloc[1].split(",")))
-    sorted_df[nested_in_block_column_name] = sorted_df[[query_nested_in_block_column_name, target_nested_in_block_column_name]].apply(get_nested, axis=1)
-    #print(sorted_df)
-    return sorted_df
-
-
-def detect_same_coords_blocks(df,
-                              query_same_coords_in_block_column_name,
-                              query_scaffold_id_column_name,
-                              query_start_column_name, query_end_column_name,
-                              target_same_coords_in_block_column_name,
-                              target_scaffold_id_column_name,
-                              target_start_column_name, target_end_column_name):
-    output_df = deepcopy(df)
-    for column_name in query_same_coords_in_block_column_name, target_same_coords_in_block_column_name:
-        output_df[column_name] = pd.NA
-    #print(output_df)
-    for row_index in range(0, len(output_df)):
-        query_same_coords_set = set(output_df[(output_df[query_scaffold_id_column_name] == output_df.iloc[row_index][query_scaffold_id_column_name]) & \
-                                              (output_df[query_start_column_name] == output_df.iloc[row_index][query_start_column_name]) & \
-                                              (output_df[query_end_column_name] == output_df.iloc[row_index][query_end_column_name])]['synteny_block_id'])
-        query_same_coords_set.remove(output_df.iloc[row_index]['synteny_block_id'])
-
-        if query_same_coords_set:
-            output_df[query_same_coords_in_block_column_name].iloc[row_index] = ",".join(query_same_coords_set)
-            
-        target_same_coords_set = set(output_df[(output_df[target_scaffold_id_column_name] == output_df.iloc[row_index][target_scaffold_id_column_name]) & \
-                                              (output_df[target_start_column_name] == output_df.iloc[row_index][target_start_column_name]) & \
-                                              (output_df[target_end_column_name] == output_df.iloc[row_index][target_end_column_name])]['synteny_block_id'])
-        target_same_coords_set.remove(output_df.iloc[row_index]['synteny_block_id'])
-
-        if target_same_coords_set:
-            output_df[target_same_coords_in_block_column_name].iloc[row_index] = ",".join(target_same_coords_set)
-
-    return output_df
-
-
 def detect_overlapping_blocks(df,
                               query_overlapping_block_column_name,
                               query_overlapping_fraction_column_name,
@@ -624,35 +430,31 @@ def detect_overlapping_blocks(df,
     return output_df
 
 
-detect_nested_blocks_preset = partial(detect_nested_blocks,
-                                      nested_in_block_column_name="nested_in",
-                                      query_nested_in_block_column_name="query_nested_in",
-                                      #query_same_cooords_in_block_column_name="query_same_coords",
-                                      query_scaffold_id_column_name=query_scaffold_id_column_name,
-                                      query_start_column_name=query_start_column_name,
-                                      query_end_column_name=query_end_column_name,
-                                      target_nested_in_block_column_name="target_nested_in",
-                                      #target_same_cooords_in_block_column_name="target_same_coords",
-                                      target_scaffold_id_column_name=target_scaffold_id_column_name,
-                                      target_start_column_name=target_start_column_name,
-                                      target_end_column_name=target_end_column_name)
-
 tmp_dict = {}
 block_remove_dict = {}
 for genome_index in range(0, genome_number - 1):
     genome = genome_orderlist[genome_index]
     block_remove_dict[genome] = []
-    tmp_dict[genome] = detect_same_coords_blocks(synteny_dict[genome],
-                                                 query_same_coords_in_block_column_name="query_same_coords",
-                                                 query_scaffold_id_column_name=query_scaffold_id_column_name,
-                                                 query_start_column_name=query_start_column_name,
-                                                 query_end_column_name=query_end_column_name,
-                                                 target_same_coords_in_block_column_name="target_same_coords",
-                                                 target_scaffold_id_column_name=target_scaffold_id_column_name,
-                                                 target_start_column_name=target_start_column_name,
-                                                 target_end_column_name=target_end_column_name)
-    tmp_dict[genome] = tmp_dict[genome].groupby(by=[query_scaffold_id_column_name, target_scaffold_id_column_name],
-                                                sort=False, group_keys=False).apply(detect_nested_blocks_preset)
+    tmp_dict[genome] = Synteny.detect_same_coords_blocks(synteny_dict[genome],
+                                                         query_same_coords_in_block_column_name="query_same_coords",
+                                                         query_scaffold_id_column_name=query_scaffold_id_column_name,
+                                                         query_start_column_name=query_start_column_name,
+                                                         query_end_column_name=query_end_column_name,
+                                                         target_same_coords_in_block_column_name="target_same_coords",
+                                                         target_scaffold_id_column_name=target_scaffold_id_column_name,
+                                                         target_start_column_name=target_start_column_name,
+                                                         target_end_column_name=target_end_column_name)
+    # nested blocks are detected separately for each pair of query and target scaffolds
+    tmp_dict[genome] = Synteny.detect_nested_blocks(tmp_dict[genome],
+                                                    nested_in_block_column_name="nested_in",
+                                                    query_nested_in_block_column_name="query_nested_in",
+                                                    query_scaffold_id_column_name=query_scaffold_id_column_name,
+                                                    query_start_column_name=query_start_column_name,
+                                                    query_end_column_name=query_end_column_name,
+                                                    target_nested_in_block_column_name="target_nested_in",
+                                                    target_scaffold_id_column_name=target_scaffold_id_column_name,
+                                                    target_start_column_name=target_start_column_name,
+                                                    target_end_column_name=target_end_column_name)
 
     #tmp_dict[genome].sort_values(by=[query_scaffold_id_column_name,
     #                                 query_start_column_name,
@@ -1082,35 +884,48 @@ for species, index, color, species_label in zip(genome_orderlist, range(0, len(g
                 zorder=zorder_dict["label"])
 
 
-def connector_function(row, length_df_dict, top_species, bottom_species, default_color="lightgrey", connector_color_idx=8,
-                      top_scaffold_idx=3, top_start_idx=4, top_end_idx=5, bottom_scaffold_idx=0, bottom_start_idx=1, bottom_end_idx=2, strand_idx=6):
-    con_len = (connector_color_idx + 1) if connector_color_idx is not None else None
+def create_connector_collection(df, length_df_dict, top_species, bottom_species, zorder, default_color="lightgrey",
+                                connector_color_column="connector_color",
+                                top_scaffold_column=target_scaffold_id_column_name,
+                                top_start_column=target_start_column_name, top_end_column=target_end_column_name,
+                                bottom_scaffold_column=query_scaffold_id_column_name,
+                                bottom_start_column=query_start_column_name, bottom_end_column=query_end_column_name,
+                                strand_column=strand_column_name):
     y_chr_shift = height / 2
-    #print("AAAAAAAAA")
-    #print(top_species)
-    #print(length_df_dict[top_species])
-    #print("BBBBBBBBB")
-    #print(bottom_species)
-    #print(length_df_dict[bottom_species])
-    return CubicBezierConnector(
-                                 (row.iloc[top_start_idx] + length_df_dict[top_species].loc[row.iloc[top_scaffold_idx], "x_offset"], length_df_dict[top_species].loc[row.iloc[top_scaffold_idx], "y_offset"] + y_chr_shift),
-                                 (row.iloc[top_end_idx] + length_df_dict[top_species].loc[row.iloc[top_scaffold_idx], "x_offset"], length_df_dict[top_species].loc[row.iloc[top_scaffold_idx], "y_offset"] + y_chr_shift),
-
-                                ((row.iloc[bottom_start_idx] if row.iloc[strand_idx] == "+" else row.iloc[bottom_end_idx]) + length_df_dict[bottom_species].loc[row.iloc[bottom_scaffold_idx], "x_offset"],
-                                 length_df_dict[bottom_species].loc[row.iloc[bottom_scaffold_idx], "y_offset"] + y_chr_shift),
-
-                                ((row.iloc[bottom_end_idx] if row.iloc[strand_idx] == "+" else row.iloc[bottom_start_idx]) + length_df_dict[bottom_species].loc[row.iloc[bottom_scaffold_idx], "x_offset"],
-                                 length_df_dict[bottom_species].loc[row.iloc[bottom_scaffold_idx], "y_offset"] + y_chr_shift),
-
-                                 x_fraction_parameter=2,
-                                 y_fraction_parameter=2,
-                                 y_shift=distance,
-                                 edgecolor=default_color if (con_len is None) or (len(row) < con_len) else row.iloc[connector_color_idx] if row.iloc[connector_color_idx] != "default" else default_color,
-                                 facecolor=default_color if (con_len is None) or (len(row) < con_len) else row.iloc[connector_color_idx] if row.iloc[connector_color_idx] != "default" else default_color,
-                                 alpha=0.5 if (con_len is None) or (len(row) < con_len) else 1.0 if row.iloc[connector_color_idx] != "default" else 0.5,
-                                 fill= True,
-                                 zorder=zorder_dict["connector"]
-                                 )
+    # offsets of all blocks are obtained by a single join with length table for each species
+    top_offset_df = length_df_dict[top_species][["x_offset", "y_offset"]].reindex(df[top_scaffold_column])
+    bottom_offset_df = length_df_dict[bottom_species][["x_offset", "y_offset"]].reindex(df[bottom_scaffold_column])
+
+    top_x_offset = top_offset_df["x_offset"].to_numpy()
+    top_y = top_offset_df["y_offset"].to_numpy() + y_chr_shift
+    bottom_x_offset = bottom_offset_df["x_offset"].to_numpy()
+    bottom_y = bottom_offset_df["y_offset"].to_numpy() + y_chr_shift
+
+    plus_strand = (df[strand_column] == "+").to_numpy()
+    bottom_start = np.where(plus_strand, df[bottom_start_column].to_numpy(), df[bottom_end_column].to_numpy())
+    bottom_end = np.where(plus_strand, df[bottom_end_column].to_numpy(), df[bottom_start_column].to_numpy())
+
+    if (connector_color_column is not None) and (connector_color_column in df.columns):
+        default_connectors = (df[connector_color_column] == "default").to_numpy()
+        colors = np.where(default_connectors, default_color, df[connector_color_column].to_numpy())
+        alpha = np.where(default_connectors, 0.5, 1.0)
+    else:
+        colors = default_color
+        alpha = 0.5
+
+    return CubicBezierConnectorCollection(np.column_stack([df[top_start_column].to_numpy() + top_x_offset, top_y]),
+                                          np.column_stack([df[top_end_column].to_numpy() + top_x_offset, top_y]),
+                                          np.column_stack([bottom_start + bottom_x_offset, bottom_y]),
+                                          np.column_stack([bottom_end + bottom_x_offset, bottom_y]),
+                                          x_fraction_parameter=2,
+                                          y_fraction_parameter=2,
+                                          y_shift=distance,
+                                          edgecolors=colors,
+                                          facecolors=colors,
+                                          alpha=alpha,
+                                          fill=True,
+                                          antialiased=False,
+                                          zorder=zorder)
 
 
 connector_collection_dict = {}
@@ -1120,39 +935,18 @@ for genome, genome_index in zip(genome_orderlist[:-1], range(0, len(genome_order
         synteny_dict[genome]["connector_zorder"] += zorder_dict["connector"]
         connector_collection_dict[genome] = {}
         for zorder in sorted(synteny_dict[genome]["connector_zorder"].unique()):
-            #print(lenlist_df_dict[genome])
-            connector_collection_dict[genome][zorder] = PatchCollection(synteny_dict[genome][synteny_dict[genome]["connector_zorder"] == zorder].apply(partial(connector_function,
-                                                                                                                                                                       length_df_dict=lenlist_df_dict,
-                                                                                                                                                                       top_species=genome_orderlist[genome_index+1],
-                                                                                                                                                                       connector_color_idx=connector_color_idx,
-                                                                                                                                                                       bottom_species=genome,
-                                                                                                                                                                       top_scaffold_idx=target_scaffold_idx,
-                                                                                                                                                                       top_start_idx=target_start_idx,
-                                                                                                                                                                       top_end_idx=target_end_idx,
-                                                                                                                                                                       bottom_scaffold_idx=query_scaffold_idx,
-                                                                                                                                                                       bottom_start_idx=query_start_idx,
-                                                                                                                                                                       bottom_end_idx=query_end_idx,
-                                                                                                                                                                       strand_idx=strand_idx), axis=1),
-                                                                            match_original=True,
-                                                                            antialiased=False,
-                                                                            zorder=zorder)
+            connector_collection_dict[genome][zorder] = create_connector_collection(synteny_dict[genome][synteny_dict[genome]["connector_zorder"] == zorder],
+                                                                                    length_df_dict=lenlist_df_dict,
+                                                                                    top_species=genome_orderlist[genome_index+1],
+                                                                                    bottom_species=genome,
+                                                                                    zorder=zorder)
             ax.add_collection(connector_collection_dict[genome][zorder])
     else:
-        connector_collection_dict[genome] = PatchCollection(synteny_dict[genome].apply(partial(connector_function,
-                                                                                                       length_df_dict=lenlist_df_dict,
-                                                                                                       top_species=genome_orderlist[genome_index+1],
-                                                                                                       connector_color_idx=connector_color_idx,
-                                                                                                       bottom_species=genome,
-                                                                                                       top_scaffold_idx=target_scaffold_idx,
-                                                                                                       top_start_idx=target_start_idx,
-                                                                                                       top_end_idx=target_end_idx,
-                                                                                                       bottom_scaffold_idx=query_scaffold_idx,
-                                                                                                       bottom_start_idx=query_start_idx,
-                                                                                                       bottom_end_idx=query_end_idx,
-                                                                                                       strand_idx=strand_idx), axis=1),
-                                                            match_original=True,
-                                                            antialiased=False,
-                                                            zorder=zorder_dict["connector"])
+        connector_collection_dict[genome] = create_connector_collection(synteny_dict[genome],
+                                                                        length_df_dict=lenlist_df_dict,
+                                                                        top_species=genome_orderlist[genome_index+1],
+                                                                        bottom_species=genome,
+                                                                        zorder=zorder_dict["connector"])
         ax.add_collection(connector_collection_dict[genome])
 
 plt.subplots_adjust(left=args.subplots_adjust_left, right=args.subplots_adjust_right, bottom=args.subplots_adjust_bottom,
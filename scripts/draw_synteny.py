@@ -1,25 +1,24 @@
 #!/usr/bin/env python
 __author__ = 'Sergei F. Kliver'
 import os
-import glob
 import argparse
 from copy import deepcopy
 from pathlib import Path
-from collections import OrderedDict
+from collections import OrderedDict, deque
 
 import pandas as pd
 import numpy as np
 
 from distinctipy import distinctipy
 from functools import partial
+from multiprocessing import Pool
 
 import xlsxwriter as xlsx
 from xlsxwriter.utility import xl_rowcol_to_cell
 
 from RouToolPa.Collections.General import SynDict, IdList
-from MACE.Routines import Visualization, StatsVCF
+from MACE.Routines import Visualization, StatsVCF, Synteny, SyntenyLoader
 
-from RouToolPa.Parsers.PSL import CollectionPSL
 from RouToolPa.Parsers.BED import CollectionBED
 
 
@@ -50,72 +49,6 @@ def rgb_tuple_to_hex(rgb_tuple):
     return color_code
 
 
-def dist_to_next_seg_from_same_chr(df):
-    temp = deepcopy(df)
-    temp["dist_upstream"] = df["start"].astype("Int64") - df["end"].astype("Int64").shift(1)
-    temp["dist_downstream"] = df["start"].astype("Int64").shift(-1) - df["end"].astype("Int64")
-
-    temp["dist_end_start"] = df["start"].astype("Int64") - df["end"].astype("Int64").shift(1)
-    temp["dist_end_end"] = df["end"].astype("Int64") - df["end"].astype("Int64").shift(1)
-    temp["embedded"] = temp["dist_end_end"] <= 0
-    return temp
-
-
-def filter_isolated_short_blocks(bed_df, min_block_len=1000000, max_dist_between_short_blocks=3000000):
-    tmp_df = bed_df.reset_index(drop=False).set_index(["scaffold", "query"]).sort_values(by=["scaffold",
-                                                                                             "start",
-                                                                                             "end",
-                                                                                             "query",
-                                                                                             "query_start",
-                                                                                             "query_end"], axis=0)
-    tmp_df["target_len"] = tmp_df["end"] - tmp_df["start"]
-    tmp_df["query_len"] = tmp_df["query_end"] - tmp_df["query_start"]
-    #print(tmp_df.groupby(["scaffold",
-    #                         "query"], sort=False, group_keys=False).apply(dist_to_next_seg_from_same_chr))
-    tmp_df = tmp_df.groupby(["scaffold",
-                             "query"], sort=False, group_keys=False).apply(dist_to_next_seg_from_same_chr).sort_values(by=["scaffold",
-                                                                                                         "start",
-                                                                                                         "end",
-                                                                                                         "query",
-                                                                                                         "query_start",
-                                                                                                         "query_end"],
-                                                                                                     axis=0)  # .reset_index(level=(0,1), drop=True)
-    tmp_df["embedded"].fillna(False, inplace=True)
-    # recalculate distances after removal of embedded blocks
-    tmp_df = tmp_df[tmp_df["embedded"] <= 0]
-    tmp_df = tmp_df.groupby(["scaffold",
-                             "query"], sort=False, group_keys=False).apply(dist_to_next_seg_from_same_chr).sort_values(by=["scaffold",
-                                                                                                         "start",
-                                                                                                         "end",
-                                                                                                         "query",
-                                                                                                         "query_start",
-                                                                                                         "query_end"],
-                                                                                                     axis=0)
-    tmp_df = tmp_df[~((tmp_df["target_len"] < min_block_len) & (((tmp_df["dist_upstream"] > max_dist_between_short_blocks) | tmp_df["dist_upstream"].isna()) & (
-            (tmp_df["dist_downstream"] > max_dist_between_short_blocks) | (tmp_df["dist_downstream"].isna()))))]
-
-    return tmp_df
-
-
-def merge_adjacent_blocks(df, max_dist_between_blocks=1000000):
-    temp = deepcopy(df[["start", "end", "color"]]).reset_index(drop=False)
-    row_list = [list(row) for row in temp.iloc[0:1, :].itertuples(index=False)]
-
-    for row in temp.iloc[1:, :].itertuples(index=False):
-        if (row[0] == row_list[-1][0]) and (row[1] == row_list[-1][1]):
-            if (row[2] - row_list[-1][3]) < max_dist_between_blocks:
-                row_list[-1][3] = max(row[3], row_list[-1][3])
-            else:
-                row_list.append(list(row))
-        else:
-            row_list.append(list(row))
-    # print(row_list)
-    df = pd.DataFrame.from_records(row_list, columns=["scaffold", "query", "start", "end", "color"],
-                                   index=["scaffold", "query"]) # index=["scaffold", "query"]
-    df["target_len"] = df["end"] - df["start"]
-    return df
-
-
 def bed_dict_to_xlsx(bed_dict, output_prefix):
     # ---- Color configuration for xlsx file----
     # -------- Color codes ----
@@ -148,38 +81,39 @@ def bed_dict_to_xlsx(bed_dict, output_prefix):
     column_start = 0
 
     for species in bed_dict:  # bed_col_dict:
+        # lengths are added to the copy, input tables are not modified
+        records = bed_dict[species].records if hasattr(bed_dict[species], "records") else bed_dict[species]
+        records = records.assign(target_len=records["end"] - records["start"])
+        if ("query_end" in records.columns) and ("query_start" in records.columns):
+            records = records.assign(query_len=records["query_end"] - records["query_start"])
 
-        bed_dict[species].records["target_len"] = bed_dict[species].records["end"] - bed_dict[species].records["start"]
-        if ("query_end" in bed_dict[species].records.columns) and ("query_start" in bed_dict[species].records.columns):
-            bed_dict[species].records["query_len"] = bed_dict[species].records["query_end"] - bed_dict[species].records["query_start"]
-
-        bed_dict[species].records.to_excel(writer, sheet_name=species, freeze_panes=(1, 1))
-        column_number = len(bed_dict[species].records.columns) + len(bed_dict[species].records.index.names)
-        row_number = len(bed_dict[species].records)
+        records.to_excel(writer, sheet_name=species, freeze_panes=(1, 1))
+        column_number = len(records.columns) + len(records.index.names)
+        row_number = len(records)
 
         # ----- color query and scaffold_columns -----
         scaffold_column = 0
-        if "query" in bed_dict[species].records.columns:
-            query_column = list(bed_dict[species].records.columns).index("query") + len(bed_dict[species].records.index.names)
+        if "query" in records.columns:
+            query_column = list(records.columns).index("query") + len(records.index.names)
         else:
-            query_column = bed_dict[species].records.index.names.index("query")
-        if "color" in bed_dict[species].records.columns:
-            color_column = list(bed_dict[species].records.columns).index("color") + len(bed_dict[species].records.index.names)
+            query_column = records.index.names.index("query")
+        if "color" in records.columns:
+            color_column = list(records.columns).index("color") + len(records.index.names)
 
-        query_data = list(bed_dict[species].records["query"] if "query" in bed_dict[species].records.columns else bed_dict[species].records.index.get_level_values("query"))
+        query_data = list(records["query"] if "query" in records.columns else records.index.get_level_values("query"))
         #print(query_data)
         for row in range(1, row_number + 1):
             writer.sheets[species].write(row, query_column, query_data[row - 1],
                                          # color query column
                                          species_format_dict[species][query_data[row - 1]])
-            if "color" in bed_dict[species].records.columns:
-                writer.sheets[species].write(row, color_column, bed_dict[species].records["color"].iloc[row - 1],
+            if "color" in records.columns:
+                writer.sheets[species].write(row, color_column, records["color"].iloc[row - 1],
                                             # color color column
                                             species_format_dict[species][query_data[row - 1]])
 
-        writer.sheets[species].set_column(column_start, len(bed_dict[species].records.columns) + len(bed_dict[species].records.index.names) - 1, 15)  #
+        writer.sheets[species].set_column(column_start, len(records.columns) + len(records.index.names) - 1, 15)  #
 
-        first_len_col = column_number - (2 if "query_len" in bed_dict[species].records.columns else 1)
+        first_len_col = column_number - (2 if "query_len" in records.columns else 1)
         writer.sheets[species].conditional_format(1, first_len_col,
                                                   row_number, column_number - 1,
                                                   {'type': 'cell',
@@ -205,23 +139,6 @@ def bed_dict_to_xlsx(bed_dict, output_prefix):
     writer.close()
 
 
-def get_filenames_for_extension(dir_path, extension_list, force_uniq=True):
-    filelist = []
-    for extension in extension_list:
-        filelist += list(glob.glob(str(dir_path) + "/*{0}".format(extension)))
-        #print(extension, filelist)
-    if not filelist:
-        return None
-    print(filelist)
-    if force_uniq:
-        if len(filelist) > 1:
-            raise ValueError("Found more than one file with extensions: {0} in directory {1}".format(",".join(extension_list, str(dir_path))))
-        else:
-            return filelist[0]
-
-    return filelist
-
-
 def invert_coordinates_in_synteny_table(df, scaffold_list, length_df, scaffold_column, start_column, end_column, strand_column, inverted_scaffolds_label="'"):
     temp_df = deepcopy(df)
     temp_df["length_column"] = 0
@@ -255,6 +172,9 @@ parser.add_argument("-i", "--input_dir", action="store", dest="input_dir", requi
                          "Subfolders should have same name as genomes in --genome_orderlist"
                          "Each subfolder should contain: *.whitelist, *.len and synteny file "
                          "(except for the last genome). *.orderlist, *.invertlist and *.syn file are optional")
+parser.add_argument("--cache_dir", action="store", dest="cache_dir", default=None,
+                    help="Directory to store parsed input files in binary format. "
+                         "Cache is reused on later runs if input files were not changed. Default: not set, i.e. no cache")
 parser.add_argument("--synteny_format", action="store", dest="synteny_format", default="psl",
                     help="Format of the synteny file. Allowed: psl(default), bed, bed_with_color")
 parser.add_argument("--query_orderlist", action="store", dest="query_orderlist", required=True,
@@ -324,6 +244,8 @@ parser.add_argument("-e", "--output_formats", action="store", dest="output_forma
 
 parser.add_argument("-l", "--title", action="store", dest="title", default="Synteny",
                     help="Suptitle of figure. Default: 'Synteny'")
+parser.add_argument("--threads", action="store", dest="threads", default=1, type=int,
+                    help="Number of processes used to draw combinations of filtering parameters. Default: 1")
 parser.add_argument("--title_fontsize", action="store", dest="title_fontsize", default=20, type=int,
                     help="Fontsize of the figure. Default: 20")
 
@@ -397,30 +319,27 @@ for genome in genome_list:
 #print(get_filenames_for_extension(data_dir_path / genome, extension_list=["whitelist"]))
 
 
-whitelist_series_dict = {genome: pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["whitelist"]),
-                                             sep="\t", header=None, comment="#").squeeze("columns") for genome in genome_list}
+genome_table_dict = {genome: SyntenyLoader.read_genome_dir(data_dir_path / genome,
+                                                           syn_file_key_column=syn_file_key_column,
+                                                           syn_file_value_column=syn_file_value_column,
+                                                           cache_dir=args.cache_dir) for genome in genome_list}
+
+# whitelist is obligatory
+whitelist_series_dict = {genome: genome_table_dict[genome]["whitelist"] for genome in genome_list}
 if args.reference_scaffold_white_list is not None:
     whitelist_series_dict[reference] = args.reference_scaffold_white_list
 
 # orderlist might be absent in folders
-orderlist_series_dict = {genome: pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["orderlist"]),
-                                             sep="\t", header=None, comment="#").squeeze("columns") if get_filenames_for_extension(data_dir_path / genome, extension_list=["orderlist"]) is not None else pd.Series(dtype=str) for genome in genome_list}
+orderlist_series_dict = {genome: genome_table_dict[genome]["orderlist"] for genome in genome_list}
 if args.reference_scaffold_order_list is not None:
     orderlist_series_dict[reference] = args.reference_scaffold_order_list
 orderlist_series_dict[reference] = orderlist_series_dict[reference][::-1] if not args.invert_genome_order else orderlist_series_dict[reference]
 # invertlist might be absent in folders
-invertlist_series_dict = {genome: pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["invertlist"]),
-                                             sep="\t", header=None, comment="#").squeeze("columns") if get_filenames_for_extension(data_dir_path / genome, extension_list=["invertlist"]) is not None else pd.Series(dtype=str) for genome in genome_list}
+invertlist_series_dict = {genome: genome_table_dict[genome]["invertlist"] for genome in genome_list}
 # lenlist is obligatory
-lenlist_df_dict = {genome: pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["len"]),
-                                             sep="\t", header=None, comment="#", names=["scaffold", "length"], index_col=0) for genome in genome_list}
+lenlist_df_dict = {genome: genome_table_dict[genome]["len"] for genome in genome_list}
 # synfile might be absent
-syn_df_dict = {genome: pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["syn"]), usecols=(syn_file_key_column, syn_file_value_column),
-                                             sep="\t", header=None, comment="#",
-                                   names=["key", "syn"] if syn_file_key_column <= syn_file_value_column else ["syn", "key"]).set_index("key") if get_filenames_for_extension(data_dir_path / genome, extension_list=["syn"]) is not None else pd.DataFrame(columns=["syn"]) for genome in genome_list}
-
-color_df_dict = {genome: pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["color"]),
-                                             sep="\t", header=0, names=["scaffold", "color"], index_col=0) if get_filenames_for_extension(data_dir_path / genome, extension_list=["color"]) is not None else pd.Series(dtype=str) for genome in genome_list}
+syn_df_dict = {genome: genome_table_dict[genome]["syn"] for genome in genome_list}
 
 
 for genome in genome_list:
@@ -440,14 +359,10 @@ species_chr_syn_dict[reference] = pd.read_csv(expand_path(args.reference_scaffol
                                               sep="\t", index_col=args.syn_file_key_column).squeeze("columns") if args.reference_scaffold_syn_file else None
 """
 
-if get_filenames_for_extension(data_dir_path / reference, extension_list=["centromere.bed"]) is None:
+if genome_table_dict[reference]["centromere"].empty:
     centromere_df = None
 else:
-    centromere_df = pd.read_csv(get_filenames_for_extension(data_dir_path / reference, extension_list=["centromere.bed"]),
-                                usecols=(0, 1, 2),
-                                index_col=0,
-                                header=None,
-                                sep="\t", names=["scaffold_id", "start", "end"])
+    centromere_df = genome_table_dict[reference]["centromere"]
     centromere_df.rename(index=syn_df_dict[reference]["syn"].to_dict(), inplace=True)
 
 """
@@ -499,8 +414,7 @@ if not args.use_original_colors:
         color_df_dict[species].to_csv("{}.{}.chr_colors.tsv".format(args.output_prefix, species), sep="\t", header=True, index=True)
 
 else:
-    color_df_dict = {genome: pd.read_csv(get_filenames_for_extension(data_dir_path / genome, extension_list=["colors"]),
-                                             sep="\t", header=0, names=["scaffold", "color"], index_col=0) for genome in query_list}
+    color_df_dict = {genome: genome_table_dict[genome]["colors"] for genome in query_list}
     #for species, color_file in zip(query_list, args.query_color_filelist):
     #    #print(pd.read_csv(expand_path(color_file, skip=not args.expand_paths), sep="\t", index_col=0, header=0))
     #    print(species)
@@ -517,27 +431,19 @@ else:
 bed_col_dict = OrderedDict()
 
 if args.synteny_format == "psl":
-    for query in query_list:
-        print(get_filenames_for_extension(data_dir_path / query, extension_list=["psl", "psl.gz"]),)
-    psl_col_dict = {query: CollectionPSL(in_file=get_filenames_for_extension(data_dir_path / query,
-                                                                             extension_list=["psl", "psl.gz"]),
-                                         parsing_mode="coordinates_only",
-                                         #target_syn_dict=syn_df_dict[reference].to_dict(),
-                                         target_black_list=None,
-                                         target_white_list=whitelist_series_dict[reference],
-                                         #query_syn_dict=syn_df_dict[query].to_dict(),
-                                         query_black_list=None,
-                                         query_white_list=whitelist_series_dict[query],
-                                         invert_coordinates_for_target_negative_strand=args.invert_coordinates_for_target_negative_strand
-                                         ) for query in query_list}
-    for query in query_list:
-        #print(syn_df_dict[reference])
-        psl_col_dict[query].records["tName"].replace(syn_df_dict[reference]["syn"].to_dict(), inplace=True)
-        psl_col_dict[query].records["qName"].replace(syn_df_dict[query]["syn"].to_dict(), inplace=True)
+    psl_records_dict = {query: SyntenyLoader.read_psl(SyntenyLoader.get_filenames_for_extension(data_dir_path / query,
+                                                                                                extension_list=["psl", "psl.gz"]),
+                                                      target_white_list=whitelist_series_dict[reference],
+                                                      query_white_list=whitelist_series_dict[query],
+                                                      target_syn_dict=syn_df_dict[reference]["syn"].to_dict(),
+                                                      query_syn_dict=syn_df_dict[query]["syn"].to_dict(),
+                                                      cache_dir=args.cache_dir,
+                                                      invert_coordinates_for_target_negative_strand=args.invert_coordinates_for_target_negative_strand
+                                                      ) for query in query_list}
 
     for species in query_list:
         bed_col_dict[species] = CollectionBED(
-            records=psl_col_dict[species].records[["tName", "tStart", "tEnd", "qName", "qStart", "qEnd", "strand"]],
+            records=psl_records_dict[species][["tName", "tStart", "tEnd", "qName", "qStart", "qEnd", "strand"]],
             records_columns=["scaffold", "start", "end", "query", "query_start", "query_end", "strand"],
             format="bed_synteny_track",
             parsing_mode="all")
@@ -550,11 +456,12 @@ elif args.synteny_format in ["bed", "bed_with_color"]:
     bed_file_dict = {query: expand_path(bed, skip=not args.expand_paths) for query, bed in zip(query_list, args.input)}
 
     for species in query_list:
-        bed_col_dict[species] = CollectionBED(in_file=get_filenames_for_extension(data_dir_path / species,
-                                                                                  extension_list=["bed", "bed.gz"]), header_in_file=True,
-                                              format="bed_synteny_track", parsing_mode="all",
-                                              scaffold_syn_dict=syn_df_dict[reference] if syn_df_dict[reference] is not None else None,
-                                              rename_dict={"query": syn_df_dict[species]} if syn_df_dict[species] is not None else None)
+        bed_col_dict[species] = CollectionBED(records=SyntenyLoader.read_synteny_bed(SyntenyLoader.get_filenames_for_extension(data_dir_path / species,
+                                                                                                                               extension_list=["bed", "bed.gz"]),
+                                                                                   scaffold_syn_dict=syn_df_dict[reference] if syn_df_dict[reference] is not None else None,
+                                                                                   rename_dict={"query": syn_df_dict[species]} if syn_df_dict[species] is not None else None,
+                                                                                   cache_dir=args.cache_dir),
+                                              format="bed_synteny_track", parsing_mode="all")
 
         bed_col_dict[species].records.sort_values(by=["scaffold", "start", "end", ], inplace=True)
         if args.synteny_format != "bed_with_color":
@@ -598,37 +505,89 @@ print("Lengths of reference chromosomes:")
 print(lenlist_df_dict[reference])
 
 
-for min_block_length in args.initial_min_block_len_list:
-
-    prefiltered_bed_col_dict = {}
-    if min_block_length == 0:
-        prefiltered_bed_col_dict = bed_col_dict
-    else:
-        prefiltered_bed_col_dict = deepcopy(bed_col_dict)
-        for species in prefiltered_bed_col_dict:
-            prefiltered_bed_col_dict[species].records = prefiltered_bed_col_dict[species].records[(prefiltered_bed_col_dict[species].records["end"] - prefiltered_bed_col_dict[species].records["start"]) >= min_block_length]
-
-    for species in prefiltered_bed_col_dict:  # bed_col_dict:
-        # ---- save original blocks to bed ----
-        prefiltered_bed_col_dict[species].records.to_csv("{0}.{1}.to.{2}.initial_min_block_len_{3}.tsv".format(args.output_prefix,
-                                                                                                    species,
-                                                                                                    reference,
-                                                                                                    min_block_length),
-                                                      sep="\t",
-                                                      header=True, index=True)
+bed_df_dict = OrderedDict([(species, bed_col_dict[species].records) for species in bed_col_dict])
+
+
+def get_sweep_steps(bed_df_dict):
+    """
+    Generates filtered tables for all combinations of filtering parameters. Tables are views or masks of tables from
+    previous stage, and lengths and distances between blocks are calculated once per stage.
+    Yields tuples (output_suffix, dict with tables, stage-specific drawing parameters)
+    """
+    for min_block_length in args.initial_min_block_len_list:
+        prefiltered_bed_df_dict = OrderedDict()
+        for species in bed_df_dict:
+            prefiltered_bed_df_dict[species] = bed_df_dict[species] if min_block_length == 0 else \
+                bed_df_dict[species][(bed_df_dict[species]["end"] - bed_df_dict[species]["start"]) >= min_block_length]
+
+        yield "initial_min_block_len_{0}".format(min_block_length), prefiltered_bed_df_dict, \
+            {"feature_height_fraction": 0.7, "stranded_tracks": args.stranded, "stranded_end_tracks": args.stranded_end}
+
+        distance_df_dict = OrderedDict([(species, Synteny.get_adjacent_block_distances(prefiltered_bed_df_dict[species]))
+                                        for species in prefiltered_bed_df_dict])
+
+        for secondary_min_block_len in args.secondary_min_block_len_list:
+            for max_dist_between_short_blocks in args.max_dist_between_short_blocks_list:
+                filtered_bed_df_dict = OrderedDict([(species,
+                                                     Synteny.filter_isolated_short_blocks(distance_df_dict[species],
+                                                                                          min_block_len=secondary_min_block_len,
+                                                                                          max_dist_between_short_blocks=max_dist_between_short_blocks))
+                                                    for species in distance_df_dict])
+
+                second_stage_output_suffix = "initial_min_block_len_{0}.secondary_min_block_len_{1}.max_dist_between_short_blocks_{2}".format(min_block_length,
+                                                                                                                                              secondary_min_block_len,
+                                                                                                                                              max_dist_between_short_blocks)
+                yield second_stage_output_suffix, filtered_bed_df_dict, \
+                    {"stranded_tracks": args.stranded, "stranded_end_tracks": args.stranded_end}
+
+                gap_array_dict = {species: Synteny.get_gaps_to_previous_blocks(filtered_bed_df_dict[species])
+                                  for species in filtered_bed_df_dict}
+
+                for max_dist_between_blocks in args.max_dist_between_blocks_list:
+                    merged_bed_df_dict = OrderedDict([(species,
+                                                       Synteny.merge_adjacent_blocks(filtered_bed_df_dict[species],
+                                                                                     max_dist_between_blocks=max_dist_between_blocks,
+                                                                                     gap_array=gap_array_dict[species]))
+                                                      for species in filtered_bed_df_dict])
+                    third_stage_output_suffix = "max_dist_between_adjacent_blocks_{0}".format(max_dist_between_blocks)
+
+                    yield "{0}.{1}".format(second_stage_output_suffix, third_stage_output_suffix), merged_bed_df_dict, \
+                        {"stranded_tracks": False, "stranded_end_tracks": False}
+
+                    for final_min_block_len in args.final_min_block_len_list:
+                        final_bed_df_dict = OrderedDict([(species,
+                                                          merged_bed_df_dict[species][(merged_bed_df_dict[species]["end"] - merged_bed_df_dict[species]["start"]) > final_min_block_len])
+                                                         for species in merged_bed_df_dict])
+                        forth_stage_output_suffix = "final_min_block_len_{0}".format(final_min_block_len)
+
+                        yield "{0}.{1}.{2}".format(second_stage_output_suffix, third_stage_output_suffix,
+                                                   forth_stage_output_suffix), final_bed_df_dict, \
+                            {"stranded_tracks": False, "stranded_end_tracks": False}
+
+
+def draw_sweep_step(output_suffix, step_bed_df_dict, stage_draw_kwargs):
+    for species in step_bed_df_dict:
+        # ---- save blocks to tsv ----
+        step_bed_df_dict[species].to_csv("{0}.{1}.to.{2}.{3}.tsv".format(args.output_prefix,
+                                                                         species,
+                                                                         reference,
+                                                                         output_suffix),
+                                         sep="\t",
+                                         header=True, index=True)
         # -----
 
-    Visualization.draw_features(prefiltered_bed_col_dict,
-                                lenlist_df_dict[reference],#reference_scaffold_length_df,
+    Visualization.draw_features(step_bed_df_dict,
+                                lenlist_df_dict[reference],
                                 orderlist_series_dict[reference],
-                                "{0}.initial_min_block_len_{1}".format(args.output_prefix, min_block_length),
+                                "{0}.{1}".format(args.output_prefix, output_suffix),
                                 legend=None if args.hide_legend else Visualization.chromosome_legend(query_species_color_df_dict,
-                                                                       orderlist_series_dict[reference]),
+                                                                                                     orderlist_series_dict[reference]),
                                 centromere_df=centromere_df,
                                 highlight_df=args.reference_highlight_file,
-                                figure_width=args.figure_width, figure_height_per_scaffold=args.figure_height_per_scaffold,
+                                figure_width=args.figure_width,
+                                figure_height_per_scaffold=args.figure_height_per_scaffold,
                                 dpi=300,
-                                #colormap=None, thresholds=None, colors=None, background=None,
+                                # colormap=None, thresholds=None, colors=None, background=None,
                                 default_color="red",  # TODO: check if it is possible to remove it
                                 title=args.title,
                                 extensions=args.output_formats,
@@ -636,7 +595,6 @@ for min_block_length in args.initial_min_block_len_list:
                                 feature_end_column_id="end",
                                 feature_color_column_id="color",
                                 feature_length_column_id="length",
-                                feature_height_fraction=0.7,
                                 subplots_adjust_left=args.subplots_adjust_left,
                                 subplots_adjust_bottom=args.subplots_adjust_bottom,
                                 subplots_adjust_right=args.subplots_adjust_right,
@@ -649,206 +607,27 @@ for min_block_length in args.initial_min_block_len_list:
                                 track_group_distance=2,
                                 xmax_multiplier=1.3, ymax_multiplier=args.ymax_multiplier,
                                 figure_header_height=args.figure_header_height,
-                                stranded_tracks=args.stranded,
                                 rounded_tracks=args.rounded,
-                                stranded_end_tracks=args.stranded_end,
                                 xtick_fontsize=args.x_tick_fontsize,
                                 subplot_title_fontsize=args.title_fontsize,
-                                subplot_title_fontweight='bold'
+                                subplot_title_fontweight='bold',
+                                **stage_draw_kwargs
                                 )
-    bed_dict_to_xlsx(prefiltered_bed_col_dict, '{0}.initial_min_block_len_{1}'.format(args.output_prefix, min_block_length))
-
-    for secondary_min_block_len in args.secondary_min_block_len_list:
-        for max_dist_between_short_blocks in args.max_dist_between_short_blocks_list:
-            filtered_bed_col_dict = deepcopy(prefiltered_bed_col_dict)
-
-            for species in filtered_bed_col_dict:
-                filtered_bed_col_dict[species].records = filter_isolated_short_blocks(filtered_bed_col_dict[species].records,
-                                                                                      min_block_len=secondary_min_block_len,
-                                                                                      max_dist_between_short_blocks=max_dist_between_short_blocks)
-
-            second_stage_output_suffix = "initial_min_block_len_{0}.secondary_min_block_len_{1}.max_dist_between_short_blocks_{2}".format(min_block_length,
-                                                                                                                                          secondary_min_block_len,
-                                                                                                                                          max_dist_between_short_blocks)
-
-            for species in filtered_bed_col_dict:  # bed_col_dict:
-                # ---- save original blocks to bed ----
-                filtered_bed_col_dict[species].records.to_csv(
-                    "{0}.{1}.to.{2}.{3}.tsv".format(args.output_prefix,
-                                                    species,
-                                                    reference,
-                                                    second_stage_output_suffix),
-                    sep="\t",
-                    header=True, index=True)
-                # -----
-
-            Visualization.draw_features(filtered_bed_col_dict,
-                                        lenlist_df_dict[reference],
-                                        orderlist_series_dict[reference],
-                                        "{0}.{1}".format(args.output_prefix,second_stage_output_suffix),
-                                        legend=None if args.hide_legend else Visualization.chromosome_legend(query_species_color_df_dict,
-                                                                                                             orderlist_series_dict[reference]),
-                                        centromere_df=centromere_df,
-                                        highlight_df=args.reference_highlight_file,
-                                        figure_width=args.figure_width,
-                                        figure_height_per_scaffold=args.figure_height_per_scaffold,
-                                        dpi=300,
-                                        # colormap=None, thresholds=None, colors=None, background=None,
-                                        default_color="red",  # TODO: check if it is possible to remove it
-                                        title=args.title,
-                                        extensions=args.output_formats,
-                                        feature_start_column_id="start",
-                                        feature_end_column_id="end",
-                                        feature_color_column_id="color",
-                                        feature_length_column_id="length",
-                                        subplots_adjust_left=args.subplots_adjust_left,
-                                        subplots_adjust_bottom=args.subplots_adjust_bottom,
-                                        subplots_adjust_right=args.subplots_adjust_right,
-                                        subplots_adjust_top=args.subplots_adjust_top,
-                                        show_track_label=not args.hide_track_label,
-                                        show_trackgroup_label=True,
-                                        close_figure=True,
-                                        subplot_scale=False,
-                                        track_group_scale=False,
-                                        track_group_distance=2,
-                                        xmax_multiplier=1.3, ymax_multiplier=args.ymax_multiplier,
-                                        figure_header_height=args.figure_header_height,
-                                        stranded_tracks=args.stranded,
-                                        rounded_tracks=args.rounded,
-                                        stranded_end_tracks=args.stranded_end,
-                                        xtick_fontsize=args.x_tick_fontsize,
-                                        subplot_title_fontsize=args.title_fontsize,
-                                        subplot_title_fontweight='bold'
-                                        )
-            bed_dict_to_xlsx(filtered_bed_col_dict,
-                             "{0}.{1}".format(args.output_prefix,
-                                              second_stage_output_suffix))
-
-            for max_dist_between_blocks in args.max_dist_between_blocks_list:
-                for species in filtered_bed_col_dict:
-                    filtered_bed_col_dict[species].records = merge_adjacent_blocks(filtered_bed_col_dict[species].records,
-                                                                                   max_dist_between_blocks=max_dist_between_blocks)
-                    #filtered_bed_col_dict[species].records["color"] =
-                third_stage_output_suffix = "max_dist_between_adjacent_blocks_{0}".format(max_dist_between_blocks)
-
-                for species in filtered_bed_col_dict:  # bed_col_dict:
-                    # ---- save original blocks to bed ----
-                    filtered_bed_col_dict[species].records.to_csv("{0}.{1}.to.{2}.{3}.{4}.tsv".format(args.output_prefix,
-                                                                                                      species,
-                                                                                                      reference,
-                                                                                                      second_stage_output_suffix,
-                                                                                                      third_stage_output_suffix),
-                                                                  sep="\t",
-                                                                  header=True, index=True)
-                    # -----
-
-                Visualization.draw_features(filtered_bed_col_dict,
-                                            lenlist_df_dict[reference],
-                                            orderlist_series_dict[reference],
-                                            "{0}.{1}.{2}".format(args.output_prefix,
-                                                                 second_stage_output_suffix,
-                                                                 third_stage_output_suffix),
-                                            legend=None if args.hide_legend else Visualization.chromosome_legend(query_species_color_df_dict,
-                                                                                                                 orderlist_series_dict[reference]),
-                                            centromere_df=centromere_df,
-                                            highlight_df=args.reference_highlight_file,
-                                            figure_width=args.figure_width,
-                                            figure_height_per_scaffold=args.figure_height_per_scaffold,
-                                            dpi=300,
-                                            # colormap=None, thresholds=None, colors=None, background=None,
-                                            default_color="red",  # TODO: check if it is possible to remove it
-                                            title=args.title,
-                                            extensions=args.output_formats,
-                                            feature_start_column_id="start",
-                                            feature_end_column_id="end",
-                                            feature_color_column_id="color",
-                                            feature_length_column_id="length",
-                                            subplots_adjust_left=args.subplots_adjust_left,
-                                            subplots_adjust_bottom=args.subplots_adjust_bottom,
-                                            subplots_adjust_right=args.subplots_adjust_right,
-                                            subplots_adjust_top=args.subplots_adjust_top,
-                                            show_track_label=not args.hide_track_label,
-                                            show_trackgroup_label=True,
-                                            close_figure=True,
-                                            subplot_scale=False,
-                                            track_group_scale=False,
-                                            track_group_distance=2,
-                                            xmax_multiplier=1.3, ymax_multiplier=args.ymax_multiplier,
-                                            stranded_tracks=False,
-                                            rounded_tracks=args.rounded,
-                                            stranded_end_tracks=False,
-                                            xtick_fontsize=args.x_tick_fontsize,
-                                            subplot_title_fontsize=args.title_fontsize,
-                                            subplot_title_fontweight='bold',
-                                            figure_header_height=args.figure_header_height
-                                            )
-                bed_dict_to_xlsx(filtered_bed_col_dict,
-                                 "{0}.{1}.{2}".format(args.output_prefix,
-                                                      second_stage_output_suffix,
-                                                      third_stage_output_suffix))
-
-                for final_min_block_len in args.final_min_block_len_list:
-                    for species in filtered_bed_col_dict:
-                        filtered_bed_col_dict[species].records = filtered_bed_col_dict[species].records[filtered_bed_col_dict[species].records["end"] - filtered_bed_col_dict[species].records["start"] > final_min_block_len]
-
-                    forth_stage_output_suffix = "final_min_block_len_{0}".format(final_min_block_len)
-
-                    for species in filtered_bed_col_dict:  # bed_col_dict:
-                        # ---- save original blocks to bed ----
-                        filtered_bed_col_dict[species].records.to_csv(
-                            "{0}.{1}.to.{2}.{3}.{4}.{5}.tsv".format(args.output_prefix,
-                                                                    species,
-                                                                    reference,
-                                                                    second_stage_output_suffix,
-                                                                    third_stage_output_suffix,
-                                                                    forth_stage_output_suffix),
-                            sep="\t",
-                            header=True, index=True)
-                        # -----
-
-                    Visualization.draw_features(filtered_bed_col_dict,
-                                                lenlist_df_dict[reference],
-                                                orderlist_series_dict[reference],
-                                                "{0}.{1}.{2}.{3}".format(args.output_prefix,
-                                                                         second_stage_output_suffix,
-                                                                         third_stage_output_suffix,
-                                                                         forth_stage_output_suffix),
-                                                legend=None if args.hide_legend else Visualization.chromosome_legend(query_species_color_df_dict,
-                                                                                                                     orderlist_series_dict[reference]),
-                                                centromere_df=centromere_df,
-                                                highlight_df=args.reference_highlight_file,
-                                                figure_width=args.figure_width,
-                                                figure_height_per_scaffold=args.figure_height_per_scaffold,
-                                                dpi=300,
-                                                # colormap=None, thresholds=None, colors=None, background=None,
-                                                default_color="red",  # TODO: check if it is possible to remove it
-                                                title=args.title,
-                                                extensions=args.output_formats,
-                                                feature_start_column_id="start",
-                                                feature_end_column_id="end",
-                                                feature_color_column_id="color",
-                                                feature_length_column_id="length",
-                                                subplots_adjust_left=args.subplots_adjust_left,
-                                                subplots_adjust_bottom=args.subplots_adjust_bottom,
-                                                subplots_adjust_right=args.subplots_adjust_right,
-                                                subplots_adjust_top=args.subplots_adjust_top,
-                                                show_track_label=not args.hide_track_label,
-                                                show_trackgroup_label=True,
-                                                close_figure=True,
-                                                subplot_scale=False,
-                                                track_group_scale=False,
-                                                track_group_distance=2,
-                                                xmax_multiplier=1.3, ymax_multiplier=args.ymax_multiplier,
-                                                figure_header_height=args.figure_header_height,
-                                                stranded_tracks=False,
-                                                rounded_tracks=args.rounded,
-                                                stranded_end_tracks=False,
-                                                xtick_fontsize=args.x_tick_fontsize,
-                                                subplot_title_fontsize=args.title_fontsize,
-                                                subplot_title_fontweight='bold'
-                                                )
-                    bed_dict_to_xlsx(filtered_bed_col_dict,
-                                     "{0}.{1}.{2}.{3}".format(args.output_prefix,
-                                                              second_stage_output_suffix,
-                                                              third_stage_output_suffix,
-                                                              forth_stage_output_suffix))
+    bed_dict_to_xlsx(step_bed_df_dict, "{0}.{1}".format(args.output_prefix, output_suffix))
+
+
+if args.threads > 1:
+    # combinations of parameters are independent and are drawn in parallel.
+    # No more than threads steps are submitted at once, so the generator is advanced only when a step is finished,
+    # and filtered tables of only these steps are kept in memory
+    with Pool(args.threads) as pool:
+        job_queue = deque()
+        for sweep_step in get_sweep_steps(bed_df_dict):
+            if len(job_queue) == args.threads:
+                job_queue.popleft().get()
+            job_queue.append(pool.apply_async(draw_sweep_step, sweep_step))
+        for job in job_queue:
+            job.get()
+else:
+    for sweep_step in get_sweep_steps(bed_df_dict):
+        draw_sweep_step(*sweep_step)
@@ -16,7 +16,7 @@ import xlsxwriter as xlsx
 from xlsxwriter.utility import xl_rowcol_to_cell
 
 from RouToolPa.Collections.General import SynDict, IdList
-from MACE.Routines import Visualization, StatsVCF
+from MACE.Routines import Visualization, StatsVCF, SyntenyLoader
 
 from RouToolPa.Parsers.PSL import CollectionPSL
 from RouToolPa.Parsers.BED import CollectionBED
@@ -73,6 +73,10 @@ parser.add_argument("--syn_ext", action="store", dest="syn_ext", type=str, defau
 parser.add_argument("--color_ext", action="store", dest="color_ext", type=str, default=".color",
                     help="Extension of color files. Only files with this extension will be recognized. Default: .color")
 
+parser.add_argument("--cache_dir", action="store", dest="cache_dir", default=None,
+                    help="Directory to store parsed input files in binary format. "
+                         "Cache is reused on later runs if input files were not changed. Default: not set, i.e. no cache")
+
 parser.add_argument("--syn_file_key_column", action="store", dest="syn_file_key_column",
                     default=0, type=int,
                     help="Column(0-based) with key(current id) for scaffolds in synonym file. Default: 0")
@@ -227,37 +231,32 @@ if len(args.abbreviations) != len(args.labels):
 
 input_dict = {
               "labels": {abbr: label for abbr, label in zip(args.abbreviations, args.labels)},
-              "whitelist": {abbr: pd.read_csv("{0}/{1}{2}".format(args.whitelist_dir,
-                                                                  abbr,
-                                                                  args.whitelist_ext),
-                                              header=None).squeeze("columns") for abbr in args.abbreviations},
-              "orderlist": {abbr: pd.read_csv("{0}/{1}{2}".format(args.orderlist_dir,
-                                                                  abbr,
-                                                                  args.orderlist_ext),
-                                              header=None).squeeze("columns") for abbr in args.abbreviations},
-              "inverlist": {abbr: pd.read_csv("{0}/{1}{2}".format(args.invertlist_dir,
-                                                                  abbr,
-                                                                  args.invertlist_ext),
-                                              header=None).squeeze("columns") for abbr in args.abbreviations},
-              "len": {abbr: pd.read_csv("{0}/{1}{2}".format(args.len_dir,
-                                                                  abbr,
-                                                                  args.len_ext),
-                                        sep='\t',
-                                        header=None,
-                                        names=("scaffold", "length"),
-                                        index_col=0).squeeze("columns") for abbr in args.abbreviations},
-              "syn": {abbr: pd.read_csv("{0}/{1}{2}".format(args.syn_dir,
-                                                                  abbr,
-                                                                  args.syn_ext),
-                                        usecols=(args.syn_file_key_column, args.syn_file_value_column),
-                                        header=None,
-                                        sep="\t",
-                                        index_col=args.syn_file_key_column).squeeze("columns") for abbr in args.abbreviations},
-              "color": {abbr: pd.read_csv("{0}/{1}{2}".format(args.color_dir,
-                                                                  abbr,
-                                                                  args.color_ext),
-                                          sep='\t',
-                                          header=0, index_col=0) for abbr in args.abbreviations}
+              "whitelist": {abbr: SyntenyLoader.read_list("{0}/{1}{2}".format(args.whitelist_dir,
+                                                                             abbr,
+                                                                             args.whitelist_ext),
+                                                          cache_dir=args.cache_dir) for abbr in args.abbreviations},
+              "orderlist": {abbr: SyntenyLoader.read_list("{0}/{1}{2}".format(args.orderlist_dir,
+                                                                             abbr,
+                                                                             args.orderlist_ext),
+                                                          cache_dir=args.cache_dir) for abbr in args.abbreviations},
+              "inverlist": {abbr: SyntenyLoader.read_list("{0}/{1}{2}".format(args.invertlist_dir,
+                                                                             abbr,
+                                                                             args.invertlist_ext),
+                                                          cache_dir=args.cache_dir) for abbr in args.abbreviations},
+              "len": {abbr: SyntenyLoader.read_len("{0}/{1}{2}".format(args.len_dir,
+                                                                      abbr,
+                                                                      args.len_ext),
+                                                   cache_dir=args.cache_dir).squeeze("columns") for abbr in args.abbreviations},
+              "syn": {abbr: SyntenyLoader.read_syn("{0}/{1}{2}".format(args.syn_dir,
+                                                                      abbr,
+                                                                      args.syn_ext),
+                                                   key_column=args.syn_file_key_column,
+                                                   value_column=args.syn_file_value_column,
+                                                   cache_dir=args.cache_dir)["syn"] for abbr in args.abbreviations},
+              "color": {abbr: SyntenyLoader.read_colors("{0}/{1}{2}".format(args.color_dir,
+                                                                           abbr,
+                                                                           args.color_ext),
+                                                        cache_dir=args.cache_dir) for abbr in args.abbreviations}
               }
 
 for datatype in "orderlist", "invertlist", "len":
@@ -3,7 +3,6 @@ __author__ = 'Sergei F. Kliver'
 
 import os
 import argparse
-from functools import partial
 
 import pandas as pd
 
@@ -12,6 +11,8 @@ from copy import deepcopy
 from RouToolPa.Collections.General import SynDict, IdList
 from RouToolPa.Parsers.VCF import CollectionVCF
 from MACE.Routines import Visualization, StatsVCF
+from MACE.Functions.General import metaopen
+from MACE.Functions.Sequence import get_scaffold_length_df
 
 
 def read_series(s):
@@ -73,6 +74,10 @@ parser.add_argument("-x", "--max_coverage_threshold", action="store", dest="max_
 parser.add_argument("-q", "--min_coverage_threshold", action="store", dest="min_coverage_threshold", type=float, default=0.5,
                     help="Minimum coverage threshold to treat position as unmasked. Default: 0.5 * mean")
 
+parser.add_argument("--streaming", action="store_true", dest="streaming", default=False,
+                    help="Read vcf file by chunks without parsing whole file into memory. Default: False")
+parser.add_argument("--chunk_size", action="store", dest="chunk_size", default=1000000, type=int,
+                    help="Number of records per chunk in streaming mode. Default: 1000000")
 parser.add_argument("-w", "--window_size", action="store", dest="window_size", default=100000, type=int,
                     help="Size of the windows Default: 100000")
 parser.add_argument("-s", "--window_step", action="store", dest="window_step", default=None, type=int,
@@ -99,7 +104,8 @@ parser.add_argument("-z", "--scaffold_ordered_list", action="store", dest="scaff
                          "Scaffolds absent in this list are drawn last and in order according to vcf file . "
                          "Default: not set")
 parser.add_argument("-n", "--scaffold_length_file", action="store", dest="scaffold_length_file", default=[],
-                    help="File with lengths of scaffolds")
+                    help="File with lengths of scaffolds (.len or .fai) or fasta file with reference. "
+                         "Lengths of fasta file are counted once and cached next to it")
 parser.add_argument("--scaffold_syn_file", action="store", dest="scaffold_syn_file",
                     help="File with scaffold id synonyms")
 parser.add_argument("--syn_file_key_column", action="store", dest="syn_file_key_column",
@@ -135,6 +141,9 @@ parser.add_argument("--density_thresholds", action="store", dest="density_thresh
                          "(0.0, 0.1, 0.5, 0.75, 1.0, 1.25, 1.5, 2.0, 2.5)")
 parser.add_argument("--test_colormaps", action="store_true", dest="test_colormaps",
                     help="Test colormaps. If set --colormap option will be ignored")
+parser.add_argument("--threads", action="store", dest="threads", default=1, type=int,
+                    help="Number of processes to use for drawing with different colormaps. "
+                         "Works only if --test_colormaps is set. Default: 1")
 parser.add_argument("--hide_track_label", action="store_true", dest="hide_track_label", default=False,
                     help="Hide track label. Default: False")
 parser.add_argument("--subplots_adjust_left", action="store", dest="subplots_adjust_left", type=float,
@@ -178,9 +187,17 @@ else:
     if args.scaffold_ordered_list.empty:
         args.scaffold_ordered_list = args.scaffold_white_list
 
-variants = CollectionVCF(args.input, parsing_mode="only_coordinates")
+if args.input_type == "vcf" and args.streaming:
+    variants = None
+    if args.scaffold_length_file:
+        chr_len_df = get_scaffold_length_df(args.scaffold_length_file)
+    else:
+        with metaopen(args.input, "r") as vcf_fd:
+            chr_len_df = StatsVCF.read_vcf_header(vcf_fd)[1]
+else:
+    variants = CollectionVCF(args.input, parsing_mode="only_coordinates")
 
-chr_len_df = pd.read_csv(args.scaffold_length_file, sep='\t', header=None, index_col=0) if args.scaffold_length_file else deepcopy(variants.scaffold_length)
+    chr_len_df = get_scaffold_length_df(args.scaffold_length_file) if args.scaffold_length_file else deepcopy(variants.scaffold_length)
 chr_len_df.index = pd.Index(list(map(str, chr_len_df.index)))
 chr_len_df.index.name = "scaffold"
 chr_len_df.columns = ["length"]
@@ -201,13 +218,22 @@ else:
 #print(chr_syn_dict)
 
 if args.input_type == "vcf":
-    count_df = StatsVCF.count_variants_in_windows(variants, args.window_size, args.window_step,
-                                                  reference_scaffold_lengths=chr_len_df,
-                                                  ignore_scaffolds_shorter_than_window=True,
-                                                  output_prefix=args.output_prefix,
-                                                  skip_empty_windows=False, expression=None, per_sample_output=False,
-                                                  scaffold_white_list=args.scaffold_white_list,
-                                                  scaffold_syn_dict=chr_syn_dict)
+    if args.streaming:
+        count_df = StatsVCF.count_variants_in_windows_from_file(args.input, args.window_size, args.window_step,
+                                                                reference_scaffold_lengths=chr_len_df,
+                                                                output_prefix=args.output_prefix,
+                                                                per_sample_output=False,
+                                                                chunk_size=args.chunk_size,
+                                                                scaffold_white_list=args.scaffold_white_list,
+                                                                scaffold_syn_dict=chr_syn_dict)
+    else:
+        count_df = StatsVCF.count_variants_in_windows(variants, args.window_size, args.window_step,
+                                                      reference_scaffold_lengths=chr_len_df,
+                                                      ignore_scaffolds_shorter_than_window=True,
+                                                      output_prefix=args.output_prefix,
+                                                      skip_empty_windows=False, expression=None, per_sample_output=False,
+                                                      scaffold_white_list=args.scaffold_white_list,
+                                                      scaffold_syn_dict=chr_syn_dict)
     feature_df, track_df = StatsVCF.convert_variant_count_to_feature_df(count_df,
                                                                     args.window_size,
                                                                     args.window_step)
@@ -269,81 +295,67 @@ if args.coverage:
 """
 if not args.only_count:
 
-    for colormap in (Visualization.colormap_list if args.test_colormaps else [args.colormap]):
-        #title = (args.title + " (colormap {})".format(colormap)) if args.title else "Colormap {}".format(colormap)
-
-        cmap = plt.get_cmap(colormap, len(args.density_thresholds))
-        colors = [rgb_tuple_to_hex(cmap(i)[:3]) for i in range(0, len(args.density_thresholds))]
-
-        color_expression = partial(Visualization.color_threshold_expression,
-                                   thresholds=args.density_thresholds,
-                                   colors=colors,
-                                   background="white")
-
-        track_with_colors_df = Visualization.add_color_to_track_df(track_df,
-                                                                   color_expression,
-                                                                   value_column_index=-1 # TODO fix it, add support for multiple tracks in the file
-                                                                   )
-
-        track_with_colors_df.to_csv("{}.{}.track.bed".format(args.output_prefix,
-                                                               colormap), sep="\t", header=True, index=True)
-        #print(feature_with_colors_df)
-        #print(args.scaffold_ordered_list)
-        Visualization.draw_features({"TR": track_with_colors_df},
-                                    chr_len_df,
-                                    args.scaffold_ordered_list,
-                                    args.output_prefix,
-                                    legend=Visualization.density_legend(colors, args.density_thresholds,
-                                                                        feature_name=args.feature_name),
-                                    # query_species_color_df_dict,
-                                    centromere_df=centromere_df,
-                                    highlight_df=args.highlight_file,
-                                    figure_width=args.figure_width,
-                                    figure_height_per_scaffold=args.figure_height_per_scaffold,
-                                    figure_header_height=args.figure_header_height,
-                                    dpi=300,
-                                    default_color="red",
-                                    title=args.title,
-                                    extensions=args.output_formats,
-                                    feature_start_column_id="start",
-                                    feature_end_column_id="end",
-                                    feature_color_column_id="color",
-                                    feature_length_column_id="length",
-                                    subplots_adjust_left=args.subplots_adjust_left,
-                                    subplots_adjust_bottom=args.subplots_adjust_bottom,
-                                    subplots_adjust_right=args.subplots_adjust_right,
-                                    subplots_adjust_top=args.subplots_adjust_top,
-                                    show_track_label=not args.hide_track_label,
-                                    show_trackgroup_label=True,
-                                    close_figure=True,
-                                    subplot_scale=False,
-                                    track_group_scale=False,
-                                    track_group_distance=2,
-                                    xmax_multiplier=1.3, ymax_multiplier=1.00,
-                                    stranded_tracks=args.stranded,
-                                    rounded_tracks=args.rounded,
-                                    middle_break=args.middle_break,
-                                    stranded_end_tracks=args.stranded_end,
-                                    xtick_fontsize=args.x_tick_fontsize,
-                                    subplot_title_fontsize=args.title_fontsize,
-                                    subplot_title_fontweight='bold'
-                                    )
-        """
-        Visualization.draw_variant_window_densities(count_df, args.window_size, args.window_step, chr_len_df,
-                                                    args.output_prefix,
-                                                    figure_width=15,
-                                                    figure_height_per_scaffold=0.5,
-                                                    dpi=300,
-                                                    show_track_label=not args.hide_track_label,
-                                                    colormap=args.colormap, title=args.title,
-                                                    extensions=args.output_formats,
-                                                    scaffold_order_list=args.scaffold_ordered_list,
-                                                    test_colormaps=args.test_colormaps,
-                                                    thresholds=args.density_thresholds,
-                                                    masking=True if args.coverage else False,
-                                                    subplots_adjust_left=args.subplots_adjust_left,
-                                                    subplots_adjust_bottom=args.subplots_adjust_bottom,
-                                                    subplots_adjust_right=args.subplots_adjust_right,
-                                                    subplots_adjust_top=args.subplots_adjust_top,
-                                                    show_trackgroup_label=True)
-        """
\ No newline at end of file
+    Visualization.draw_features_with_colormaps({"TR": track_df},
+                                               chr_len_df,
+                                               args.scaffold_ordered_list,
+                                               args.output_prefix,
+                                               args.density_thresholds,
+                                               Visualization.colormap_list if args.test_colormaps else [args.colormap],
+                                               legend_type="density",
+                                               feature_name=args.feature_name,
+                                               background="white",
+                                               add_colormap_to_prefix=args.test_colormaps,
+                                               write_colored_tracks=True,
+                                               threads=args.threads,
+                                               # query_species_color_df_dict,
+                                               centromere_df=centromere_df,
+                                               highlight_df=args.highlight_file,
+                                               figure_width=args.figure_width,
+                                               figure_height_per_scaffold=args.figure_height_per_scaffold,
+                                               figure_header_height=args.figure_header_height,
+                                               dpi=300,
+                                               default_color="red",
+                                               title=args.title,
+                                               extensions=args.output_formats,
+                                               feature_start_column_id="start",
+                                               feature_end_column_id="end",
+                                               feature_color_column_id="color",
+                                               feature_length_column_id="length",
+                                               subplots_adjust_left=args.subplots_adjust_left,
+                                               subplots_adjust_bottom=args.subplots_adjust_bottom,
+                                               subplots_adjust_right=args.subplots_adjust_right,
+                                               subplots_adjust_top=args.subplots_adjust_top,
+                                               show_track_label=not args.hide_track_label,
+                                               show_trackgroup_label=True,
+                                               close_figure=True,
+                                               subplot_scale=False,
+                                               track_group_scale=False,
+                                               track_group_distance=2,
+                                               xmax_multiplier=1.3, ymax_multiplier=1.00,
+                                               stranded_tracks=args.stranded,
+                                               rounded_tracks=args.rounded,
+                                               middle_break=args.middle_break,
+                                               stranded_end_tracks=args.stranded_end,
+                                               xtick_fontsize=args.x_tick_fontsize,
+                                               subplot_title_fontsize=args.title_fontsize,
+                                               subplot_title_fontweight='bold'
+                                               )
+    """
+    Visualization.draw_variant_window_densities(count_df, args.window_size, args.window_step, chr_len_df,
+                                                args.output_prefix,
+                                                figure_width=15,
+                                                figure_height_per_scaffold=0.5,
+                                                dpi=300,
+                                                show_track_label=not args.hide_track_label,
+                                                colormap=args.colormap, title=args.title,
+                                                extensions=args.output_formats,
+                                                scaffold_order_list=args.scaffold_ordered_list,
+                                                test_colormaps=args.test_colormaps,
+                                                thresholds=args.density_thresholds,
+                                                masking=True if args.coverage else False,
+                                                subplots_adjust_left=args.subplots_adjust_left,
+                                                subplots_adjust_bottom=args.subplots_adjust_bottom,
+                                                subplots_adjust_right=args.subplots_adjust_right,
+                                                subplots_adjust_top=args.subplots_adjust_top,
+                                                show_trackgroup_label=True)
+    """
\ No newline at end of file
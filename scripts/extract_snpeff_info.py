@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+__author__ = 'Sergei F. Kliver'
+
+import argparse
+
+from MACE.Routines import StatsVCF
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument("-i", "--input_file", action="store", dest="input", required=True,
+                    help="Input vcf file annotated by SnpEff")
+parser.add_argument("-o", "--output", action="store", dest="output", required=True,
+                    help="Output file with one effect per line")
+parser.add_argument("-e", "--snpeff_entry", action="store", dest="snpeff_entry", default="ANN",
+                    help="SnpEff entry in INFO field. Allowed: ANN(default), EFF")
+parser.add_argument("-f", "--output_format", action="store", dest="output_format", default="tsv",
+                    help="Output format. Allowed: tsv(default), parquet (requires pyarrow)")
+parser.add_argument("-m", "--impacts", action="store", dest="impacts", default=None,
+                    type=lambda s: s.split(","),
+                    help="Comma-separated list of impacts to keep, i.e. HIGH,MODERATE. Default: all")
+parser.add_argument("--chunk_size", action="store", dest="chunk_size", default=100000, type=int,
+                    help="Number of records per chunk. Default: 100000")
+
+args = parser.parse_args()
+
+impact_column = "Putative_impact" if args.snpeff_entry == "ANN" else "Effect_Impact"
+
+StatsVCF.extract_snpeff_info(args.input, args.output, snpeff_entry=args.snpeff_entry,
+                             output_format=args.output_format,
+                             effect_filter={impact_column: args.impacts} if args.impacts else None,
+                             chunk_size=args.chunk_size)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+__author__ = 'Sergei F. Kliver'
+
+import argparse
+
+from MACE.Routines import StatsVCF
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument("-i", "--input_file", action="store", dest="input", required=True,
+                    help="Input vcf file with variants. DP field of samples is used")
+parser.add_argument("-o", "--output", action="store", dest="output", required=True,
+                    help="Output BED file with merged masked intervals")
+parser.add_argument("-a", "--samples", action="store", dest="samples", default=None,
+                    type=lambda s: s.split(","),
+                    help="Comma-separated list of samples to use. Default: all")
+parser.add_argument("-c", "--sample_coverage", action="store", dest="sample_coverage", default=None,
+                    type=lambda s: list(map(float, s.split(","))),
+                    help="Comma-separated list of coverages of samples (in the same order as samples). "
+                         "Default: median DP of samples")
+parser.add_argument("-m", "--min_samples", action="store", dest="min_samples", default=1, type=int,
+                    help="Minimum number of samples with outlier coverage to mask position. Default: 1")
+parser.add_argument("-x", "--max_coverage", action="store", dest="max_coverage", default=2.5, type=float,
+                    help="Maximum coverage relative to sample coverage. Default: 2.5")
+parser.add_argument("-n", "--min_coverage", action="store", dest="min_coverage", default=None, type=float,
+                    help="Minimum coverage relative to sample coverage. Default: not set")
+parser.add_argument("--chunk_size", action="store", dest="chunk_size", default=1000000, type=int,
+                    help="Number of records per chunk. Default: 1000000")
+
+args = parser.parse_args()
+
+StatsVCF.calculate_masking(args.input, args.output, samples=args.samples, sample_coverage=args.sample_coverage,
+                           min_samples=args.min_samples, max_coverage=args.max_coverage,
+                           min_coverage=args.min_coverage, chunk_size=args.chunk_size)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 __author__ = 'Sergei F. Kliver'
 import argparse
-from RouToolPa.Parsers.VCF import CollectionVCF
+from MACE.Routines import StatsVCF
 
 
 parser = argparse.ArgumentParser()
@@ -11,10 +11,21 @@ parser.add_argument("-i", "--input", action="store", dest="input", required=True
 parser.add_argument("-o", "--output_prefix", action="store", dest="output_prefix",
                     required=True,
                     help="Prefix of output files")
+parser.add_argument("-s", "--samples", action="store", dest="samples", default=None,
+                    type=lambda s: s.split(","),
+                    help="Comma-separated list of samples to extract. Default: all")
+parser.add_argument("-k", "--keep_ref_and_missing", action="store_true", dest="keep_ref_and_missing",
+                    help="Keep records with homozygous reference or missing genotypes of sample. "
+                         "Default: such records are removed")
+parser.add_argument("-z", "--compress", action="store_true", dest="compress",
+                    help="Compress output files by bgzip")
+parser.add_argument("-t", "--threads", action="store", dest="threads", default=1, type=int,
+                    help="Number of threads. Default: 1")
+parser.add_argument("--chunk_size", action="store", dest="chunk_size", default=100000, type=int,
+                    help="Number of records per chunk. Default: 100000")
 
 args = parser.parse_args()
 
-mutations = CollectionVCF(args.input, parsing_mode="read")
-
-
-mutations.write(args.output_prefix, format='vcf', samples=None, split_samples=True)
+StatsVCF.split_vcf_by_samples(args.input, args.output_prefix, samples=args.samples,
+                              remove_ref_and_missing=not args.keep_ref_and_missing, compress=args.compress,
+                              threads=args.threads, chunk_size=args.chunk_size)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+__author__ = 'Sergei F. Kliver'
+
+import os
+import argparse
+
+from RouToolPa.Collections.General import IdList
+from MACE.Routines import StatsVCF, Visualization
+from MACE.Functions.Sequence import get_scaffold_length_df
+
+parser = argparse.ArgumentParser()
+
+parser.add_argument("-i", "--input_file", action="store", dest="input", required=True,
+                    help="Input vcf file with variants")
+parser.add_argument("-o", "--output_prefix", action="store", dest="output_prefix", required=True,
+                    help="Prefix of output files")
+parser.add_argument("-t", "--statistics", action="store", dest="statistics",
+                    type=lambda s: s.split(","), default=list(StatsVCF.summary_statistics),
+                    help="Comma-separated list of statistics to calculate. "
+                         "Allowed: %s. Default: all" % ",".join(StatsVCF.summary_statistics))
+parser.add_argument("-r", "--reference_genome", action="store", dest="reference",
+                    help="Fasta file with reference genome, required to get scaffold lengths for window statistics."
+                         "If absent lengths will be extracted from vcf metadata")
+parser.add_argument("-w", "--window_size", action="store", dest="window_size", default=100000, type=int,
+                    help="Size of the windows Default: 100000")
+parser.add_argument("-s", "--window_step", action="store", dest="window_step", default=None, type=int,
+                    help="Step of the sliding windows. Default: window size, i.e windows are staking")
+parser.add_argument("-e", "--per_sample", action="store_true", dest="per_sample", default=False,
+                    help="Count variants in windows for each sample independently. "
+                         "Default: count all samples together")
+parser.add_argument("-m", "--heterozygous_mode", action="store", dest="heterozygous_mode", default="one",
+                    help="Mode for heterozygous windows. Allowed: 'one'(default) - variant will be treated as "
+                         "heterozygous if there is at least one heterozygous sample, "
+                         "'all' - all samples have to be heterozygous. Ignored if --per_sample is set")
+parser.add_argument("-a", "--scaffold_white_list", action="store", dest="scaffold_white_list", default=[],
+                    type=lambda s: IdList(filename=s) if os.path.exists(s) else s.split(","),
+                    help="Comma-separated list or file with the only scaffolds to keep in window statistics. "
+                         "Default: all")
+parser.add_argument("-b", "--scaffold_black_list", action="store", dest="scaffold_black_list", default=[],
+                    type=lambda s: IdList(filename=s) if os.path.exists(s) else s.split(","),
+                    help="Comma-separated list or file with scaffolds to skip in window statistics. "
+                         "Default: not set")
+parser.add_argument("--chunk_size", action="store", dest="chunk_size", default=1000000, type=int,
+                    help="Number of records per chunk. Default: 1000000")
+
+parser.add_argument("-d", "--dpi", action="store", dest="dpi", type=int, default=200,
+                    help="Dpi of zygoty figure")
+parser.add_argument("-f", "--output_formats", action="store", dest="output_formats",
+                    type=lambda s: s.split(","),
+                    default=["png"],
+                    help="Comma-separated list of formats (supported by matlotlib) "
+                         "of zygoty figure. Default: png")
+parser.add_argument("-l", "--title", action="store", dest="title",
+                    default=None,
+                    help="Title of zygoty figure. Default: not set")
+
+args = parser.parse_args()
+
+if args.reference:
+    reference_length_df = get_scaffold_length_df(args.reference, sort_by_length=True)
+else:
+    reference_length_df = None
+
+result_dict = StatsVCF.summarize_vcf_file(args.input, args.statistics, args.output_prefix,
+                                          window_size=args.window_size, window_step=args.window_step,
+                                          reference_scaffold_lengths=reference_length_df,
+                                          per_sample_window_counts=args.per_sample,
+                                          heterozygous_mode=args.heterozygous_mode,
+                                          chunk_size=args.chunk_size,
+                                          scaffold_black_list=args.scaffold_black_list,
+                                          scaffold_white_list=args.scaffold_white_list)
+
+if "zygoty" in result_dict:
+    Visualization.zygoty_bar_plot(result_dict["zygoty"], "%s.zygoty" % args.output_prefix,
+                                  extension_list=args.output_formats, dpi=args.dpi, title=args.title)
@@ -15,7 +15,8 @@ parser.add_argument("-o", "--output_prefix", action="store", dest="output_prefix
                     help="Prefix of output files")
 parser.add_argument("-d", "--distance", action="store", dest="distance", default="average",
                     help="Method to use for calculating distance between clusters. "
-                         "Allowed: average(default), single, complete, centroid, weighted, median, ward")
+                         "Allowed: average(default), single, complete, centroid, weighted, median, ward. "
+                         "Single linkage is calculated without pairwise distance matrix.")
 parser.add_argument("-e", "--method", action="store", dest="method", default="distance",
                     help="Method to use for extraction of clusters. "
                          "Allowed: distance(default), inconsistent, maxclust, monocrit, maxclust_monocrit ")
@@ -28,6 +29,19 @@ parser.add_argument("-s", "--threshold_step", action="store", dest="threshold_st
                     help="Threshold step for extraction of clusters")
 parser.add_argument("-p", "--depth", action="store", dest="depth", type=int, default=2,
                     help="The maximum depth to perform extraction of cluster using inconsistent method. Default: 2")
+parser.add_argument("--chunked", action="store_true", dest="chunked", default=None,
+                    help="For complete, average, weighted and ward methods with distance extraction method "
+                         "always calculate distance matrix only for chunks of variants separated by gaps larger than "
+                         "maximum threshold. Clusters are the same, but cluster ids are numbered consecutively "
+                         "over chunks and cophenetic correlation coefficient is not computed (NaN in .cophenet file). "
+                         "Default: chunked mode is used only for scaffolds with number of pairwise distances "
+                         "larger than --max_distance_number")
+parser.add_argument("--max_distance_number", action="store", dest="max_distance_number", type=int,
+                    default=100000000,
+                    help="Maximal number of pairwise distances (n*(n-1)/2 for n variants) to calculate "
+                         "for scaffold without chunks. Ignored if --chunked is set. Default: 100000000")
+parser.add_argument("-t", "--threads", action="store", dest="threads", type=int, default=1,
+                    help="Number of processes to use for clustering of scaffolds. Default: 1")
 parser.add_argument("-a", "--scaffold_white_list", action="store", dest="scaffold_white_list", default=[],
                     type=lambda s: IdList(filename=s) if os.path.exists(s) else s.split(","),
                     help="Comma-separated list of the only scaffolds to draw. Default: all")
@@ -85,7 +99,10 @@ cluster_df = StatsVCF.test_clustering_thresholds(variants.records, method=args.d
                                                  min_threshold=args.min_threshold,
                                                  max_threshold=args.max_threshold,
                                                  threshold_number=None,
-                                                 threshold_step=args.threshold_step,)
+                                                 threshold_step=args.threshold_step,
+                                                 threads=args.threads,
+                                                 chunked=args.chunked,
+                                                 max_distance_number=args.max_distance_number)
 print("Drawing...")
 Visualization.plot_clustering_threshold_tests(cluster_df, output_prefix,
                                               scaffold_order_list=args.scaffold_ordered_list,
@@ -2,9 +2,11 @@
 __author__ = 'Sergei F. Kliver'
 import os
 import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from _collections import OrderedDict
+from MACE.Functions.Boxplots import get_partition_box_stats
 
 
 parser = argparse.ArgumentParser()
@@ -90,32 +92,38 @@ else:
 file_dict = OrderedDict(zip(args.label_list, args.input_list))
 x_chr_dict = OrderedDict(zip(args.label_list, x_chr_list)) if x_chr_list else OrderedDict()
 
-df_dict = OrderedDict({"all": OrderedDict(),
-                       "noX": OrderedDict(),
-                       "onlyX": OrderedDict(),
-                       "noPAR": OrderedDict(),
-                       "PAR": OrderedDict()})
+# windows are labeled by partition codes: 0 - autosomes, 1 - X chromosome outside of PAR, 2 - PAR
+partition_group_dict = OrderedDict({"all": [0, 1, 2],
+                                    "noX": [0],
+                                    "onlyX": [1, 2],
+                                    "noPAR": [1],
+                                    "PAR": [2]})
 
+stats_dict = OrderedDict()
 df_number_dict = OrderedDict()
 
 for entry in file_dict:
-    df_dict["all"][entry] = pd.read_csv(file_dict[entry], sep="\t", index_col=["CHROM",])
-    df_dict["all"][entry]["density"] = df_dict["all"][entry]["All"] * args.multiplier / args.window_size
-    df_number_dict[entry] = 1
+    # only box statistics are kept, so memory doesn't depend on number of input files
+    window_df = pd.read_csv(file_dict[entry], sep="\t", usecols=["CHROM", "WINDOW", "All"])
+    density_array = window_df["All"].to_numpy(dtype=np.float64) * args.multiplier / args.window_size
+    partition_array = np.zeros(len(window_df), dtype=np.int8)
 
     if x_chr_dict:
-        df_dict["noX"][entry] = df_dict["all"][entry].loc[df_dict["all"][entry].index != x_chr_dict[entry]["id"], :]
-        df_dict["onlyX"][entry] = df_dict["all"][entry].loc[df_dict["all"][entry].index == x_chr_dict[entry]["id"], :]
-        df_number_dict[entry] += 2
+        group_list = ["all", "noX", "onlyX"]
+        x_mask = (window_df["CHROM"] == x_chr_dict[entry]["id"]).to_numpy()
+        partition_array[x_mask] = 1
         if "PARstart" in x_chr_dict[entry]:
-            PAR_boolean_windows = (df_dict["onlyX"][entry]["WINDOW"] * args.window_step >= x_chr_dict[entry]["PARstart"]) & (
-                        df_dict["onlyX"][entry]["WINDOW"] * args.window_step + args.window_size <= x_chr_dict[entry]["PARend"])
-            df_dict["noPAR"][entry] = df_dict["onlyX"][entry][~PAR_boolean_windows]
-            df_dict["PAR"][entry] = df_dict["onlyX"][entry][PAR_boolean_windows]
-            df_number_dict[entry] += 2
-    #if x_chr_dict:
-    #    df_dict["noX"][entry]["density"] = df_dict["noX"][entry]["All"] * args.multiplier / args.window_size
-    #    df_dict["onlyX"][entry]["density"] = df_dict["onlyX"][entry]["All"] * args.multiplier / args.window_size
+            window_start_array = window_df["WINDOW"].to_numpy() * args.window_step
+            partition_array[x_mask & (window_start_array >= x_chr_dict[entry]["PARstart"]) &
+                            (window_start_array + args.window_size <= x_chr_dict[entry]["PARend"])] = 2
+            group_list += ["noPAR", "PAR"]
+    else:
+        group_list = ["all"]
+
+    stats_dict[entry] = get_partition_box_stats(density_array, partition_array,
+                                                OrderedDict([(group, partition_group_dict[group])
+                                                             for group in group_list]))
+    df_number_dict[entry] = len(group_list)
 
 df_number_list = list(df_number_dict.values())
 
@@ -125,8 +133,7 @@ dpi = 300
 fig, ax = plt.subplots(nrows=1, ncols=1, figsize=(figure_width, figure_height), dpi=dpi)
 fig.patch.set_color('white')
 
-data_list = []
-label_list = []
+box_stats_list = []
 x_pos_list = []
 
 inner_distance = 1
@@ -135,11 +142,8 @@ otter_distance = 2
 if x_chr_dict:
     distance = inner_distance
     for entry in file_dict:
-        for label in df_dict:
-            if not df_dict[label]:
-                continue
-            data_list.append(df_dict[label][entry]["density"])
-            label_list.append(label)
+        for label in stats_dict[entry]:
+            box_stats_list.append(stats_dict[entry][label])
             if not x_pos_list:
                 x_pos_list.append(0)
             else:
@@ -150,21 +154,22 @@ if x_chr_dict:
 else:
     distance = 1
     for entry in file_dict:
-        data_list.append(df_dict["all"][entry]["density"])
-        label_list.append(entry)
+        box_stats_list.append(stats_dict[entry]["all"])
+        box_stats_list[-1]["label"] = entry
         if not x_pos_list:
             x_pos_list.append(0)
         else:
             x_pos_list.append(x_pos_list[-1] + distance)
     plt.xticks(rotation=45, fontstyle='italic')
 
-plt.boxplot(data_list, labels=label_list, positions=x_pos_list)
+ax.bxp(box_stats_list, positions=x_pos_list)
 plt.ylabel(args.ylabel)
 plt.ylim(ymin=-0.1)
 plt.grid(linestyle='dotted')
 
-max_data_y = max(list(map(max, data_list)))
-min_data_y = min(list(map(min, data_list)))
+# whiskers and fliers include the most extreme values
+max_data_y = np.nanmax([max(stats["whishi"], np.max(stats["fliers"], initial=-np.inf)) for stats in box_stats_list])
+min_data_y = np.nanmin([min(stats["whislo"], np.min(stats["fliers"], initial=np.inf)) for stats in box_stats_list])
 plt.ylim(ymax=args.ymax)
 """
 ticks = [tick for tick in plt.gca().get_xticklabels()]
@@ -188,5 +193,5 @@ if x_chr_dict:
 
 plt.subplots_adjust(top=args.subplots_adjust_top, bottom=args.subplots_adjust_bottom,
                     left=args.subplots_adjust_left, right=args.subplots_adjust_right)
-for ext in "png", "svg":
+for ext in args.output_formats:
     plt.savefig("{0}.{1}".format(args.output_prefix, ext), transparent=False)